@@ -59,6 +59,8 @@ owlready2.namespace.AllDisjoint             = AllDisjoint
 owlready2.namespace.ConstrainedDatatype     = ConstrainedDatatype
 owlready2.namespace.Inverse                 = Inverse
 owlready2.namespace.IndividualValueList     = IndividualValueList
+owlready2.namespace.Construct               = Construct
+owlready2.namespace._FUNCTIONAL_FOR_CACHE   = _FUNCTIONAL_FOR_CACHE
 owlready2.entity.Thing              = Thing
 owlready2.entity.Nothing            = Nothing
 owlready2.entity.Construct          = Construct
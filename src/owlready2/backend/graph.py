@@ -604,6 +604,19 @@ class SparqlGraph(BaseMainGraph):
         for item in result["results"]["bindings"]:
             yield self.graph_iri2c[item["g"]["value"]], item["s"]["storid"], item["p"]["storid"], item["o"]["storid"]
 
+    def _unabbreviate_storids(self, storids):
+        """Return a storid -> IRI dict for the given storids."""
+        return {storid: self._unabbreviate(storid) for storid in storids}
+
+    def _new_obj_triples(self, triples):
+        """Return the (s, p, o, inverse p or 0) triples that are not already asserted, in either direction."""
+        return [(s, p, o, ip) for s, p, o, ip in dict.fromkeys(triples)
+                if not self._has_obj_triple_spo(s, p, o) and not (ip and self._has_obj_triple_spo(o, ip, s))]
+
+    def _new_data_triples(self, triples):
+        """Return the (s, p, o, d) triples whose value is not already asserted."""
+        return [(s, p, o, d) for s, p, o, d in dict.fromkeys(triples) if not self._has_data_triple_spod(s, p, o)]
+
     def _parse_bnode(self, bnode):
         result = self.execute(f"""
             PREFIX ent: <http://www.ontotext.com/owlim/entity#>
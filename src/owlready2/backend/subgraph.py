@@ -72,7 +72,8 @@ class SparqlSubGraph(BaseSubGraph):
             return "%s#" % base_iri
 
     def create_parse_func(self, filename=None, delete_existing_triples=True,
-                          datatype_attr="http://www.w3.org/1999/02/22-rdf-syntax-ns#datatype"):
+                          datatype_attr="http://www.w3.org/1999/02/22-rdf-syntax-ns#datatype", incremental=False):
+        # Incremental reload is not supported by SPARQL endpoints; the named graph is fully reloaded.
         objs = []
         datas = []
         bnode_i = 0
@@ -354,6 +355,12 @@ class SparqlSubGraph(BaseSubGraph):
         insert_query = QueryGenerator.generate_insert_query(s_iri, p_iri, o_iri, default_graph_iri=self.graph_iri)
         self.execute(insert_query, method='update')
 
+    def _add_new_obj_triples_raw_spo(self, triples, return_new=False):
+        new = self.parent._new_obj_triples(triples)
+        for s, p, o, ip in new:
+            self._add_obj_triple_raw_spo(s, p, o)
+        return new if return_new else None
+
     def _del_obj_triple_raw_spo(self, s=None, p=None, o=None):
         s_iri, p_iri, o_iri = self._unabbreviate_all(s, p, o)
         delete_query = QueryGenerator.generate_delete_query(s_iri, p_iri, o_iri, default_graph_iri=self.graph_iri)
@@ -374,6 +381,12 @@ class SparqlSubGraph(BaseSubGraph):
         insert_query = QueryGenerator.generate_insert_query(s_iri, p_iri, o, d_iri, default_graph_iri=self.graph_iri)
         self.execute(insert_query, method='update')
 
+    def _add_new_data_triples_raw_spod(self, triples, return_new=False):
+        new = self.parent._new_data_triples(triples)
+        for s, p, o, d in new:
+            self._add_data_triple_raw_spod(s, p, o, d)
+        return new if return_new else None
+
     def _del_data_triple_raw_spod(self, s, p, o, d):
         s_iri, p_iri = self._unabbreviate_all(s, p)
         o_data = None
@@ -112,7 +112,8 @@ class Not(ClassConstruct):
   
   def __getattr__(self, attr):
     if attr == "Class":
-      self.__dict__["Class"] = C = self.ontology._to_python(self.ontology._get_obj_triple_sp_o(self.storid, owl_complementof), default_to_none = True)
+      source = self.__dict__.pop("_subtree", None) or self.ontology # Blank node subtree already fetched when parsing the construct
+      self.__dict__["Class"] = C = source._to_python(source._get_obj_triple_sp_o(self.storid, owl_complementof), default_to_none = True)
       return C
     return super().__getattribute__(attr)
   
@@ -211,7 +212,8 @@ class LogicalClassConstruct(ClassConstruct):
       
   def __getattr__(self, attr):
     if attr == "Classes":
-      self.Classes = CallbackList(self.ontology._parse_list(self._list_bnode), self, LogicalClassConstruct._callback)
+      source = self.__dict__.pop("_subtree", None) or self.ontology
+      self.Classes = CallbackList(source._parse_list(self._list_bnode), self, LogicalClassConstruct._callback)
       return self.Classes
     return super().__getattribute__(attr)
   
@@ -352,18 +354,21 @@ class Restriction(ClassConstruct):
     
   def __getattr__(self, attr):
     if   attr == "value":
+      source = self.__dict__.pop("_subtree", None)
+      if source is None: source = self.ontology; to_python = self.ontology.world._to_python
+      else:              to_python = source._to_python
       if (self.type == SOME) or (self.type == ONLY) or (self.type == HAS_SELF):
-        v = self.ontology._get_obj_triple_sp_o(self.storid, self.type)
-        v = self.__dict__["value"] = self.ontology.world._to_python(v, None, default_to_none = True)
+        v = source._get_obj_triple_sp_o(self.storid, self.type)
+        v = self.__dict__["value"] = to_python(v, None, default_to_none = True)
       elif self.type == VALUE:
-        v, d = self.ontology._get_triple_sp_od(self.storid, self.type)
-        v = self.__dict__["value"] = self.ontology.world._to_python(v, d, default_to_none = True)
+        v, d = source._get_triple_sp_od(self.storid, self.type)
+        v = self.__dict__["value"] = to_python(v, d, default_to_none = True)
       else:
-        v = self.ontology._get_obj_triple_sp_o(self.storid, owl_onclass) or self.ontology._get_obj_triple_sp_o(self.storid, owl_ondatarange)
+        v = source._get_obj_triple_sp_o(self.storid, owl_onclass) or source._get_obj_triple_sp_o(self.storid, owl_ondatarange)
         if v is None:
           v = self.__dict__["value"] = Thing
         else:
-          v = self.__dict__["value"] = self.ontology.world._to_python(v, default_to_none = True)
+          v = self.__dict__["value"] = to_python(v, default_to_none = True)
       return v
     return super().__getattribute__(attr)
   
@@ -19,76 +19,176 @@
 
 from owlready2.namespace       import *
 from owlready2.entity          import *
-from owlready2.entity          import _inherited_property_value_restrictions
 from owlready2.prop            import *
 from owlready2.individual      import *
 from owlready2.class_construct import *
 
+from collections import defaultdict
+
 
 def close_world(self, Properties = None, close_instance_list = True, recursive = True):
-  if isinstance(self, Thing): # An instance
-    if Properties is None:
-      Properties2 = (Prop for Prop in self._get_instance_possible_relations() if issubclass_python(Prop, ObjectProperty))
-    else:
-      Properties2 = Properties
+  if   isinstance(self, Thing): # An instance
+    _close_world(self.namespace.world, [], [self], Properties, close_instance_list)
     
-    for Prop in Properties2:
-      range_instances = list(Prop[self])
-      range_classes   = []
-      for r in _inherited_property_value_restrictions(self, Prop, set()):
-        if   (r.type == SOME):  range_classes  .append(r.value)
-        elif (r.type == VALUE): range_instances.append(r.value)
-      if range_instances: range_classes.append(OneOf(range_instances))
-      
-      if not range_classes:                      self.is_a.append(Prop.only(Nothing))
-      elif issubclass_python(Prop, FunctionalProperty): pass
-      elif len(range_classes) == 1:              self.is_a.append(Prop.only(range_classes[0]))
-      else:                                      self.is_a.append(Prop.only(Or(range_classes)))
-      
   elif isinstance(self, ThingClass): # A class
-    instances  = set(self.instances())
-    subclasses = set(self.descendants())
+    _close_world(self.namespace.world, [self], None if recursive else [], Properties, close_instance_list, recursive)
+    
+  elif isinstance(self, Ontology):
+    _close_world(self.world, list(self.classes()), list(self.individuals()), Properties, close_instance_list)
+    
     
+def _close_world(world, Classes, individuals, Properties, close_instance_list, recursive = False):
+  # Closes Classes (and, if recursive, all their descendants) and individuals (None for all the instances of Classes).
+  # The class hierarchy, the inherited restrictions and the relations are obtained by a few SQL queries for all the
+  # entities at once; only the restrictions found and the final constructs are created in Python.
+  graph = world.graph
+  
+  # Descendants (as in Class.descendants()) and instances (as in Class.instances()) of Classes
+  subclasses       = defaultdict(list)
+  direct_instances = defaultdict(list)
+  candidates       = list(dict.fromkeys(Class.storid for Class in Classes))
+  class_storids    = list(candidates)
+  seen             = set(candidates)
+  while candidates:
+    triples    = graph._get_obj_triples_po_cspo([rdfs_subclassof, owl_equivalentclass, rdf_type], candidates)
+    triples   += [(c, o, p, s) for (c, s, p, o) in graph._get_obj_triples_sp_cspo(candidates, owl_equivalentclass)]
+    candidates = []
+    for c, s, p, o in triples:
+      if   s < 0: continue
+      elif p == rdf_type: direct_instances[o].append(s)
+      else:
+        subclasses[o].append(s)
+        if not s in seen:
+          seen.add(s)
+          candidates   .append(s)
+          class_storids.append(s)
+          
+  def descendants(storid):
+    r = [storid]
+    s = { storid }
+    for x in r:
+      for y in subclasses[x]:
+        if not y in s:
+          s.add(y)
+          r.append(y)
+    return r
+  
+  def instances(storid): return list(dict.fromkeys(x for y in descendants(storid) for x in direct_instances[y]))
+  
+  if recursive: Classes = [Class for Class in world._get_by_storids(class_storids) if isinstance(Class, ThingClass)]
+  instance_storids = list(dict.fromkeys(x for xs in direct_instances.values() for x in xs))
+  if individuals is None: individuals = instance_storids
+  else:                   individuals = [individual.storid for individual in individuals]
+  storid_2_individual = dict(zip(instance_storids + individuals, world._get_by_storids(instance_storids + individuals)))
+  individuals         = [storid_2_individual[storid] for storid in individuals]
+  
+  # Properties to close
+  if Properties is None:
+    prop_domains = [(Prop, list(Prop.domains_indirect())) for Prop in world._reasoning_props.values() if issubclass_python(Prop, ObjectProperty)]
+    def possible_relations(x): return [Prop for Prop, domains in prop_domains if all(domain._satisfied_by(x) for domain in domains)]
+  else:
+    def possible_relations(x): return Properties
+  class_props      = [possible_relations(Class)      for Class      in Classes]
+  individual_props = [possible_relations(individual) for individual in individuals]
+  props            = { Prop.storid : Prop for Props in class_props + individual_props for Prop in Props }
+  
+  # Restrictions inherited through is_a, equivalent_to and intersections (as in _inherited_property_value_restrictions())
+  supers           = defaultdict(list)
+  restrictions     = {}
+  individual_nodes = set(storid_2_individual)
+  candidates       = list(dict.fromkeys(class_storids + list(storid_2_individual)))
+  seen             = set(candidates)
+  while candidates:
+    triples    = graph._get_obj_triples_sp_cspo(candidates, [rdf_type, rdfs_subclassof, owl_equivalentclass, owl_equivalentindividual, owl_intersectionof, rdf_first, rdf_rest, owl_onproperty])
+    triples   += [(c, o, p, s) for (c, s, p, o) in graph._get_obj_triples_po_cspo([owl_equivalentclass, owl_equivalentindividual], candidates)]
+    candidates = []
+    for c, s, p, o in triples:
+      if   p == owl_onproperty:
+        if o in props: restrictions[s] = None
+        continue
+      elif p == rdf_type:
+        if not s in individual_nodes: continue
+      elif p == owl_equivalentindividual: individual_nodes.add(o)
+      supers[s].append(o)
+      if not o in seen:
+        seen.add(o)
+        candidates.append(o)
+        
+  for storid in restrictions: restrictions[storid] = world._parse_bnode(storid)
+  
+  inheriteds = {}
+  def inherited(storid):
+    r = inheriteds.get(storid)
+    if r is None:
+      r = inheriteds[storid] = defaultdict(list)
+      xs = [storid]
+      s  = { storid }
+      for x in xs:
+        for y in supers[x]:
+          if not y in s:
+            s.add(y)
+            xs.append(y)
+            restriction = restrictions.get(y)
+            if not restriction is None: r[restriction.property.storid].append(restriction)
+    return r
+  
+  # Relations of the instances and individuals
+  values     = defaultdict(list)
+  obj_props  = [Prop for Prop in props.values() if issubclass_python(Prop, ObjectProperty)]
+  inverses   = { Prop._inverse_storid : Prop.storid for Prop in obj_props if Prop._inverse_storid }
+  for c, s, p, o in graph._get_obj_triples_sp_cspo(list(storid_2_individual), [Prop.storid for Prop in obj_props]): values[s, p].append(o)
+  if inverses:
+    for c, s, p, o in graph._get_obj_triples_po_cspo(list(inverses), list(storid_2_individual)): values[o, inverses[p]].append(s)
+  for key, os in values.items(): values[key] = [world._to_python(o) for o in os]
+  def get_values(individual, Prop):
+    if issubclass_python(Prop, ObjectProperty): return values.get((individual.storid, Prop.storid), [])
+    return list(Prop[individual])
+  
+  # Creates the constructs
+  for Class, Props in zip(Classes, class_props):
+    descendant_storids = descendants(Class.storid)
+    instances2         = [storid_2_individual[storid] for storid in instances(Class.storid)]
+    is_a               = []
     if close_instance_list:
-      if instances: self.is_a.append(OneOf(list(instances)))
-      
-    if Properties is None:
-      Properties2 = (Prop for Prop in self._get_class_possible_relations() if issubclass_python(Prop, ObjectProperty))
-    else:
-      Properties2 = Properties
+      if instances2: is_a.append(OneOf(instances2))
       
-    for Prop in Properties2:
+    for Prop in Props:
       range_instances = []
       range_classes   = []
-      for subclass in subclasses: # subclasses includes self
-        for r in _inherited_property_value_restrictions(subclass, Prop, set()):
+      for storid in descendant_storids: # descendants includes Class
+        for r in inherited(storid).get(Prop.storid, ()):
           if   r.type == VALUE:
             range_instances.append(r.value)
           elif (r.type == SOME) or ((r.type == EXACTLY) and r.cardinality >= 1) or ((r.type == MIN) and r.cardinality >= 1):
             if isinstance(r.value, OneOf): range_instances.extend(r.value.instances)
             else: range_classes.append(r.value)
             
-      for instance in instances:
-        range_instances.extend(Prop[instance])
-        for r in _inherited_property_value_restrictions(instance, Prop, set()):
+      for instance in instances2:
+        range_instances.extend(get_values(instance, Prop))
+        for r in inherited(instance.storid).get(Prop.storid, ()):
           if   (r.type == SOME):  range_classes  .append(r.value)
           elif (r.type == VALUE): range_instances.append(r.value)
           
-      if range_instances: range_classes.append(OneOf(range_instances))
-      if   len(range_classes) == 1: self.is_a.append(Prop.only(range_classes[0]))
-      elif range_classes:           self.is_a.append(Prop.only(Or(range_classes)))
-      else:                         self.is_a.append(Prop.only(Nothing))
-      
-    if recursive:
-      subclasses.discard(self)
-      for subclass in subclasses: close_world(subclass, Properties, close_instance_list, False)
-      for instance in instances:  close_world(instance, Properties, close_instance_list, False)
-      
-      
-  elif isinstance(self, Ontology):
-    for individual in self.individuals():
-      close_world(individual, Properties, close_instance_list, recursive)
+      range_classes = list(dict.fromkeys(range_classes))
+      if range_instances: range_classes.append(OneOf(list(dict.fromkeys(range_instances))))
+      if   len(range_classes) == 1: is_a.append(Prop.only(range_classes[0]))
+      elif range_classes:           is_a.append(Prop.only(Or(range_classes)))
+      else:                         is_a.append(Prop.only(Nothing))
+    if is_a: Class.is_a.extend(is_a) # A single update of the class
     
-    for Class in self.classes():
-      close_world(Class, Properties, close_instance_list, False) # False because all the loop will already close subclasses 
+  for individual, Props in zip(individuals, individual_props):
+    is_a = []
+    for Prop in Props:
+      range_instances = list(get_values(individual, Prop))
+      range_classes   = []
+      for r in inherited(individual.storid).get(Prop.storid, ()):
+        if   (r.type == SOME):  range_classes  .append(r.value)
+        elif (r.type == VALUE): range_instances.append(r.value)
+      range_classes = list(dict.fromkeys(range_classes))
+      if range_instances: range_classes.append(OneOf(list(dict.fromkeys(range_instances))))
       
+      if not range_classes:                      is_a.append(Prop.only(Nothing))
+      elif issubclass_python(Prop, FunctionalProperty): pass
+      elif len(range_classes) == 1:              is_a.append(Prop.only(range_classes[0]))
+      else:                                      is_a.append(Prop.only(Or(range_classes)))
+    if is_a: individual.is_a.extend(is_a)
@@ -17,7 +17,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io, mmap, multiprocessing
 from functools import lru_cache
+from itertools import chain
 
 import owlready2
 from owlready2.base import *
@@ -55,7 +57,9 @@ class BaseGraph(object):
                    
                    "_get_triples_spod_spod", "_get_triples_sp_od", "_get_triple_sp_od", "_get_triples_s_pod", "_get_triples_s_p", "_get_obj_triples_o_p",
                    
-                   "_get_obj_triples_transitive_sp", "_get_obj_triples_transitive_po", "_get_obj_triples_transitive_sym", "_get_obj_triples_transitive_sp_indirect"]
+                   "_get_obj_triples_transitive_sp", "_get_obj_triples_transitive_po", "_get_obj_triples_transitive_sym", "_get_obj_triples_transitive_sp_indirect",
+                   
+                   "_get_list_od", "_get_bnode_subtree"]
   
   WORLD_METHODS = [] # "get_equivs_s_o"
   
@@ -110,6 +114,24 @@ class BaseGraph(object):
         for o in self._get_obj_triples_po_s(inverse, s): self._get_obj_triples_transitive_sp_indirect(o, predicates_inverses, already)
     return already
   
+  def _get_list_od(self, bnode):
+    l = []
+    while bnode and (bnode != rdf_nil):
+      l.append(self._get_triple_sp_od(bnode, rdf_first))
+      bnode = self._get_obj_triple_sp_o(bnode, rdf_rest)
+    return l
+  
+  def _get_bnode_subtree(self, bnode): # Return { bnode : [(p, o, d)] } for bnode and all the blank nodes reachable from it
+    subtree = {}
+    bnodes  = [bnode]
+    while bnodes:
+      s = bnodes.pop()
+      if s in subtree: continue
+      subtree[s] = triples = [(p, o, None) for p, o in self._get_obj_triples_s_po(s)]
+      triples.extend(self._get_data_triples_s_pod(s))
+      bnodes.extend(o for p, o, d in triples if (d is None) and (o < 0))
+    return subtree
+  
   
   def dump(self, format = "ntriples", file = None):
     import io
@@ -123,7 +145,11 @@ class BaseGraph(object):
 class BaseMainGraph(BaseGraph):
   def parse(self, f): raise NotImplementedError
   
-  def save(self, f, format = "rdfxml", **kargs): _save(f, format, self, **kargs)
+  def save(self, f, format = "rdfxml", **kargs):
+    if format == "owlready-snapshot": self.save_snapshot(f, **kargs)
+    else:                             _save(f, format, self, **kargs)
+    
+  def save_snapshot(self, f, compress = True): raise ValueError("Unsupported format owlready-snapshot.")
   
 
 class BaseSubGraph(BaseGraph):
@@ -131,15 +157,39 @@ class BaseSubGraph(BaseGraph):
     self.parent = parent
     self.onto   = onto
     
-  def parse(self, f, format = None, delete_existing_triples = True, default_base = ""):
+  def parse(self, f, format = None, delete_existing_triples = True, default_base = "", processes = None, incremental = False):
     format = format or _guess_format(f)
     
     if   format == "ntriples":
-      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples)
+      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples, incremental = incremental)
       
       try:
         current_line = 0
-        if owlready2_optimized:
+        if processes and (processes > 1) and isinstance(f, io.BufferedReader) and isinstance(getattr(f, "name", None), str):
+          # Lines are parsed by worker processes, chunk by chunk; storids and blank nodes are then assigned
+          # here, in file order, so as blank node labels remain consistent across chunks.
+          bn_src_2_sql = {}
+          with multiprocessing.Pool(processes) as pool:
+            for nb_lines, error_line, iris, bns, chunk_objs, chunk_datas in pool.imap(_parse_ntriples_chunk, _split_ntriples(f, processes)):
+              if not error_line is None:
+                current_line += error_line
+                raise ValueError("Cannot parse line %s" % current_line)
+              current_line += nb_lines
+              
+              storids = [_abbreviate(iri) for iri in iris]
+              sql_bns = []
+              for bn in bns:
+                sql_bn = bn_src_2_sql.get(bn)
+                if sql_bn is None: sql_bn = bn_src_2_sql[bn] = new_blank()
+                sql_bns.append(sql_bn)
+              storids.extend(reversed(sql_bns)) # Blank nodes are indexed from the end (-1 is the first one)
+              
+              objs .extend([(storids[s], storids[p], storids[o]) for s, p, o in chunk_objs])
+              datas.extend([(storids[s], storids[p], o, (d or 0) if d.__class__ is str else storids[d]) for s, p, o, d in chunk_datas])
+              if len(objs)  > 1000000: insert_objs()
+              if len(datas) > 1000000: insert_datas()
+              
+        elif owlready2_optimized:
           owlready2_optimized.parse_ntriples(f, objs, datas, insert_objs, insert_datas, _abbreviate, new_blank, default_base)
           
         else:
@@ -190,7 +240,7 @@ class BaseSubGraph(BaseGraph):
           raise OwlReadyOntologyParsingError("NTriples parsing error (or unrecognized file format) in %s." % getattr(f, "name", getattr(f, "url", "???"))) from e
           
     elif format == "rdfxml":
-      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples)
+      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples, incremental = incremental)
       try:
         if owlready2_optimized:
           owlready2_optimized.parse_rdfxml(f, objs, datas, insert_objs, insert_datas, _abbreviate, new_blank, default_base)
@@ -203,7 +253,7 @@ class BaseSubGraph(BaseGraph):
         raise e
       
     elif format == "owlxml":
-      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples)
+      objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, new_blank, _abbreviate, on_finish = self.create_parse_func(getattr(f, "name", ""), delete_existing_triples, incremental = incremental)
       try:
         if owlready2_optimized:
           owlready2_optimized.parse_owlxml(f, objs, datas, insert_objs, insert_datas, _abbreviate, new_blank, default_base)
@@ -221,11 +271,80 @@ class BaseSubGraph(BaseGraph):
     return onto_base_iri
   
   def save(self, f, format = "rdfxml", commit = False, **kargs):
+    if format == "owlready-snapshot": raise ValueError("Snapshots are only available for whole worlds, not for ontologies.")
     if commit: self.parent.commit()
     _save(f, format, self, **kargs)
     
   
   
+def _split_ntriples(f, processes):
+  size = os.fstat(f.fileno()).st_size
+  if not size: return []
+  chunk_size = min(max(size // (4 * processes), 1 << 20), 1 << 25)
+  chunks     = []
+  start      = 0
+  with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+    while start < size:
+      end = m.find(b"\n", start + chunk_size)
+      end = size if end == -1 else end + 1
+      chunks.append((f.name, start, end))
+      start = end
+  return chunks
+
+def _parse_ntriples_chunk(chunk):
+  # IRIs are returned as indices in iris (>= 0), blank nodes as negative indices in bns (-1 is the first one),
+  # datatypes as indices in iris, language tags as strings, and "" for plain literals.
+  filename, start, end = chunk
+  with open(filename, "rb") as f:
+    with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as m:
+      lines = m[start:end].decode("utf8").split("\n")
+  splitter = re.compile(r"\s")
+  iris  = {}
+  bns   = {}
+  objs  = []
+  datas = []
+  
+  def iri_2_index(iri):
+    i = iris.get(iri)
+    if i is None: i = iris[iri] = len(iris)
+    return i
+  
+  def bn_2_index(bn):
+    i = bns.get(bn)
+    if i is None: i = bns[bn] = -1 - len(bns)
+    return i
+  
+  current_line = 0
+  try:
+    for line in lines:
+      current_line += 1
+      line = line.strip()
+      if (not line) or line.startswith("#"): continue
+      s,p,o = splitter.split(line[:-1].rstrip(), 2)
+      
+      if s.startswith("<"): s = iri_2_index(s[1:-1])
+      else:                 s = bn_2_index(s)
+      p = iri_2_index(p[1:-1])
+      
+      if   o.startswith("<"): objs.append((s, p, iri_2_index(o[1:-1])))
+      elif o.startswith("_"): objs.append((s, p, bn_2_index(o)))
+      elif o.startswith('"'):
+        o, d = o.rsplit('"', 1)
+        if d.startswith("^"):
+          d = d[3:-1]
+          if   d in INT_DATATYPES:   o = int  (o[1:])
+          elif d in FLOAT_DATATYPES: o = float(o[1:])
+          else:                      o = o[1:].encode("raw-unicode-escape").decode("unicode-escape")
+          d = iri_2_index(d)
+        else:
+          o = o[1:].encode("raw-unicode-escape").decode("unicode-escape")
+        datas.append((s, p, o, d))
+  except Exception:
+    return None, current_line, None, None, None, None
+  
+  return len(lines) - 1, None, list(iris), list(bns), objs, datas
+
+
 def _guess_format(f):
   if f.seekable():
     s = f.read(1000)
@@ -246,7 +365,12 @@ def _guess_format(f):
 
 
 def _save(f, format, graph, filter = None):
-  if   format == "ntriples":
+  if   (format == "ntriples" or format == "nquads") and (not filter) and hasattr(graph, "_iter_ntriples"):
+    for lines in graph._iter_ntriples(format == "nquads"): # Lines are formatted by the quadstore, and written by large chunks
+      lines.append("")
+      f.write("\n".join(lines).encode("utf8"))
+      
+  elif format == "ntriples":
     _unabbreviate = lru_cache(None)(graph._unabbreviate)
     
     for s,p,o,d in graph._iter_triples():
@@ -287,7 +411,7 @@ def _save(f, format, graph, filter = None):
       f.write(("<%s> %s %s %s .\n" % (c_2_iri[c], s, p, o)).encode("utf8"))
       
   elif format == "rdfxml":
-    @lru_cache(None)
+    @lru_cache(65536) # Bounded, for saving huge ontologies in constant memory
     def _unabbreviate(storid):
       r = graph._unabbreviate(storid).replace("&", "&amp;")
       if r.startswith(base_iri):
@@ -339,25 +463,6 @@ def _save(f, format, graph, filter = None):
         
       return xmln + x[splitat + 1:]
     
-    lines  = []
-    liness = {}
-    for type in [
-        "owl:Ontology",
-        "owl:ObjectProperty",
-        "owl:DatatypeProperty",
-        "owl:AnnotationProperty",
-        "owl:AllDisjointProperties",
-        "owl:Class",
-        "owl:AllDisjointClasses",
-        "owl:NamedIndividual",
-        "owl:AllDifferent",
-        "", ]:
-      liness[type] = l = []
-      lines.append(l)
-    
-    bn_2_inner_list = defaultdict(list)
-    inner_lists_used = set()
-    
     tags_with_list = {
       "owl:intersectionOf",
       "owl:unionOf",
@@ -376,174 +481,145 @@ def _save(f, format, graph, filter = None):
       "owl:NamedIndividual",
       }
     
+    # The file is written subject by subject, in storid order. Blank nodes are nested inside the subject that refers to them,
+    # by querying the quadstore. Only the XML namespaces and the ontology IRIs are gathered beforehand, in a first pass.
+    ontology_storids = []
+    for s,p,o,d in graph._iter_triples():
+      if filter and callable(filter) and not filter(graph, s, p, o, d): continue
+      abbrev(p)
+      if (p == rdf_type) and (d is None) and (not o < 0):
+        abbrev(o)
+        if (o == owl_ontology) and (not s in ontology_storids): ontology_storids.append(s)
+        
     def parse_list(bn):
       has_literal = False
       r = []
-      while bn and (bn != rdf_nil):
-        inner_lists_used.add(id(bn_2_inner_list[bn]))
-        #first = graph._get_obj_triple_sp_o(bn, rdf_first)
-        first, d = graph._get_triple_sp_od(bn, rdf_first)
-        if not ((d is None) and (first == rdf_nil)):
-          if not d is None: has_literal = True
-          r.append((first, d))
-        bn = graph._get_obj_triple_sp_o(bn, rdf_rest)
+      if bn and (bn != rdf_nil):
+        for first, d in graph._get_list_od(bn):
+          if not ((d is None) and (first == rdf_nil)):
+            if not d is None: has_literal = True
+            r.append((first, d))
       return has_literal, r
     
-    def purge():
-      nonlocal s_lines, current_s, type
-      
-      if current_s < 0:
-        l = bn_2_inner_list[current_s]
-        current_s = 0
-      else:
-        #l = liness.get(type) or l = lines[-1]
-        l = liness.get(type)
-        if l is None: l = lines[-1]
+    def is_referenced(bn):
+      for p in graph._get_obj_triples_o_p(bn):
+        if not (filter and callable(filter)): return True
+        for s in graph._get_obj_triples_po_s(p, bn):
+          if filter(graph, s, p, bn, None): return True
+      return False
+    
+    def inner_block(bn, indent, nested):
+      if bn in nested: return [] # Cyclic blank nodes cannot be nested
+      nested.add(bn)
+      r = block(bn, graph._get_triples_s_pod(bn), "", indent, nested)
+      nested.discard(bn)
+      return r
+    
+    def block(s, triples, about, indent, nested):
+      has_triple = False
+      type       = "rdf:Description"
+      s_lines    = []
+      for p,o,d in triples:
+        if filter and callable(filter) and not filter(graph, s, p, o, d): continue
+        has_triple = True
         
-      if s_lines:
-        if current_s < 0:
-          l.append("""<%s rdf:nodeID="node%s">""" % (type, -current_s))
-          
-        elif current_s > 0:
-          current_s = _unabbreviate(current_s)
-          l.append("""<%s rdf:about="%s">""" % (type, current_s))
+        if (p == rdf_type) and (type == "rdf:Description") and (not o < 0):
+          t = abbrev(o)
+          if not t in bad_types:
+            type = t
+            if type.startswith("#"): type = type[1:]
+            continue
           
-        else:
-          l.append("""<%s>""" % type)
-          
-        l.extend(s_lines)
-        s_lines = []
-        
-        l.append("""</%s>""" % type)
+        p = abbrev(p)
+        if p.startswith("#"): p = p[1:]
         
-      else:
-        if current_s < 0:
-          l.append("""<%s rdf:nodeID="node%s"/>""" % (type, -current_s))
-          
-        elif current_s > 0:
-          current_s = _unabbreviate(current_s)
-          l.append("""<%s rdf:about="%s"/>""" % (type, current_s))
+        if  not d is None:
+          if isinstance(o, str):  o = o.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+          if   isinstance(d, str) and d.startswith("@"): s_lines.append("""%s  <%s xml:lang="%s">%s</%s>""" % (indent, p, d[1:], o, p))
+          elif d:                                        s_lines.append("""%s  <%s rdf:datatype="%s">%s</%s>""" % (indent, p, _unabbreviate(d), o, p))
+          else:                                          s_lines.append("""%s  <%s>%s</%s>""" % (indent, p, o, p))
           
-        else:
-          l.append("""<%s/>""" % type)
-
-      if current_s: l.append("")
-      
-      
-    type      = "rdf:Description"
-    s_lines   = []
-    current_s = ""
-    for s,p,o,d in graph._iter_triples(False, True):
-      if filter and callable(filter) and not filter(graph, s, p, o, d): continue
-      if s != current_s:
-        if current_s: purge()
-        current_s = s
-        type = "rdf:Description"
-        
-      if (p == rdf_type) and (type == "rdf:Description") and (not o < 0):
-        t = abbrev(o)
-        if not t in bad_types:
-          type = t
-          if type.startswith("#"): type = type[1:]
-          continue
-        
-      p = abbrev(p)
-      if p.startswith("#"): p = p[1:]
-      
-      if  not d is None:
-        if isinstance(o, str):  o = o.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-        if   isinstance(d, str) and d.startswith("@"): s_lines.append("""  <%s xml:lang="%s">%s</%s>""" % (p, d[1:], o, p))
-        elif d:                                        s_lines.append("""  <%s rdf:datatype="%s">%s</%s>""" % (p, _unabbreviate(d), o, p))
-        else:                                          s_lines.append("""  <%s>%s</%s>""" % (p, o, p))
-        
-      elif o < 0:
+        elif o < 0:
           if p in tags_with_list:
             list_has_literal, list_elements = parse_list(o)
             if list_has_literal:
-              s_lines.append("""  <%s>""" % p)
-              
-              def do_i(l, i):
-                s_lines.append("""    <rdf:Description>""")
-                o, d = l[i]
+              s_lines.append("""%s  <%s>""" % (indent, p))
+              for i, (o, d) in enumerate(list_elements):
+                s_lines.append("""%s    <rdf:Description>""" % indent)
                 if d is None:
-                  s_lines.append("""  <rdf:first><rdf:Description rdf:about="%s"/></rdf:first>""" % o)
+                  if o < 0: # Blank node in a list that also holds literals
+                    s_lines.append("""%s  <rdf:first>""" % indent)
+                    s_lines.extend(inner_block(o, indent + "    ", nested))
+                    s_lines.append("""%s  </rdf:first>""" % indent)
+                  else:
+                    s_lines.append("""%s  <rdf:first rdf:resource="%s"/>""" % (indent, _unabbreviate(o)))
                 else:
-                  if   isinstance(d, str) and d.startswith("@"): s_lines.append("""  <rdf:first xml:lang="%s">%s</rdf:first>""" % (d[1:], o))
-                  elif d:                                        s_lines.append("""  <rdf:first rdf:datatype="%s">%s</rdf:first>""" % (_unabbreviate(d), o))
-                  else:                                          s_lines.append("""  <rdf:first>%s</rdf:first>""" % o)
-                if i < len(l) - 1:
-                  s_lines.append("""    <rdf:rest>""")
-                  do_i(l, i + 1)
-                  s_lines.append("""    </rdf:rest>""")
+                  if   isinstance(d, str) and d.startswith("@"): s_lines.append("""%s  <rdf:first xml:lang="%s">%s</rdf:first>""" % (indent, d[1:], o))
+                  elif d:                                        s_lines.append("""%s  <rdf:first rdf:datatype="%s">%s</rdf:first>""" % (indent, _unabbreviate(d), o))
+                  else:                                          s_lines.append("""%s  <rdf:first>%s</rdf:first>""" % (indent, o))
+                if i < len(list_elements) - 1:
+                  s_lines.append("""%s    <rdf:rest>""" % indent)
                 else:
-                  s_lines.append("""    <rdf:rest rdf:resource="http://www.w3.org/1999/02/22-rdf-syntax-ns#nil"/>""")
-                s_lines.append("""    </rdf:Description>""")
-              if list_elements: do_i(list_elements, 0)
-              
+                  s_lines.append("""%s    <rdf:rest rdf:resource="http://www.w3.org/1999/02/22-rdf-syntax-ns#nil"/>""" % indent)
+              for i in range(len(list_elements) - 1, -1, -1):
+                if i < len(list_elements) - 1:
+                  s_lines.append("""%s    </rdf:rest>""" % indent)
+                s_lines.append("""%s    </rdf:Description>""" % indent)
+                
             else:
-              s_lines.append("""  <%s rdf:parseType="Collection">""" % p)
+              s_lines.append("""%s  <%s rdf:parseType="Collection">""" % (indent, p))
               for i, d in list_elements:
                 if i < 0:
-                  l = bn_2_inner_list[i]
-                  inner_lists_used.add(id(l))
-                  s_lines.append(l)
+                  s_lines.extend(inner_block(i, indent + "    ", nested))
                 elif isinstance(i, int):
                   i = _unabbreviate(i)
-                  s_lines.append("""    <rdf:Description rdf:about="%s"/>""" % i)
+                  s_lines.append("""%s    <rdf:Description rdf:about="%s"/>""" % (indent, i))
                   
           else:
-            l = bn_2_inner_list[o]
-            inner_lists_used.add(id(l))
-            s_lines.append("""  <%s>""" % p)
-            s_lines.append(l)
-          s_lines.append("""  </%s>""" % p)
+            s_lines.append("""%s  <%s>""" % (indent, p))
+            s_lines.extend(inner_block(o, indent + "    ", nested))
+          s_lines.append("""%s  </%s>""" % (indent, p))
           
-      else:
-        o = _unabbreviate(o)
-        s_lines.append("""  <%s rdf:resource="%s"/>""" % (p, o))
-        
-    purge()
-
-    if len(bn_2_inner_list) != len(inner_lists_used):
-      lines.append([])
-      for l in bn_2_inner_list.values():
-        if not id(l) in inner_lists_used:
-          lines[-1].extend(l)
-          lines[-1].append("")
+        else:
+          o = _unabbreviate(o)
+          s_lines.append("""%s  <%s rdf:resource="%s"/>""" % (indent, p, o))
           
+      if not has_triple: return []
+      if s_lines:
+        s_lines.insert(0, """%s<%s%s>""" % (indent, type, about))
+        s_lines.append("""%s</%s>""" % (indent, type))
+        return s_lines
+      return ["""%s<%s%s/>""" % (indent, type, about)]
+    
+    def blocks():
+      for s in ontology_storids:
+        yield block(s, graph._get_triples_s_pod(s), ' rdf:about="%s"' % _unabbreviate(s), "", set())
+        
+      current_s = 0
+      triples   = []
+      for s,p,o,d in chain(graph._iter_triples(False, True), [(0, None, None, None)]):
+        if s != current_s:
+          if current_s and not (current_s in ontology_storids):
+            if   current_s > 0:                    yield block(current_s, triples, ' rdf:about="%s"' % _unabbreviate(current_s), "", set())
+            elif not is_referenced(current_s):     yield block(current_s, triples, "", "", { current_s }) # Orphan blank node
+          current_s = s
+          triples   = []
+        triples.append((p, o, d))
+        
     decls = []
-    for iri, abbrev in xmlns.items():
-      if   abbrev == "":  decls.append('xml:base="%s"' % iri)
-      elif abbrev == "#": decls.append('xmlns="%s"' % iri)
-      else:               decls.append('xmlns:%s="%s"' % (abbrev[:-1], iri))
+    for iri, xmln in xmlns.items():
+      if   xmln == "":  decls.append('xml:base="%s"' % iri)
+      elif xmln == "#": decls.append('xmlns="%s"' % iri)
+      else:             decls.append('xmlns:%s="%s"' % (xmln[:-1], iri))
     if base_iri.endswith("/"):
       decls.append('xmlns="%s"' % base_iri)
       
-    def flatten(l):
-      if not l: return
-      
-      c = [l]
-      p = [0]
-      while c:
-        v = c[-1][p[-1]]
-        deep = len(c)
-        
-        if p[-1] + 1 < len(c[-1]):
-          p[-1] += 1
-        else:
-          del c[-1]
-          del p[-1]
-          
-        if isinstance(v, list):
-          if v:
-            c.append(v)
-            p.append(0)
-        else:
-          yield "%s%s" % ("    " * (deep - 1), v)
-          
     f.write(b"""<?xml version="1.0"?>\n""")
     f.write(("""<rdf:RDF %s>\n\n""" % "\n         ".join(decls)).encode("utf8"))
-    f.write( """\n""".join(flatten(sum(lines, []))).encode("utf8"))
-    
-
+    sep = ""
+    for lines in blocks():
+      if lines:
+        f.write(("%s%s\n" % (sep, "\n".join(lines))).encode("utf8"))
+        sep = "\n"
+        
     f.write(b"""\n\n</rdf:RDF>\n""")
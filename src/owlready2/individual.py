@@ -104,7 +104,7 @@ class Thing(metaclass = ThingClass):
           
         return already_existing
       
-    return _cache_entity(object.__new__(Class))
+    return object.__new__(Class)
   
   def __init__(self, name = None, namespace = None, **kargs):
     if   isinstance(name, int):
@@ -128,6 +128,7 @@ class Thing(metaclass = ThingClass):
       if isinstance(name, int): self.storid = name or self.namespace.world.graph.new_blank_node()
       else:                     self.storid = self.namespace.world._abbreviate(iri)
       self.namespace.world._entities[self.storid] = self
+      _cache_entity(self)
       if isinstance(self.__class__, FusionClass):
         self.__dict__["is_a"] = CallbackList(self.__class__.__bases__, self, Thing._instance_is_a_changed)
       else:
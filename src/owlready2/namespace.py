@@ -38,6 +38,8 @@ from typing import List, Tuple
 
 CURRENT_NAMESPACES = ContextVar("CURRENT_NAMESPACES", default = None)
 
+_LOAD_BATCH_SIZE = 1000 # Number of entities loaded at once by lazy listings (classes(), individuals(),...) and SPARQL results
+
 PREDEFINED_ONTOLOGIES = {
   "http://www.lesfleursdunormal.fr/static/_downloads/owlready_ontology.owl#" : "owlready_ontology.owl",
   "http://purl.org/dc/elements/1.1/" : "dc.owl",
@@ -260,20 +262,13 @@ WHERE q1.p=? AND q1.o=?
       print("* Owlready2 * DEL TRIPLE", s, p, o, d, file = sys.stderr)
 
   def _parse_list(self, bnode):
-    l = []
-    while bnode and (bnode != rdf_nil):
-      first, d = self._get_triple_sp_od(bnode, rdf_first)
-      if not ((first == rdf_nil) and (d is None)): l.append(self._to_python(first, d))
-      bnode = self._get_obj_triple_sp_o(bnode, rdf_rest)
-    return l
+    if (not bnode) or (bnode == rdf_nil): return []
+    return [self._to_python(first, d) for first, d in self._get_list_od(bnode) if not ((first == rdf_nil) and (d is None))]
 
   def _parse_list_as_rdf(self, bnode):
-    while bnode and (bnode != rdf_nil):
-      first, d = self._get_triple_sp_od(bnode, rdf_first)
+    if (not bnode) or (bnode == rdf_nil): return
+    for first, d in self._get_list_od(bnode):
       if not ((first == rdf_nil) and (d is None)): yield first, d
-      #if (first == rdf_nil) and (d is None): return
-      #yield first, d
-      bnode = self._get_obj_triple_sp_o(bnode, rdf_rest)
 
   def _to_python(self, o, d = None, main_type = None, main_onto = None, default_to_none = False):
     if d is None:
@@ -289,31 +284,32 @@ WHERE q1.p=? AND q1.o=?
     if not d is None: return d, None
     return to_literal(o)
 
+  def _get_entities_by_type(self, type):
+    storids = (s for s in self._get_obj_triples_po_s(rdf_type, type) if not s < 0)
+    while True:
+      chunk = list(itertools.islice(storids, _LOAD_BATCH_SIZE))
+      if not chunk: break
+      yield from self.world._get_by_storids(chunk)
+
   def classes(self):
-    for s in self._get_obj_triples_po_s(rdf_type, owl_class):
-      if not s < 0: yield self.world._get_by_storid(s)
+    yield from self._get_entities_by_type(owl_class)
 
   def inconsistent_classes(self):
     for s in self._get_obj_triples_transitive_sym(owl_nothing, owl_equivalentclass):
       if not s < 0: yield self.world._get_by_storid(s)
 
   def data_properties(self):
-    for s in self._get_obj_triples_po_s(rdf_type, owl_data_property):
-      if not s < 0: yield self.world._get_by_storid(s)
+    yield from self._get_entities_by_type(owl_data_property)
   def object_properties(self):
-    for s in self._get_obj_triples_po_s(rdf_type, owl_object_property):
-      if not s < 0: yield self.world._get_by_storid(s)
+    yield from self._get_entities_by_type(owl_object_property)
   def annotation_properties(self):
-    for s in self._get_obj_triples_po_s(rdf_type, owl_annotation_property):
-      if not s < 0: yield self.world._get_by_storid(s)
+    yield from self._get_entities_by_type(owl_annotation_property)
   def properties(self): return itertools.chain(self.data_properties(), self.object_properties(), self.annotation_properties())
 
   def individuals(self):
-    for s in self._get_obj_triples_po_s(rdf_type, owl_named_individual):
-      if not s < 0:
-        i = self.world._get_by_storid(s)
-        if isinstance(i, Thing):
-          yield i
+    for i in self._get_entities_by_type(owl_named_individual):
+      if isinstance(i, Thing):
+        yield i
 
   def variables(self):
     for s in self._get_obj_triples_po_s(rdf_type, swrl_variable):
@@ -409,34 +405,69 @@ onto_path = []
 
 owl_world = None
 
-_cache = [None] * (2 ** 16)
-_cache_index = 0
+class EntityCache(object):
+  """Keeps strong references on the recently used entities of a world (LRU eviction), since World._entities only holds weak references."""
+  def __init__(self, size = 2 ** 16):
+    self._entities   = OrderedDict()
+    self._pinned     = {}
+    self._size       = size
+    self.nb_hit      = 0
+    self.nb_miss     = 0
+    self.nb_eviction = 0
+
+  def get_size(self): return self._size
+  def set_size(self, size):
+    self._size = size
+    self._evict()
+  size = property(get_size, set_size)
+
+  def _evict(self):
+    while len(self._entities) > self._size:
+      self._entities.popitem(last = False)
+      self.nb_eviction += 1
+
+  def add(self, entity):
+    self._entities[id(entity)] = entity
+    self._entities.move_to_end(id(entity))
+    self._evict()
+    return entity
+
+  def touch(self, entity):
+    try:             self._entities.move_to_end(id(entity))
+    except KeyError: self.add(entity) # Still alive, but already evicted
+    self.nb_hit += 1
 
-def _cache_entity(entity):
-  global _cache, _cache_index
-  _cache[_cache_index] = entity
-  _cache_index += 1
-  if _cache_index >= len(_cache): _cache_index = 0
-  return entity
+  def discard(self, entity):
+    self._entities.pop(id(entity), None)
+    self._pinned  .pop(id(entity), None)
 
-def _clear_cache():
-  import gc
-  global _cache, _cache_index
+  def pin(self, entities):
+    for entity in entities: self._pinned[id(entity)] = entity
 
-  d = weakref.WeakKeyDictionary()
-  for i in _cache:
-    if i is None: break
-    d[i] = 1
+  def unpin(self, entities):
+    for entity in entities: self._pinned.pop(id(entity), None)
 
-  _cache.__init__([None] * len(_cache))
-  _cache_index = 0
+  def clear(self):
+    self._entities.clear()
+    self._pinned  .clear()
 
-  gc.collect()
-  gc.collect()
+  def __len__(self): return len(self._entities)
+  def __iter__(self): return iter(list({ **self._pinned, **self._entities }.values())) # Pinned entities included
+  def __contains__(self, entity): return (id(entity) in self._entities) or (id(entity) in self._pinned)
+
+  def stats(self):
+    return { "size" : self._size, "nb_cached" : len(self._entities), "nb_pinned" : len(self._pinned),
+             "nb_hit" : self.nb_hit, "nb_miss" : self.nb_miss, "nb_eviction" : self.nb_eviction }
+
+
+def _cache_entity(entity):
+  return entity.namespace.world._entity_cache.add(entity)
+
+def _clear_cache():
+  import gc
+  for world in [owl_world, *WORLDS]: world._entity_cache.clear()
   gc.collect()
 
-  for i in d.keys():
-    pass
 
 WORLDS = weakref.WeakSet()
 
@@ -457,7 +488,7 @@ class InspectedDict(dict):
     del self.dict[k]
 
 class World(_GraphManager):
-  def __init__(self, backend = "sqlite", filename = ":memory:", dbname = "owlready2_quadstore", **kargs):
+  def __init__(self, backend = "sqlite", filename = ":memory:", dbname = "owlready2_quadstore", entity_cache_size = 2 ** 16, **kargs):
     global owl_world
     
     self.world            = self
@@ -466,9 +497,13 @@ class World(_GraphManager):
     self._props           = {}  # InspectedDict()
     self._reasoning_props = {}
     self._entities        = weakref.WeakValueDictionary()
+    self._entity_cache    = EntityCache(entity_cache_size)
     self._namespaces      = weakref.WeakValueDictionary()
     self._fusion_class_cache = {}
     self._rdflib_store    = None
+    self._sparql_metrics  = None
+    self._auto_stats      = False
+    self._nb_stats_update = 0
     self.graph            = None
     self.backend = backend
     self.pbar = tqdm(position=0, unit=' entities', desc='Loaded', disable=filename == None)
@@ -523,13 +558,39 @@ class World(_GraphManager):
     self.graph.close()
 
   def _destroy_cached_entities(self):
-    _entities = self._entities
-    _fusion_classes = set(self._fusion_class_cache.values())
-    for i, cached in enumerate(_cache):
-      if (not cached is None) and ((cached.namespace.world is self) or (cached in _fusion_classes)):
-        _cache[i] = None
+    for fusion_class in self._fusion_class_cache.values():
+      fusion_class.namespace.world._entity_cache.discard(fusion_class)
+    self._entity_cache.clear()
     self._entities.clear()
 
+  def get_entity_cache_stats(self): return self._entity_cache.stats()
+  def pin_entities  (self, entities): self._entity_cache.pin  (entities)
+  def unpin_entities(self, entities): self._entity_cache.unpin(entities)
+
+  def enable_sparql_metrics(self, enabled = True):
+    if   not enabled:                  self._sparql_metrics = None
+    elif self._sparql_metrics is None: self._sparql_metrics = {}
+  def get_sparql_metrics(self): return { query : dict(metrics) for (query, metrics) in (self._sparql_metrics or {}).items() }
+  def reset_sparql_metrics(self):
+    if not self._sparql_metrics is None: self._sparql_metrics.clear()
+
+  def update_stats(self):
+    self.graph.update_stats()
+    self._nb_stats_update += 1 # Queries are prepared according to the stats; this invalidates those prepared for this world
+    
+  def enable_auto_stats(self, enabled = True): self._auto_stats = enabled
+  
+  def _check_stats(self): # Lazy update of the stats, when preparing a query after the quadstore has been modified
+    if self._auto_stats and not self.graph.has_exact_stats(): self.update_stats()
+    
+  def get_shortest_path(self, start, end, props, max_length = None):
+    # props is a property or a list of properties; Inverse(prop) follows prop backward. Returns the list of entities from start to end, or None
+    if not isinstance(props, (list, tuple, set)): props = [props]
+    ps         = [prop.storid          for prop in props if not isinstance(prop, Inverse)]
+    inverse_ps = [prop.property.storid for prop in props if     isinstance(prop, Inverse)]
+    path = self.graph._get_obj_shortest_path(start.storid, end.storid, ps, inverse_ps, 0, max_length)
+    if not path is None: return [self._get_by_storid(x) for x in path]
+
   def get_full_text_search_properties(self): return self._full_text_search_properties
   def set_full_text_search_properties(self, l):
     old = self._full_text_search_properties
@@ -551,7 +612,7 @@ class World(_GraphManager):
       self.graph.commit()
     elif isinstance(file, str):
       if _LOG_LEVEL: print("* Owlready2 * Saving world %s to %s..." % (self, file), file = sys.stderr)
-      file = open(file, "wb")
+      file = _open_save_file(file)
       self.graph.save(file, format, **kargs)
       file.close()
     else:
@@ -572,18 +633,20 @@ class World(_GraphManager):
       return self.graph.client.execute_owlready(sparql, error_on_undefined_entities=error_on_undefined_entities)
     else:
       import owlready2.sparql.main
-      query = self._prepare_sparql(sparql, error_on_undefined_entities)
+      self._check_stats()
+      query = self._prepare_sparql(sparql, error_on_undefined_entities, self._nb_stats_update)
       return query.execute(params)
 
   @lru_cache(maxsize = 1024)
-  def _prepare_sparql(self, sparql, error_on_undefined_entities):
+  def _prepare_sparql(self, sparql, error_on_undefined_entities, nb_stats_update):
     if self.backend == 'sparql-endpoint':
       raise TypeError('Backend sparql-endpoint does not support `World.prepare_sparql` method.')
     import owlready2.sparql.main
     return owlready2.sparql.main.Translator(self, error_on_undefined_entities).parse(sparql)
 
   def prepare_sparql(self, sparql, error_on_undefined_entities = True): # lru_cache does not handle optional args
-    return self._prepare_sparql(sparql, error_on_undefined_entities)
+    self._check_stats()
+    return self._prepare_sparql(sparql, error_on_undefined_entities, self._nb_stats_update)
 
   def get_ontology(self, base_iri, OntologyClass = None, graph_iri=None, location=None):
     if location is None:
@@ -649,14 +712,15 @@ class World(_GraphManager):
     if d is None: self._del_obj_triple_raw_spo  (s,p,o)
     else:         self._del_data_triple_raw_spod(s,p,o,d)
     
-  def _add_triples_with_update(self, ontology0, triples):
+  def _get_update_ontology(self, ontology0):
     l = owlready2.namespace.CURRENT_NAMESPACES.get()
-    if l:
-      ontology = l[-1].ontology
-    else:
-      ontology = ontology0
-      if not ontology:
-        raise ValueError("Cannot add triples outside a 'with' block. Please start a 'with' block to indicate in which ontology the new triple is added, or include a 'WITH <onto_IRI>' statement in SPARQL.")
+    if l: return l[-1].ontology
+    if not ontology0:
+      raise ValueError("Cannot add triples outside a 'with' block. Please start a 'with' block to indicate in which ontology the new triple is added, or include a 'WITH <onto_IRI>' statement in SPARQL.")
+    return ontology0
+  
+  def _add_triples_with_update(self, ontology0, triples):
+    ontology = self._get_update_ontology(ontology0)
 
     is_a_triples = defaultdict(list)
 
@@ -737,18 +801,66 @@ class World(_GraphManager):
 
   def _get_by_storid(self, storid, full_iri = None, main_type = None, main_onto = None, trace = None, default_to_none = True, co_rdf_type=None, co_rdfs_subpropertyof=None):
     entity = self._entities.get(storid)
-    if not entity is None: return entity
+    if not entity is None:
+      self._entity_cache.touch(entity)
+      return entity
 
+    self._entity_cache.nb_miss += 1
     try:
       return self._load_by_storid(storid, full_iri, main_type, main_onto, default_to_none, co_rdf_type=co_rdf_type, co_rdfs_subpropertyof=co_rdfs_subpropertyof)
     except RecursionError:
       return self._load_by_storid(storid, full_iri, main_type, main_onto, default_to_none, (), co_rdf_type=co_rdf_type, co_rdfs_subpropertyof=co_rdfs_subpropertyof)
 
+  def _get_by_storids(self, storids, default_to_none = True):
+    storids   = list(storids)
+    _entities = self._entities
+    missing   = [storid for storid in dict.fromkeys(storids)
+                 if isinstance(storid, int) and (storid > 0) and (not storid in _entities) and (not storid in _universal_abbrev_2_datatype)]
+
+    loaded = {}
+    if missing and self.graph:
+      # Fetch types, superclasses / superproperties and IRIs of all missing entities at once
+      co_rdf_types = defaultdict(list)
+      co_is_as     = defaultdict(list)
+      for c, s, p, o in self.graph._get_obj_triples_sp_cspo(missing, [rdf_type, rdfs_subclassof, rdfs_subpropertyof]):
+        if p == rdf_type: co_rdf_types[s].append((c, o))
+        else:             co_is_as[s, p].append((c, o))
+      iris = self.graph._unabbreviate_storids(missing)
+
+      # Topological sort, so as parents in the batch are created before their children
+      missing_set = set(missing)
+      ordered     = []
+      states      = {}
+      for root in missing:
+        if root in states: continue
+        stack = [root]
+        while stack:
+          storid = stack[-1]
+          if not storid in states:
+            states[storid] = 1
+            for c, o in itertools.chain(co_rdf_types[storid], co_is_as[storid, rdfs_subclassof], co_is_as[storid, rdfs_subpropertyof]):
+              if (o in missing_set) and (not o in states): stack.append(o)
+          else:
+            stack.pop()
+            if states[storid] == 1:
+              states[storid] = 2
+              ordered.append(storid)
+
+      for storid in ordered:
+        co_rdf_type = co_rdf_types[storid]
+        if any((o == owl_object_property) or (o == owl_data_property) or (o == owl_annotation_property) for c, o in co_rdf_type):
+          co_is_a = co_is_as[storid, rdfs_subpropertyof]
+        else:
+          co_is_a = co_is_as[storid, rdfs_subclassof]
+        loaded[storid] = self._get_by_storid(storid, iris.get(storid), default_to_none = default_to_none, co_rdf_type = co_rdf_type, co_rdfs_subpropertyof = co_is_a)
+
+    return [loaded[storid] if storid in loaded else self._get_by_storid(storid, default_to_none = default_to_none) for storid in storids]
+
   def _load_by_storid(self, storid, full_iri = None, main_type = None, main_onto = None, default_to_none = True, trace = None, co_rdf_type=None, co_rdfs_subpropertyof=None):
     with LOADING:
       types       = []
       is_a_bnodes = []
-      self.pbar.set_postfix_str(f'Current: {self._unabbreviate(storid)}')
+      self.pbar.set_postfix_str(f'Current: {full_iri or self._unabbreviate(storid)}')
       self.pbar.update(1)
       # print(f'Loading {self._unabbreviate(storid)}')
 
@@ -891,6 +1003,35 @@ class World(_GraphManager):
           if onto.graph.c == c: return onto._parse_bnode(bnode)
 
 
+class _BNodeSubtree(object):
+  # The triples of a blank node and of all the blank nodes reachable from it (nested constructs and lists), fetched in a single query.
+  # It provides the reading methods of Ontology needed for parsing the constructs, without querying the quadstore again.
+  def __init__(self, ontology, bnode):
+    self.ontology = ontology
+    self.triples  = ontology._get_bnode_subtree(bnode)
+
+  def _get_obj_triple_sp_o(self, s, p):
+    for p2, o, d in self.triples.get(s, ()):
+      if (p2 == p) and (d is None): return o
+
+  def _get_triple_sp_od(self, s, p):
+    for p2, o, d in self.triples.get(s, ()):
+      if p2 == p: return o, d
+
+  def _to_python(self, o, d = None, main_type = None, main_onto = None, default_to_none = False):
+    if (d is None) and (not o is None) and (o < 0) and (o in self.triples): return self.ontology._parse_bnode(o, self)
+    return self.ontology._to_python(o, d, main_type, main_onto, default_to_none)
+
+  def _parse_list(self, bnode):
+    l = []
+    while bnode and (bnode != rdf_nil):
+      if not bnode in self.triples: return l + self.ontology._parse_list(bnode) # List from another ontology
+      first, d = self._get_triple_sp_od(bnode, rdf_first)
+      if not ((first == rdf_nil) and (d is None)): l.append(self._to_python(first, d))
+      bnode = self._get_obj_triple_sp_o(bnode, rdf_rest)
+    return l
+
+
 class Ontology(Namespace, _GraphManager):
   def __init__(self, world, base_iri, name = None, graph_iri=None, import_location=None):
     #need_write = False
@@ -975,7 +1116,9 @@ class Ontology(Namespace, _GraphManager):
     del self.world.ontologies[self.base_iri]
     self.graph.destroy()
     for entity in list(self.world._entities.values()):
-      if entity.namespace.ontology is self: del self.world._entities[entity.storid]
+      if entity.namespace.ontology is self:
+        del self.world._entities[entity.storid]
+        self.world._entity_cache.discard(entity)
     self.world.graph.release_write_lock()
 
   def _entity_destroyed(self, entity): pass
@@ -1024,11 +1167,52 @@ class Ontology(Namespace, _GraphManager):
 
   def _destroy_cached_entities(self):
     _entities = self.world._entities
-    for i, cached in enumerate(_cache):
-      if (not cached is None) and (cached.namespace.ontology is self):
+    for cached in self.world._entity_cache:
+      if cached.namespace.ontology is self:
         if cached.storid in _entities: del _entities[cached.storid]
-        _cache[i] = None
+        self.world._entity_cache.discard(cached)
 
+  def _refresh_cached_entities(self, changed):
+    # The loaded entities whose triples have changed are updated in place, whatever their ontology,
+    # so as the other loaded entities referring to them remain valid.
+    world = self.world
+    with LOADING:
+      for storid, predicates in changed.items():
+        entity = world._entities.get(storid)
+        if entity is None: continue
+        
+        if predicates & { rdf_type, rdfs_subclassof, rdfs_subpropertyof }:
+          if   isinstance(entity, ThingClass):
+            parents = world._get_obj_triples_sp_o(storid, rdfs_subclassof)
+          elif isinstance(entity, PropertyClass):
+            parents = [o for o in world._get_obj_triples_sp_o(storid, rdf_type) if o != rdf_property]
+            parents.extend(world._get_obj_triples_sp_o(storid, rdfs_subpropertyof))
+          else:
+            parents = [o for o in world._get_obj_triples_sp_o(storid, rdf_type) if (o != owl_named_individual) and (o != owl_thing)]
+          parents = [world._to_python(o, default_to_none = True) for o in parents]
+          entity.is_a.reinit([parent for parent in parents if not parent is None])
+          if isinstance(entity, EntityClass):
+            for Subclass in entity.descendants(True, True): _FUNCTIONAL_FOR_CACHE.pop(Subclass, None)
+            
+        if predicates & { owl_equivalentclass, owl_equivalentproperty, owl_equivalentindividual }:
+          if not entity._equivalent_to is None:
+            for x in entity._equivalent_to:
+              if (not isinstance(x, Construct)) and (not x._equivalent_to is None): x._equivalent_to._indirect = None
+            entity._equivalent_to = None # Reloaded from the quadstore on next access
+            
+        if isinstance(entity, PropertyClass):
+          if rdf_domain in predicates: entity._domain = None
+          if rdf_range  in predicates: entity._range  = None
+          
+        for p in predicates: # Cached property values
+          Prop = world._entities.get(p)
+          if   isinstance(Prop, ObjectPropertyClass): Props = [Prop, Prop.inverse] if Prop.inverse else [Prop]
+          elif isinstance(Prop, PropertyClass):       Props = [Prop]
+          else: continue
+          for Prop in Props:
+            for attr in (Prop.python_name, "__%s" % Prop.python_name): # Annotations of classes are cached with a "__" prefix
+              if attr in entity.__dict__: delattr(entity, attr)
+              
   def load(self, only_local = False, fileobj = None, reload = False, reload_if_newer = False, url = None, load_all_properties = True, **args):
     if self.loaded and (not reload): return self
 
@@ -1042,7 +1226,7 @@ class Ontology(Namespace, _GraphManager):
 
     self.world.graph.acquire_write_lock()
 
-    if reload: self._destroy_cached_entities()
+    if reload and not args.get("incremental"): self._destroy_cached_entities()
 
     new_base_iri = None
     if f.startswith("http:") or f.startswith("https:"):
@@ -1207,7 +1391,7 @@ class Ontology(Namespace, _GraphManager):
       file.close()
     elif isinstance(file, str):
       if _LOG_LEVEL: print("* Owlready2 * Saving ontology %s to %s..." % (self.name, file), file = sys.stderr)
-      file = open(file, "wb")
+      file = _open_save_file(file)
       self.graph.save(file, format, **kargs)
       file.close()
     else:
@@ -1312,35 +1496,38 @@ class Ontology(Namespace, _GraphManager):
       for e in subclasses:        e.is_a         ._replace(old, new)
       for e in equivalentclasses: e.equivalent_to._replace(old, new)
 
-  def _parse_bnode(self, bnode):
+  def _parse_bnode(self, bnode, subtree = None):
     r = self._bnodes.get(bnode)
     if not r is None: return r
 
+    if subtree is None: subtree = _BNodeSubtree(self, bnode)
+    triples = subtree.triples.get(bnode, ())
+
     with LOADING:
       restriction_property = restriction_type = restriction_cardinality = Disjoint = members = on_datatype = with_restriction = None
-      preds_objs = self._get_obj_triples_s_po(bnode)
+      preds_objs = [(p, o) for p, o, d in triples if d is None]
       if not preds_objs: # Probably a blank node from another ontology
         return self.world._parse_bnode(bnode)
       for pred, obj in preds_objs:
-        if   pred == owl_complementof:   r = Not          (None, self, bnode); break # will parse the rest on demand
-        elif pred == owl_unionof:        r = Or           (obj , self, bnode); break
-        elif pred == owl_intersectionof: r = And          (obj , self, bnode); break
+        if   pred == owl_complementof:   r = Not          (None, self, bnode); r.__dict__["_subtree"] = subtree; break # will parse the rest on demand
+        elif pred == owl_unionof:        r = Or           (obj , self, bnode); r.__dict__["_subtree"] = subtree; break
+        elif pred == owl_intersectionof: r = And          (obj , self, bnode); r.__dict__["_subtree"] = subtree; break
         #elif pred == owl_disjointunion:  r = DisjointUnion(obj , self, bnode); break
 
-        elif pred == owl_onproperty: restriction_property = self._to_python(obj, None)
+        elif pred == owl_onproperty: restriction_property = subtree._to_python(obj, None)
 
         elif pred == SOME:      restriction_type = SOME;
         elif pred == ONLY:      restriction_type = ONLY;
         elif pred == VALUE:     restriction_type = VALUE;
         elif pred == HAS_SELF:  restriction_type = HAS_SELF;
 
-        elif pred == owl_oneof: r = OneOf(self._parse_list(obj), self, bnode); break
+        elif pred == owl_oneof: r = OneOf(subtree._parse_list(obj), self, bnode); break
 
         elif pred == owl_members:          members = obj
         elif pred == owl_distinctmembers:  members = obj
 
         elif pred == owl_inverse_property:
-          r = Inverse(self._to_python(obj, None), self, bnode, False)
+          r = Inverse(subtree._to_python(obj, None), self, bnode, False)
           break
 
         elif pred == rdf_type:
@@ -1356,12 +1543,14 @@ class Ontology(Namespace, _GraphManager):
       else:
         if   restriction_type:
           r = Restriction(restriction_property, restriction_type, None, None, self, bnode)
+          r.__dict__["_subtree"] = subtree
         elif Disjoint:
           r = Disjoint(members, self, bnode)
         elif on_datatype and with_restriction:
           r = ConstrainedDatatype(on_datatype, self, bnode, with_restriction)
         else:
-          for pred, obj, d in self._get_data_triples_s_pod(bnode):
+          for pred, obj, d in triples:
+            if d is None: continue
             if   pred == VALUE:     restriction_type = VALUE;
             elif pred == EXACTLY:   restriction_type = EXACTLY; restriction_cardinality = self._to_python(obj, d)
             elif pred == MIN:       restriction_type = MIN;     restriction_cardinality = self._to_python(obj, d)
@@ -1371,6 +1560,7 @@ class Ontology(Namespace, _GraphManager):
             elif pred == owl_max_cardinality: restriction_type = MAX;     restriction_cardinality = self._to_python(obj, d)
             if restriction_type:
               r = Restriction(restriction_property, restriction_type, restriction_cardinality, None, self, bnode)
+              r.__dict__["_subtree"] = subtree
               break
             #else:
             #  s = ""
@@ -1471,6 +1661,12 @@ class Metadata(object):
 
 
 
+def _open_save_file(filename):
+  if filename.endswith(".gz"):
+    import gzip
+    return gzip.open(filename, "wb")
+  return open(filename, "wb")
+
 def _open_onto_file(base_iri, name, mode = "r", only_local = False):
   if base_iri.endswith("#") or base_iri.endswith("/"): base_iri = base_iri[:-1]
   if base_iri.startswith("file://"): return open(urllib.parse.unquote(base_iri[7:]), mode)
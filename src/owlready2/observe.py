@@ -18,12 +18,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 __all__ = ["start_observing", "stop_observing", "observe", "unobserve", "isobserved", "send_event", "scan_collapsed_changes",
-           "InstancesOfClass"]
+           "observation_batch", "InstancesOfClass"]
 
-import weakref
+import weakref, bisect
+from collections import defaultdict
 
 from owlready2.base import rdf_type, rdfs_subclassof, owl_equivalentclass, owl_equivalentproperty, owl_equivalentindividual
 from owlready2.namespace import Ontology
+from owlready2.triplelite import _MAX_SQL_PARAMS
 from owlready2 import Thing, ThingClass
 
 class ObservedOntology(Ontology):
@@ -36,77 +38,71 @@ class ObservedOntology(Ontology):
   def _get_pred_value_data(self, subject, predicate):
     return [self._to_python(o, d) for o, d in self._get_data_triples_sp_od(subject, predicate)]
   
-  def _gen_triple_method_obj(self, triple_method):
+  def _gen_triple_method_obj(self, triple_method, change = "add"):
     def f(subject, predicate, object):
-      observation = self.world._observations.get(subject)
+      batch = self.world._observation_batch
+      triple_method(subject, predicate, object)
       
-      #if (predicate == rdf_type) and _INSTANCES_OF_CLASS:
-      #  Class = self.world._get_by_storid(object)
-      #  l_2_old_instances = {}
-      #  if not Class is None: # Else it is Thing
-      #    for parent in Class.ancestors():
-      #      for l in _INSTANCES_OF_CLASS.get(parent.storid, ()):
-      #        l_2_old_instances[l] = l._get_old_value()
-              
+      observation = self.world._observations.get(subject)
       if observation:
-        #old = self._get_pred_value_obj(subject, predicate)
-        triple_method(subject, predicate, object)
-        #new = self._get_pred_value_obj(subject, predicate)
-        observation.call(predicate)
-        
-      else:
-        triple_method(subject, predicate, object)
+        if batch: batch.events[subject, predicate] = None
+        else:     observation.call(predicate)
         
       observation = self.world._observations.get(object)
       if observation:
         Prop = self.world._entities.get(predicate)
         if Prop and Prop.inverse:
-          observation.call(Prop._inverse_storid)
-          
-      #if (predicate == rdf_type) and _INSTANCES_OF_CLASS and (not Class is None):
-      #  for l, old_instances in l_2_old_instances.items():
-      #    l._changed()
+          if batch: batch.events[object, Prop._inverse_storid] = None
+          else:     observation.call(Prop._inverse_storid)
           
       if (predicate == rdf_type) and _INSTANCES_OF_CLASS:
         Class = self.world._get_by_storid(object)
         if not Class is None: # Else it is Thing
           for parent in Class.ancestors():
             for l in _INSTANCES_OF_CLASS.get(parent.storid, ()):
-              l._changed()
+              if   batch:           batch.instance_changed(l, subject, change != "del")
+              elif change == "add": l._instance_added(subject)
+              elif change == "set": l._apply_changes({ subject }, ())
+              else:                 l._apply_changes((), { subject })
               
+      if _INSTANCES_OF_CLASS_ORDER_BY: _order_key_changed(batch, subject, predicate)
+      
     return f
   
   def _gen_triple_method_data(self, triple_method):
     def f(subject, predicate, object, datatype):
-      observation = self.world._observations.get(subject)
+      triple_method(subject, predicate, object, datatype)
       
+      observation = self.world._observations.get(subject)
       if observation:
-        #old = self._get_triples_sp_od(subject, predicate)
-        triple_method(subject, predicate, object, datatype)
-        #new = self._get_triples_sp_od(subject, predicate)
-        observation.call(predicate) #, new, old)
-      else:
-        triple_method(subject, predicate, object, datatype)
+        batch = self.world._observation_batch
+        if batch: batch.events[subject, predicate] = None
+        else:     observation.call(predicate)
         
+      if _INSTANCES_OF_CLASS_ORDER_BY: _order_key_changed(self.world._observation_batch, subject, predicate)
+      
     return f
   
   def _entity_destroyed(self, entity):
     if _INSTANCES_OF_CLASS and isinstance(entity, Thing):
       Classes   = [Class for Class in entity.is_a if isinstance(Class, ThingClass)]
       Ancestors = { Ancestor for Class in Classes for Ancestor in Class.ancestors() }
+      batch     = self.world._observation_batch
       for Ancestor in Ancestors:
         for l in _INSTANCES_OF_CLASS.get(Ancestor.storid, ()):
-          l._changed()
+          if batch: batch.instance_changed(l, entity.storid, False)
+          else:     l._apply_changes((), { entity.storid })
 
     
   
 def start_observing(onto):
   if not hasattr(onto.world, "_observations"): onto.world._observations = {}
+  if not hasattr(onto.world, "_observation_batch"): onto.world._observation_batch = None
   if not onto.__class__ is ObservedOntology:
     onto.__class__ = ObservedOntology
     onto._add_obj_triple_raw_spo   = onto._gen_triple_method_obj(onto.graph._add_obj_triple_raw_spo)
-    onto._set_obj_triple_raw_spo   = onto._gen_triple_method_obj(onto.graph._set_obj_triple_raw_spo)
-    onto._del_obj_triple_raw_spo   = onto._gen_triple_method_obj(onto.graph._del_obj_triple_raw_spo)
+    onto._set_obj_triple_raw_spo   = onto._gen_triple_method_obj(onto.graph._set_obj_triple_raw_spo, "set")
+    onto._del_obj_triple_raw_spo   = onto._gen_triple_method_obj(onto.graph._del_obj_triple_raw_spo, "del")
     onto._add_data_triple_raw_spod = onto._gen_triple_method_data(onto.graph._add_data_triple_raw_spod)
     onto._set_data_triple_raw_spod = onto._gen_triple_method_data(onto.graph._set_data_triple_raw_spod)
     onto._del_data_triple_raw_spod = onto._gen_triple_method_data(onto.graph._del_data_triple_raw_spod)
@@ -122,6 +118,66 @@ def stop_observing(onto):
   
   
 
+def _order_key_changed(batch, subject, predicate):
+  # Repositions subject in the ordered InstancesOfClass sorted by predicate
+  for l in _INSTANCES_OF_CLASS_ORDER_BY.get(predicate, ()):
+    if batch: batch.key_changed(l, subject)
+    else:     l._apply_changes((), (), (subject,))
+    
+class _ObservationBatch(object):
+  def __init__(self, world):
+    self.world             = world
+    self.level             = 0
+    self.events            = {} # (storid, predicate) => None, i.e. an ordered set
+    self.instances_added   = defaultdict(dict)
+    self.instances_removed = defaultdict(dict)
+    self.keys_changed      = defaultdict(dict)
+    
+  def __enter__(self):
+    self.level += 1
+    if self.level == 1:
+      if not hasattr(self.world, "_observations"): self.world._observations = {}
+      self.world._observation_batch = self
+    return self
+  
+  def __exit__(self, exc_type = None, exc_val = None, exc_tb = None):
+    self.level -= 1
+    if self.level == 0:
+      self.world._observation_batch = None
+      self.flush()
+      
+  def instance_changed(self, l, storid, added):
+    if added:
+      self.instances_removed[l].pop(storid, None)
+      self.instances_added  [l][storid] = None
+    else:
+      self.instances_added  [l].pop(storid, None)
+      self.instances_removed[l][storid] = None
+      
+  def key_changed(self, l, storid):
+    self.keys_changed[l][storid] = None
+    
+  def flush(self):
+    events, self.events = self.events, {}
+    for o, predicate in events:
+      observation = self.world._observations.get(o)
+      if observation: observation.call(predicate)
+      
+    lists = set(self.instances_added) | set(self.instances_removed) | set(self.keys_changed)
+    instances_added, instances_removed, keys_changed = self.instances_added, self.instances_removed, self.keys_changed
+    self.instances_added   = defaultdict(dict)
+    self.instances_removed = defaultdict(dict)
+    self.keys_changed      = defaultdict(dict)
+    for l in lists: l._apply_changes(instances_added.get(l, ()), instances_removed.get(l, ()), keys_changed.get(l, ()))
+    
+def observation_batch(world = None):
+  """returns a context manager; inside it, the events are accumulated and deduplicated, and sent only once when leaving it."""
+  if world is None:
+    import owlready2
+    world = owlready2.default_world
+  return getattr(world, "_observation_batch", None) or _ObservationBatch(world)
+
+
 _NON_EMPTY_COLLAPSED_LISTENERS = set()
 class Observation(object):
   def __init__(self, o):
@@ -234,7 +290,8 @@ def unobserve(o, listener = None, world = None):
     if o in world._observations: del world._observations[o]
 
     
-_INSTANCES_OF_CLASS = {} #weakref.WeakValueDictionary()
+_INSTANCES_OF_CLASS          = {} #weakref.WeakValueDictionary()
+_INSTANCES_OF_CLASS_ORDER_BY = {} # Ordered InstancesOfClass, by order_by property storid
 
 
 
@@ -265,6 +322,13 @@ class StoridList(object):
   
 
 
+def _sort_key(o):
+  # Same order as SQLite: NULL, numbers, texts, blobs
+  if o is None:                return (0, 0)
+  if isinstance(o, (int, float)): return (1, o)
+  if isinstance(o, str):       return (2, o)
+  return (3, o)
+
 from owlready2.util import FirstList
 class InstancesOfClass(StoridList):
   storid = 0 # Fake storid
@@ -273,13 +337,9 @@ class InstancesOfClass(StoridList):
     self._Class         = Class
     self._lang          = lang
     self._use_observe   = use_observe
-    self._Class_storids = ",".join((["'%s'" % child.storid for child in Class.descendants()]))
+    self._members       = None # storid => sort key (None if not ordered)
+    self._keys          = None # Sort keys, in the same order as _storids
     
-    if use_observe:
-      ws = _INSTANCES_OF_CLASS.get(Class.storid)
-      if ws is None: ws = _INSTANCES_OF_CLASS[Class.storid] = weakref.WeakSet()
-      ws.add(self)
-      
     StoridList.__init__(self, onto or Class.namespace.world, None)
     
     if order_by:
@@ -290,17 +350,41 @@ class InstancesOfClass(StoridList):
     else:
       self._order_by = ""
       
+    if use_observe:
+      ws = _INSTANCES_OF_CLASS.get(Class.storid)
+      if ws is None: ws = _INSTANCES_OF_CLASS[Class.storid] = weakref.WeakSet()
+      ws.add(self)
+      if self._order_by:
+        ws = _INSTANCES_OF_CLASS_ORDER_BY.get(self._order_by)
+        if ws is None: ws = _INSTANCES_OF_CLASS_ORDER_BY[self._order_by] = weakref.WeakSet()
+        ws.add(self)
+        
   def __repr__(self):
     return """<InstancesOfClass "%s": %s>""" % (self._Class, list(self))
   
+  def _load_descendants(self):
+    # The descendant classes are stored in a temporary table, rather than inlined in the queries
+    graph = self.namespace.world.graph
+    graph.execute("""CREATE TEMP TABLE IF NOT EXISTS instances_of_class_classes (ancestor INTEGER, storid INTEGER, PRIMARY KEY (ancestor, storid)) WITHOUT ROWID""")
+    graph.execute("""DELETE FROM instances_of_class_classes WHERE ancestor = ?""", (self._Class.storid,))
+    graph.db.executemany("""INSERT OR IGNORE INTO instances_of_class_classes VALUES (?,?)""", [(self._Class.storid, child.storid) for child in self._Class.descendants()])
+    
+  def _key_sql(self):
+    if self._lang: return """(SELECT q2.o FROM quads q2 WHERE q2.s = %%s AND q2.p = %s AND q2.d LIKE '@%s')""" % (self._order_by, self._lang.replace("'", "''"))
+    else:          return """(SELECT q2.o FROM quads q2 WHERE q2.s = %%s AND q2.p = %s)""" % self._order_by
+    
   def _update(self):
+    self._load_descendants()
+    graph = self.namespace.world.graph
     if self._order_by:
-      if self._lang:
-        self._storids = [x[0] for x in self.namespace.graph.execute("""SELECT s FROM objs WHERE p = ? AND o IN (%s) ORDER BY (select q2.o FROM quads q2 WHERE q2.s = objs.s AND q2.p = ? AND q2.d LIKE '@%s')""" % (self._Class_storids, self._lang), (rdf_type, self._order_by))]
-      else:
-        self._storids = [x[0] for x in self.namespace.graph.execute("""SELECT s FROM objs WHERE p = ? AND o IN (%s) ORDER BY (select q2.o FROM quads q2 WHERE q2.s = objs.s AND q2.p = ?)""" % self._Class_storids, (rdf_type, self._order_by))]
+      rows = graph.execute("""SELECT DISTINCT objs.s, %s FROM instances_of_class_classes c, objs WHERE c.ancestor = ? AND objs.o = c.storid AND objs.p = ?""" % (self._key_sql() % "objs.s"), (self._Class.storid, rdf_type)).fetchall()
+      rows = sorted((_sort_key(key), s) for s, key in rows)
+      self._keys    = [key for key, s in rows]
+      self._storids = [s   for key, s in rows]
+      self._members = { s : key for key, s in rows }
     else:
-      self._storids = [x[0] for x in self.namespace.graph.execute("""SELECT s FROM objs WHERE p = ? AND o IN (%s)""" % self._Class_storids, (rdf_type,)).fetchall()]
+      self._storids = [s for (s,) in graph.execute("""SELECT DISTINCT objs.s FROM instances_of_class_classes c, objs WHERE c.ancestor = ? AND objs.o = c.storid AND objs.p = ?""", (self._Class.storid, rdf_type))]
+      self._members = dict.fromkeys(self._storids)
       
   def _get_storids(self):
     if self._storids is None: self._update()
@@ -310,12 +394,68 @@ class InstancesOfClass(StoridList):
     if self._storids is None: self._update()
     return StoridList(self.namespace, self._storids)
   
-  def _changed(self):
+  def _notify(self):
     observation = self.namespace.world._observations.get(self.storid)
-    self._storids = None
     if observation:
       observation.call("Inverse(http://www.w3.org/1999/02/22-rdf-syntax-ns#type)")
       
+  def _changed(self):
+    self._storids = None
+    self._notify()
+    
+  def _instance_added(self, storid): self._apply_changes((storid,), ())
+  
+  def _fetch_key(self, storid):
+    return _sort_key(self.namespace.world.graph.execute("""SELECT %s""" % (self._key_sql() % "?"), (storid,)).fetchone()[0])
+  
+  def _insert_sorted(self, storid, key):
+    i = bisect.bisect_right(self._keys, key)
+    self._keys   .insert(i, key)
+    self._storids.insert(i, storid)
+    self._members[storid] = key
+    
+  def _remove_sorted(self, storid):
+    key = self._members.pop(storid)
+    i = bisect.bisect_left(self._keys, key)
+    while self._storids[i] != storid: i += 1
+    del self._keys[i]
+    del self._storids[i]
+    
+  def _apply_changes(self, added, removed, key_changed = ()):
+    # Updates the list incrementally, if already computed
+    if not self._storids is None:
+      if removed:
+        removed = { s for s in removed if s in self._members }
+        removed_list = list(removed)
+        for i in range(0, len(removed_list), _MAX_SQL_PARAMS - 2):
+          chunk = removed_list[i : i + _MAX_SQL_PARAMS - 2]
+          for (s,) in self.namespace.world.graph.execute("""SELECT DISTINCT s FROM objs WHERE p = ? AND s IN (%s) AND +o IN (SELECT storid FROM instances_of_class_classes WHERE ancestor = ?)""" % ",".join("?" for x in chunk), [rdf_type, *chunk, self._Class.storid]):
+            removed.discard(s) # Still an instance, e.g. asserted in another subclass
+        if removed:
+          if self._order_by:
+            for s in removed: self._remove_sorted(s)
+          else:
+            for s in removed: del self._members[s]
+            self._storids = [s for s in self._storids if not s in removed]
+            
+      if added:
+        if self._order_by:
+          for s in added:
+            if not s in self._members: self._insert_sorted(s, self._fetch_key(s))
+        else:
+          for s in added:
+            if not s in self._members:
+              self._members[s] = None
+              self._storids.append(s)
+              
+      key_changed = [s for s in key_changed if s in self._members]
+      for s in key_changed:
+        self._remove_sorted(s)
+        self._insert_sorted(s, self._fetch_key(s))
+      if not (added or removed or key_changed): return
+      
+    self._notify()
+    
   def add(self, o):
     if not self.Class in o.is_a: o.is_a.append(self.Class)
     #if not self._use_observe: self._changed()
@@ -324,4 +464,3 @@ class InstancesOfClass(StoridList):
   def remove(self, o):
     destroy_entity(o)
     #self._changed()
-    
@@ -890,3 +890,102 @@ def parse_owlxml(object f, list objs, list datas, object insert_objs, object ins
   
   return nb_triple
 
+
+
+# SPARQL functions registered in SQLite (see owlready2.sparql.func); the Python versions in owlready2.sparql.func are used when this module is not available
+
+import re, hashlib, datetime
+
+cdef dict _regexps = {}
+cdef str  _REGEX_SPECIAL_CHARS = ".^$*+?{}[]\\|()"
+_REGEX_SUB_ARG_RE = re.compile("\\$([0-9]*)")
+
+cdef object _get_regexp(str pattern, str flags):
+  # Returns the compiled regexp, or the pattern itself if it is a plain string without flags (searched with 'in')
+  cdef dict regexps = _regexps.get(flags)
+  if regexps is None: regexps = _regexps[flags] = {}
+  r = regexps.get(pattern)
+  if r is None:
+    if len(regexps) > 1024: regexps.clear()
+    if (not flags) and (not any(c in _REGEX_SPECIAL_CHARS for c in pattern)):
+      r = pattern
+    else:
+      f = 0
+      for c in flags:
+        if   c == "i": f |= re.IGNORECASE
+        elif c == "s": f |= re.DOTALL
+        elif c == "m": f |= re.MULTILINE
+      r = re.compile(pattern, f)
+    regexps[pattern] = r
+  return r
+
+def sparql_regex(str s, str pattern, str flags = ""):
+  r = _get_regexp(pattern, flags)
+  if type(r) is str: return r in s
+  return r.search(s) is not None
+
+def sparql_replace(str s, str pattern, str replacement, str flags = ""):
+  r = _get_regexp(pattern, flags)
+  if type(r) is str:
+    if (not "$" in replacement) and (not "\\" in replacement): return s.replace(r, replacement)
+    r = re.compile(re.escape(r))
+  return r.sub(_REGEX_SUB_ARG_RE.sub(r"\\\1", replacement), s)
+
+_md5    = hashlib.md5
+_sha1   = hashlib.sha1
+_sha256 = hashlib.sha256
+_sha384 = hashlib.sha384
+_sha512 = hashlib.sha512
+def md5   (str x): return _md5   (x.encode("utf8")).hexdigest()
+def sha1  (str x): return _sha1  (x.encode("utf8")).hexdigest()
+def sha256(str x): return _sha256(x.encode("utf8")).hexdigest()
+def sha384(str x): return _sha384(x.encode("utf8")).hexdigest()
+def sha512(str x): return _sha512(x.encode("utf8")).hexdigest()
+
+cdef int _parse_digits(str s, int start, int nb):
+  cdef int r = 0
+  cdef int i
+  cdef Py_UCS4 c
+  for i in range(start, start + nb):
+    c = s[i]
+    if not ("0" <= c <= "9"): return -1
+    r = r * 10 + (<int> c - 48)
+  return r
+
+cdef dict _timezones = {}
+
+def parse_datetime(str s):
+  # Fast parser for the usual ISO datetime formats, "YYYY-MM-DDTHH:MM:SS[.ffffff][Z|+HH:MM|+HHMM]";
+  # returns None for other formats (parsed by owlready2.base._parse_datetime)
+  cdef int n = len(s)
+  cdef int year, month, day, hour, minute, second, microsecond = 0, i = 19, j, k, offset_hour, offset_minute, offset
+  if (n < 19) or (s[4] != "-") or (s[7] != "-") or (not s[10] in "T ") or (s[13] != ":") or (s[16] != ":"): return None
+  year   = _parse_digits(s,  0, 4)
+  month  = _parse_digits(s,  5, 2)
+  day    = _parse_digits(s,  8, 2)
+  hour   = _parse_digits(s, 11, 2)
+  minute = _parse_digits(s, 14, 2)
+  second = _parse_digits(s, 17, 2)
+  if (year < 0) or (month < 0) or (day < 0) or (hour < 0) or (minute < 0) or (second < 0): return None
+  if (i < n) and (s[i] == "."):
+    j = i + 1
+    while (j < n) and ("0" <= s[j] <= "9"): j += 1
+    if (j == i + 1) or (j > i + 7): return None
+    microsecond = _parse_digits(s, i + 1, j - i - 1)
+    for k in range(7 - (j - i)): microsecond *= 10
+    i = j
+  tzinfo = None
+  if i < n:
+    if   (i + 1 == n) and (s[i] == "Z"): tzinfo = datetime.timezone.utc
+    elif s[i] in "+-":
+      if   (n == i + 6) and (s[i + 3] == ":"): offset_hour = _parse_digits(s, i + 1, 2); offset_minute = _parse_digits(s, i + 4, 2)
+      elif  n == i + 5:                        offset_hour = _parse_digits(s, i + 1, 2); offset_minute = _parse_digits(s, i + 3, 2)
+      else: return None
+      if (offset_hour < 0) or (offset_hour > 23) or (offset_minute < 0) or (offset_minute > 59): return None
+      offset = offset_hour * 60 + offset_minute
+      if s[i] == "-": offset = -offset
+      tzinfo = _timezones.get(offset)
+      if tzinfo is None: tzinfo = _timezones[offset] = datetime.timezone(datetime.timedelta(minutes = offset))
+    else: return None
+  try: return datetime.datetime(year, month, day, hour, minute, second, microsecond, tzinfo)
+  except ValueError: return None
@@ -17,7 +17,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import weakref
+import weakref, itertools
+from collections import defaultdict
 
 from owlready2.namespace  import *
 from owlready2.entity     import *
@@ -358,6 +359,9 @@ class PropertyClass(EntityClass):
   
   _get_indirect_values_for_class = _get_indirect_values_for_individual
   
+  def indirect_values_for(Prop, individuals):
+    return { individual : Prop._get_indirect_values_for_individual(individual) for individual in individuals }
+  
   def _set_value_for_individual(Prop, entity, value):
     if value is None: entity.namespace.ontology._del_triple_spod(entity.storid, Prop.storid, None, None)
     else:             entity.namespace.ontology._set_triple_spod(entity.storid, Prop.storid, *entity.namespace.ontology._to_rdf(value))
@@ -644,7 +648,82 @@ class ObjectPropertyClass(ReasoningPropertyClass):
         already_applied_class.add(eq.__class__)
         
     return list(values)
-                        
+  
+  def indirect_values_for(Prop, individuals):
+    # Same as _get_indirect_values_for_individual() for many individuals, but the descendant properties, the relations,
+    # the transitive closures and the class-level values are obtained once for all the individuals.
+    # Returns a dict { individual : list of values }
+    individuals = list(individuals)
+    if not individuals: return {}
+    world = individuals[0].namespace.world
+    graph = world.graph
+    
+    def with_equivalents(storids):
+      return { s for c, s, p, o in graph._get_obj_triples_sp_cspo(storids, owl_equivalentindividual) } | \
+             { o for c, s, p, o in graph._get_obj_triples_po_cspo(owl_equivalentindividual, storids) }
+    
+    storids      = list(dict.fromkeys(individual.storid for individual in individuals))
+    has_eqs      = with_equivalents(storids)
+    eqss         = { individual : list(individual.equivalent_to.self_and_indirect_equivalent()) if individual.storid in has_eqs else [individual]
+                     for individual in individuals }
+    eq_storids   = list(dict.fromkeys(eq.storid for eqs in eqss.values() for eq in eqs))
+    
+    prop_storids = []
+    direct_ps    = []
+    inverse_ps   = []
+    for P in Prop.descendants():
+      if issubclass(P, TransitiveProperty):
+        prop_storids.append((P.storid, P._inverse_storid or None))
+      else:
+        direct_ps.append(P.storid)
+        if P._inverse_storid: inverse_ps.append(P._inverse_storid)
+        
+    directs     = defaultdict(list)
+    transitives = defaultdict(list)
+    if direct_ps:
+      for c, s, p, o in graph._get_obj_triples_sp_cspo(eq_storids, direct_ps):  directs[s].append(o)
+    if inverse_ps:
+      for c, s, p, o in graph._get_obj_triples_po_cspo(inverse_ps, eq_storids): directs[o].append(s)
+    if prop_storids:
+      for s, o in graph._get_obj_triples_transitive_sp_indirect_many(eq_storids, prop_storids): transitives[s].append(o)
+      
+    value_storids  = [o for o in dict.fromkeys(itertools.chain.from_iterable(itertools.chain(directs.values(), transitives.values()))) if o > 0]
+    storid_2_value = dict(zip(value_storids, world._get_by_storids(value_storids)))
+    for os in itertools.chain(directs.values(), transitives.values()):
+      for o in os:
+        if o < 0: storid_2_value[o] = world._to_python(o)
+        
+    class_valuess = {}
+    def class_values(Class):
+      values = class_valuess.get(Class)
+      if values is None: values = class_valuess[Class] = Prop._get_indirect_values_for_class(Class, True)
+      return values
+    
+    value_has_eqs = with_equivalents(list(dict.fromkeys(o for os in transitives.values() for o in os))) if transitives else set()
+    value_eqss    = {}
+    def value_eqs(o):
+      eqs = value_eqss.get(o)
+      if eqs is None: eqs = value_eqss[o] = list(o.equivalent_to.indirect()) if o.storid in value_has_eqs else []
+      return eqs
+    
+    reflexive = issubclass_python(Prop, ReflexiveProperty)
+    r = {}
+    for individual, eqs in eqss.items():
+      values = { storid_2_value[o] for eq in eqs for o in directs[eq.storid] }
+      if reflexive: values.add(individual)
+      for eq in eqs:
+        new_values = [storid_2_value[o] for o in transitives[eq.storid]]
+        for o in new_values:
+          values.add(o)
+          values.update(class_values(o.__class__))
+          for o2 in value_eqs(o):
+            if not o2 in values:
+              values.add(o2)
+              values.update(class_values(o2.__class__))
+      for eq in eqs: values.update(class_values(eq.__class__))
+      r[individual] = list(values)
+    return r
+  
   # def _get_indirect_inverse_values_for_individual(Prop, entity):
   #   world   = entity.namespace.world
   #   onto    = entity.namespace.ontology
@@ -19,9 +19,10 @@
 
 import operator
 from functools import reduce
+from collections import defaultdict
 
 from owlready2 import *
-from owlready2.triplelite import _SearchList
+from owlready2.triplelite import _SearchList, _MAX_SQL_PARAMS
 
 
 
@@ -35,13 +36,11 @@ inherits from Python's :class:`set` the methods for computing intersection, unio
   
   def __rshift__(self, destination):
     """Maps the set of concepts to the destination_terminology. See :doc:`tuto_en` for more info."""
-    #terminology_2_concepts = defaultdict(list)
-    #for concept in self: terminology_2_concepts[concept.terminology].append(concept)
-    #r = Concepts()
-    #for terminology, concepts in terminology_2_concepts.items():
-    #  r.update((terminology >> destination).map_concepts(concepts))
-    #return r
-    r = Concepts( j for i in self for j in i >>  destination)
+    terminology_2_concepts = defaultdict(list)
+    for concept in self: terminology_2_concepts[concept.terminology].append(concept)
+    r = Concepts()
+    for terminology, concepts in terminology_2_concepts.items():
+      for mapped in terminology.map_concepts(concepts, destination).values(): r.update(mapped)
     return r
   
   def find(self, parent_concept):
@@ -279,6 +278,26 @@ class MetaConcept(ThingClass):
     r = Concepts(mapper(Class))
     if r: return r
     return Concepts( i for parent in Class.parents for i in parent._map(mapper) )
+  
+  def map_concepts(Class, concepts, destination_terminology):
+    """maps several concepts (or codes) of this terminology to destination_terminology at once,
+and returns a dict mapping each of them to the corresponding Concepts."""
+    concepts = list(concepts)
+    storids  = {}
+    codes    = [concept for concept in concepts if not isinstance(concept, ThingClass)]
+    if codes:
+      iri_2_code = { "http://PYM/%s/%s" % (Class.name, code) : code for code in codes }
+      iris = list(iri_2_code)
+      for i in range(0, len(iris), _MAX_SQL_PARAMS):
+        chunk = iris[i : i + _MAX_SQL_PARAMS]
+        for iri, storid in PYM.world.graph.execute("""SELECT iri, storid FROM resources WHERE iri IN (%s)""" % ",".join("?" for x in chunk), chunk):
+          storids[iri_2_code[iri]] = storid
+    for concept in concepts:
+      if isinstance(concept, ThingClass): storids[concept] = concept.storid
+      
+    mapped   = _map_storids(set(storids.values()), Class, destination_terminology)
+    entities = { i.storid : i for i in PYM.world._get_by_storids({ j for js in mapped.values() for j in js }) }
+    return { concept : Concepts(entities[i] for i in mapped.get(storids.get(concept), ()) if i in entities) for concept in concepts }
 
 
 class MetaGroup(ThingClass):
@@ -353,8 +372,8 @@ def _get_mapper(source, dest):
   mapper = _MAPPERS.get((source, dest))
   if not mapper:
     if   source is dest: mapper = _no_op_mapper
-    elif source is _CUI: mapper = _create_from_cui_mapper(dest)
-    elif dest   is _CUI: mapper = _to_cui_mapper
+    elif source.name == "CUI": mapper = _create_from_cui_mapper(dest)
+    elif dest.name   == "CUI": mapper = _to_cui_mapper
     elif (source.name == "CIM10") and (dest.name == "ICD10"): mapper = _create_icd10_french_atih_2_icd10_mapper(dest)
     elif (source.name == "ICD10") and (dest.name == "CIM10"): mapper = _create_icd10_2_icd10_french_atih_mapper(dest)
     elif (source.name == "CIM10"): mapper = _chain_mapper(_get_mapper(PYM["CIM10"], PYM["ICD10"]), _get_mapper(PYM["ICD10"], dest))
@@ -471,6 +490,170 @@ AND to3.s=to1.o AND to3.p=?
 #         yield c.namespace.world._get_by_storid(i)
   return _cui_mapper
 
+
+# Bulk mappers take a set of storids, and return a dict mapping each storid to the set of mapped storids (if not empty).
+# The source storids are put in a temporary table, and each mapper then executes a single SQL query.
+
+def _map_storids(storids, source, dest):
+  # Concepts without mapping are mapped through their parents, as in MetaConcept._map()
+  mapper   = _get_bulk_mapper(source, dest)
+  mapped   = mapper(storids)
+  parents  = {}
+  seen     = set(storids)
+  frontier = [storid for storid in storids if not storid in mapped]
+  while frontier:
+    new_parents = _get_parent_storids(frontier, source)
+    parents.update(new_parents)
+    frontier = list({ parent for ps in new_parents.values() for parent in ps if not parent in seen })
+    seen.update(frontier)
+    if frontier:
+      mapped.update(mapper(frontier))
+      frontier = [storid for storid in frontier if not storid in mapped]
+      
+  resolved = {}
+  def resolve(storid):
+    r = resolved.get(storid)
+    if r is None:
+      r = mapped.get(storid)
+      if r is None:
+        r = resolved[storid] = set()
+        for parent in parents.get(storid, ()): r.update(resolve(parent))
+      else:
+        resolved[storid] = r
+    return r
+  return { storid : resolve(storid) for storid in storids }
+
+def _fill_source_storids(storids):
+  graph = PYM.world.graph
+  graph.execute("""CREATE TEMP TABLE IF NOT EXISTS pym_source_storids (s INTEGER PRIMARY KEY)""")
+  graph.execute("""DELETE FROM pym_source_storids""")
+  graph.db.executemany("""INSERT OR IGNORE INTO pym_source_storids VALUES (?)""", ((storid,) for storid in storids))
+  
+def _execute_bulk_mapping(sql, params):
+  r = defaultdict(set)
+  for s, o in PYM.world.graph.execute(sql, params): r[s].add(o)
+  return r
+
+def _get_parent_storids(storids, terminology):
+  _fill_source_storids(storids)
+  return _execute_bulk_mapping(
+"""SELECT src.s, t.o FROM pym_source_storids src, objs t INDEXED BY index_objs_sp, objs tt INDEXED BY index_objs_sp
+WHERE t.s=src.s AND t.p=?
+AND tt.s=t.o AND tt.p=? AND tt.o=?
+""", (
+  rdfs_subclassof,
+  PYM.terminology.storid, terminology.storid,
+  ))
+
+_BULK_MAPPERS = {}
+def _get_bulk_mapper(source, dest):
+  mapper = _BULK_MAPPERS.get((source, dest))
+  if not mapper:
+    if   source is dest: mapper = _no_op_bulk_mapper
+    elif source.name == "CUI": mapper = _create_from_cui_bulk_mapper(dest)
+    elif dest.name   == "CUI": mapper = _to_cui_bulk_mapper
+    elif ((source.name == "CIM10") and (dest.name == "ICD10")) or ((source.name == "ICD10") and (dest.name == "CIM10")):
+      mapper = _create_per_concept_bulk_mapper(_get_mapper(source, dest))
+    elif (source.name == "CIM10"): mapper = _chain_bulk_mapper(_get_bulk_mapper(PYM["CIM10"], PYM["ICD10"]), _get_bulk_mapper(PYM["ICD10"], dest))
+    elif (dest.name   == "CIM10"): mapper = _chain_bulk_mapper(_get_bulk_mapper(source, PYM["ICD10"]), _get_bulk_mapper(PYM["ICD10"], PYM["CIM10"]))
+    else:                mapper = _create_cui_bulk_mapper(source, dest)
+    _BULK_MAPPERS[source, dest] = mapper
+  return mapper
+
+def _no_op_bulk_mapper(storids):
+  return { storid : { storid } for storid in storids }
+
+def _chain_bulk_mapper(mapper1, mapper2):
+  def _mapper(storids):
+    r1 = mapper1(storids)
+    r2 = mapper2({ j for js in r1.values() for j in js })
+    r  = {}
+    for storid, js in r1.items():
+      ks = { k for j in js for k in r2.get(j, ()) }
+      if ks: r[storid] = ks
+    return r
+  return _mapper
+
+def _create_per_concept_bulk_mapper(mapper):
+  def _mapper(storids):
+    r = {}
+    for c in PYM.world._get_by_storids(storids):
+      if c is None: continue
+      mapped = { i.storid for i in mapper(c) if not i is None }
+      if mapped: r[c.storid] = mapped
+    return r
+  return _mapper
+
+def _create_from_cui_bulk_mapper(dest):
+  def _from_cui_bulk_mapper(storids, dest_storid = dest.storid):
+    _fill_source_storids(storids)
+    return _execute_bulk_mapping(
+"""SELECT DISTINCT src.s, to3.o FROM pym_source_storids src, objs to1 INDEXED BY index_objs_sp, objs to2 INDEXED BY index_objs_sp, objs to3 INDEXED BY index_objs_sp, objs tt INDEXED BY index_objs_sp
+WHERE to1.s=src.s AND to1.p=?
+AND to2.s=to1.o AND to2.p=? AND to2.o=?
+AND to3.s=to1.o AND to3.p=?
+AND tt.s=to3.o AND tt.p=? AND tt.o=?
+""", (
+  rdfs_subclassof,
+  owl_onproperty, PYM.originals.storid,
+  SOME,
+  PYM.terminology.storid, dest_storid,
+  ))
+  return _from_cui_bulk_mapper
+
+def _to_cui_bulk_mapper(storids):
+  _fill_source_storids(storids)
+  return _execute_bulk_mapping(
+"""SELECT DISTINCT src.s, tu2.o FROM pym_source_storids src, objs t INDEXED BY index_objs_sp, objs tu1 INDEXED BY index_objs_sp, objs tu2 INDEXED BY index_objs_sp
+WHERE t.s=src.s AND t.p=?
+AND tu1.s=t.o AND tu1.p=? AND tu1.o=?
+AND tu2.s=t.o AND tu2.p=?
+""", (
+  rdfs_subclassof,
+  owl_onproperty, PYM.unifieds.storid,
+  SOME,
+  ))
+
+def _create_cui_bulk_mapper(source, dest):
+  def _cui_bulk_mapper(storids, dest_storid = dest.storid):
+    _fill_source_storids(storids)
+    r = _execute_bulk_mapping(
+"""SELECT DISTINCT src.s, tm2.o FROM pym_source_storids src, objs t INDEXED BY index_objs_sp, objs tm1 INDEXED BY index_objs_sp, objs tm2 INDEXED BY index_objs_sp, objs tt INDEXED BY index_objs_sp
+WHERE t.s=src.s AND t.p=?
+AND tm1.s=t.o AND tm1.p=? AND tm1.o=?
+AND tm2.s=t.o AND tm2.p=?
+AND tt.s=tm2.o AND tt.p=? AND tt.o=?
+""", (
+  rdfs_subclassof,
+  owl_onproperty, PYM.mapped_to.storid,
+  SOME,
+  PYM.terminology.storid, dest_storid,
+  ))
+    
+    # Concepts without 'mapped_to' relations are mapped using CUI
+    PYM.world.graph.db.executemany("""DELETE FROM pym_source_storids WHERE s=?""", ((storid,) for storid in r))
+    r.update(_execute_bulk_mapping(
+"""SELECT DISTINCT src.s, to3.o FROM pym_source_storids src, objs t INDEXED BY index_objs_sp, objs tu1 INDEXED BY index_objs_sp, objs tu2 INDEXED BY index_objs_sp,
+objs to1 INDEXED BY index_objs_sp, objs to2 INDEXED BY index_objs_sp, objs to3 INDEXED BY index_objs_sp, objs tt INDEXED BY index_objs_sp
+WHERE t.s=src.s AND t.p=?
+AND tu1.s=t.o AND tu1.p=? AND tu1.o=?
+AND tu2.s=t.o AND tu2.p=?
+AND to1.s=tu2.o AND to1.p=?
+AND to2.s=to1.o AND to2.p=? AND to2.o=?
+AND to3.s=to1.o AND to3.p=?
+AND tt.s=to3.o AND tt.p=? AND tt.o=?
+""", (
+  rdfs_subclassof,
+  owl_onproperty, PYM.unifieds.storid,
+  SOME,
+  rdfs_subclassof,
+  owl_onproperty, PYM.originals.storid,
+  SOME,
+  PYM.terminology.storid, dest_storid,
+  )))
+    return r
+  return _cui_bulk_mapper
+
 def _create_icd10_french_atih_2_icd10_mapper(dest):
   def _icd10_french_atih_2_icd10_mapper(c):
     code = c.name
@@ -504,6 +687,5 @@ def _create_icd10_2_icd10_french_atih_mapper(dest):
     
     
       
-_CUI = PYM["CUI"]
 
 
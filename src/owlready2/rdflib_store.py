@@ -17,13 +17,23 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import rdflib, rdflib.store
+import itertools
+import rdflib, rdflib.store, rdflib.plugins.sparql
 from rdflib import URIRef, BNode, Literal
 
-import owlready2.triplelite, owlready2.namespace
+import owlready2.triplelite, owlready2.namespace, owlready2.sparql.main
+from owlready2.util import locstr
 from owlready2.base import *
 from owlready2.base import _universal_abbrev_2_datatype
 
+_BATCH_SIZE          = 1000
+_MAX_CACHED_URIREFS  = 1000000
+
+class _Storid(object):
+  # SPARQL parameter for a resource, given by its storid
+  __slots__ = ["storid"]
+  def __init__(self, storid): self.storid = storid
+
 class TripleLiteRDFlibStore(rdflib.store.Store):
   context_aware = True
   
@@ -34,6 +44,13 @@ class TripleLiteRDFlibStore(rdflib.store.Store):
     
     self.__namespace = {}
     self.__prefix = {}
+    self._urirefs = {} # storid => URIRef
+    
+    refactor = world._refactor
+    def _refactor(storid, new_iri):
+      self._urirefs.pop(storid, None)
+      refactor(storid, new_iri)
+    world._refactor = _refactor
     
     self.main_graph            = TripleLiteRDFlibGraph(store = self)
     self.main_graph.onto       = None
@@ -81,18 +98,59 @@ class TripleLiteRDFlibStore(rdflib.store.Store):
       d = None
     return s,p,o,d
   
+  def _uriref(self, storid):
+    r = self._urirefs.get(storid)
+    if r is None: r = self._urirefs[storid] = URIRef(self.triplelite._unabbreviate(storid))
+    return r
+  
+  def _resolve_storids(self, storids):
+    # Fetches the IRIs of several storids in a single query, and caches the corresponding URIRefs
+    storids = [storid for storid in storids if not storid in self._urirefs]
+    if not storids: return
+    if len(self._urirefs) + len(storids) > _MAX_CACHED_URIREFS: self._urirefs.clear()
+    if hasattr(self.triplelite, "_unabbreviate_storids"):
+      for storid, iri in self.triplelite._unabbreviate_storids(storids).items(): self._urirefs[storid] = URIRef(iri)
+      
   def _owlready_2_rdflib(self, s,p,o,d = None):
     if   s < 0: s = BNode(-s)
-    else:       s = URIRef(self.triplelite._unabbreviate(s))
-    p = URIRef(self.triplelite._unabbreviate(p))
+    else:       s = self._uriref(s)
+    p = self._uriref(p)
+    return s, p, self._owlready_2_rdflib_object(o, d)
+  
+  def _owlready_2_rdflib_object(self, o, d):
     if d is None:
-      if o < 0: o = BNode(-o)
-      else:     o = URIRef(self.triplelite._unabbreviate(o))
-    else:
-      if   isinstance(d, str) and d.startswith("@"): o = Literal(o, lang = d[1:])
-      elif (d == "") or (d == 0):                    o = Literal(o)
-      else:                                          o = Literal(o, datatype = URIRef(self.triplelite._unabbreviate(d)))
-    return s,p,o
+      if o < 0: return BNode(-o)
+      return self._uriref(o)
+    if   isinstance(d, str) and d.startswith("@"): return Literal(o, lang = d[1:])
+    elif (d == "") or (d == 0):                    return Literal(o)
+    return Literal(o, datatype = self._uriref(d))
+  
+  def _owlready_2_rdflib_rows(self, rows):
+    # rows are (s,p,o,d) quads; IRIs are resolved by batch
+    rows = iter(rows)
+    while True:
+      batch = list(itertools.islice(rows, _BATCH_SIZE))
+      if not batch: break
+      storids = set()
+      for s,p,o,d in batch:
+        if s > 0: storids.add(s)
+        storids.add(p)
+        if   d is None: 
+          if o > 0: storids.add(o)
+        elif isinstance(d, int) and (d > 0): storids.add(d)
+      self._resolve_storids(storids)
+      for s,p,o,d in batch: yield self._owlready_2_rdflib(s,p,o,d)
+      
+  def _get_triplelite(self, context):
+    if context is None: return self.triplelite
+    triplelite = getattr(context, "triplelite", None)
+    if triplelite is None: # A graph created by rdflib on the store, e.g. by the SPARQL engine
+      try:    triplelite = self.get_context(context.identifier).triplelite
+      except (ValueError, KeyError): triplelite = self.triplelite
+    return triplelite
+  
+  def _get_inverses(self, p):
+    return [x for (x,) in self.triplelite.execute("""SELECT o FROM objs WHERE p=? AND s=? UNION SELECT s FROM objs WHERE p=? AND o=?""", (owl_inverse_property, p, owl_inverse_property, p))]
   
   def add(self, xxx_todo_changeme, context, quoted = False):
     if isinstance(context.triplelite, owlready2.triplelite.SubGraph):
@@ -106,43 +164,136 @@ class TripleLiteRDFlibStore(rdflib.store.Store):
     
     
   def triples(self, triple_pattern, context = None):
+    triplelite = self._get_triplelite(context)
     rs,rp,ro,rd = self._rdflib_2_owlready(triple_pattern)
+    if isinstance(self.triplelite, owlready2.triplelite.Graph): rows = self._sql_triples     (triplelite, rs, rp, ro, rd)
+    else:                                                        rows = self._generic_triples (triplelite, rs, rp, ro, rd)
+    for spo in self._owlready_2_rdflib_rows(rows): yield spo, context
     
+  def _sql_triples(self, triplelite, rs, rp, ro, rd):
+    # Direct triples and triples obtained through inverse properties, in a single query
+    if   ro is None: table = "quads"; d = "d"
+    elif rd is None: table = "objs";  d = "NULL"
+    else:            table = "datas"; d = "d"
+    conditions = []
+    params     = []
+    if isinstance(triplelite, owlready2.triplelite.SubGraph): conditions.append("c=?"); params.append(triplelite.c)
+    if not rs is None: conditions.append("s=?"); params.append(rs)
+    if not rp is None: conditions.append("p=?"); params.append(rp)
+    if not ro is None: conditions.append("o=?"); params.append(ro)
+    sql = """SELECT s,p,o,%s FROM %s""" % (d, table)
+    if conditions: sql += """ WHERE %s""" % " AND ".join(conditions)
+    
+    if rd is None:
+      inverse_conditions = ["q.p=i.ip"]
+      if isinstance(triplelite, owlready2.triplelite.SubGraph): inverse_conditions.append("q.c=?"); params.append(triplelite.c)
+      if not rs is None: inverse_conditions.append("q.o=?"); params.append(rs)
+      if not rp is None: inverse_conditions.append("i.p=?"); params.append(rp)
+      if not ro is None: inverse_conditions.append("q.s=?"); params.append(ro)
+      sql += """
+UNION ALL
+SELECT q.o,i.p,q.s,NULL FROM (SELECT s AS p, o AS ip FROM objs WHERE p=%s UNION SELECT o, s FROM objs WHERE p=%s) i, objs q WHERE %s""" % (owl_inverse_property, owl_inverse_property, " AND ".join(inverse_conditions))
+    return triplelite.execute(sql, params)
+  
+  def _generic_triples(self, triplelite, rs, rp, ro, rd):
     if   ro is None:
-      for s,p,o,d in context.triplelite._get_triples_spod_spod(rs,rp,None, None):
-        yield self._owlready_2_rdflib(s,p,o,d), context
+      for s,p,o,d in triplelite._get_triples_spod_spod(rs,rp,None, None):
+        yield s,p,o,d
       if rp:
         prop = self.world._entities.get(rp)
         if prop and prop._inverse_storid:
-          for o,p,s in context.triplelite._get_obj_triples_spo_spo(None,prop._inverse_storid,rs):
-            yield self._owlready_2_rdflib(s,rp,o,None), context
+          for o,p,s in triplelite._get_obj_triples_spo_spo(None,prop._inverse_storid,rs):
+            yield s,rp,o,None
       else:
-        for o,p,s in context.triplelite._get_obj_triples_spo_spo(None,None,rs):
+        for o,p,s in triplelite._get_obj_triples_spo_spo(None,None,rs):
           prop = self.world._entities.get(p)
           if prop and prop._inverse_storid:
-            yield self._owlready_2_rdflib(s,prop._inverse_storid,o,None), context
+            yield s,prop._inverse_storid,o,None
             
     elif rd is None:
-      for s,p,o in context.triplelite._get_obj_triples_spo_spo(rs,rp,ro):
-        yield self._owlready_2_rdflib(s,p,o,None), context
+      for s,p,o in triplelite._get_obj_triples_spo_spo(rs,rp,ro):
+        yield s,p,o,None
       if rp:
         prop = self.world._entities.get(rp)
         if prop and prop._inverse_storid:
-          for o,p,s in context.triplelite._get_obj_triples_spo_spo(ro,prop._inverse_storid,rs):
-            yield self._owlready_2_rdflib(s,rp,o,None), context
+          for o,p,s in triplelite._get_obj_triples_spo_spo(ro,prop._inverse_storid,rs):
+            yield s,rp,o,None
       else:
-        for o,p,s in context.triplelite._get_obj_triples_spo_spo(ro,None,rs):
+        for o,p,s in triplelite._get_obj_triples_spo_spo(ro,None,rs):
           prop = self.world._entities.get(p)
           if prop and prop._inverse_storid:
-            yield self._owlready_2_rdflib(s,prop._inverse_storid,o,None), context
+            yield s,prop._inverse_storid,o,None
         
     else:
-      for s,p,o,d in context.triplelite._get_data_triples_spod_spod(rs,rp,ro, None):
-        yield self._owlready_2_rdflib(s,p,o,d), context
-            
+      yield from triplelite._get_data_triples_spod_spod(rs,rp,ro, None)
       
+  def _evaluate_bgp(self, ctx, triples):
+    # Translates the basic graph pattern in SPARQL, and executes it with the native SPARQL engine
+    vars   = []
+    params = []
+    def term(x, predicate = False):
+      if isinstance(x, rdflib.term.Variable):
+        value = ctx[x]
+        if value is None:
+          if predicate: raise NotImplementedError # Variable predicates also match inverse properties
+          if not x in vars: vars.append(x)
+          return "?%s" % x
+        x = value
+      if   isinstance(x, URIRef):
+        storid = self.triplelite._abbreviate(str(x), False)
+        if storid is None: return None
+        if predicate: return storid
+        params.append(_Storid(storid))
+      elif isinstance(x, Literal):
+        if   x.language: value = locstr(str(x), x.language)
+        elif x.datatype: value = x.toPython()
+        else:            value = str(x)
+        if isinstance(value, Literal): raise NotImplementedError
+        try:    self.world._to_rdf(value)
+        except: raise NotImplementedError
+        params.append(value)
+      else: raise NotImplementedError # Blank nodes
+      return "??%s" % len(params)
+    
+    patterns = []
+    for triple in triples:
+      s, p, o = term(triple[0]), term(triple[1], True), term(triple[2])
+      if None in (s, p, o): return iter(()) # Unknown IRI, no match
+      inverses = self._get_inverses(p)
+      if inverses: # Also matches the triples asserted with the inverse properties, as in triples()
+        patterns.append(" UNION ".join(["{ %s <%s> %s . }" % (s, self._uriref(p), o)] + ["{ %s <%s> %s . }" % (o, self._uriref(inverse), s) for inverse in inverses]))
+      else:
+        patterns.append("%s <%s> %s" % (s, self._uriref(p), o))
+    if not vars: raise NotImplementedError
+    try:
+      query = self.world.prepare_sparql("""SELECT %s WHERE { %s . }""" % (" ".join("?%s" % var for var in vars), " . ".join(patterns)), False)
+    except Exception: raise NotImplementedError
+    return self._evaluate_bgp_solutions(ctx, vars, query, params)
+  
+  def _evaluate_bgp_solutions(self, ctx, vars, query, params):
+    rows = iter(owlready2.sparql.main.PreparedQuery.execute(query, params))
+    while True:
+      batch = list(itertools.islice(rows, _BATCH_SIZE))
+      if not batch: break
+      storids = set()
+      for row in batch:
+        for x in row:
+          if isinstance(x, int) and (x > 0): storids.add(x)
+      self._resolve_storids(storids)
+      for row in batch:
+        c = ctx.push()
+        i = 0
+        for var in vars:
+          if query.column_types[i] == "objs":
+            if not row[i] is None: c[var] = self._owlready_2_rdflib_object(row[i], None)
+            i += 1
+          else:
+            if not row[i] is None: c[var] = self._owlready_2_rdflib_object(row[i], row[i + 1])
+            i += 2
+        yield c.solution()
+        
   def __len__(self, context = None):
-    return len(context.triplelite)
+    return len(self._get_triplelite(context))
   
   def contexts(self, triple = None):
     if triple is None:
@@ -181,6 +332,17 @@ class TripleLiteRDFlibStore(rdflib.store.Store):
       return self.context_graphs[identifier_or_ontology]
     
         
+def _evaluate_bgp(ctx, part):
+  # Pushes the basic graph patterns down to the native SPARQL engine when querying the whole quadstore
+  if part.name != "BGP": raise NotImplementedError
+  store = getattr(ctx.graph, "store", None)
+  if (not isinstance(store, TripleLiteRDFlibStore)) or (not isinstance(store.triplelite, owlready2.triplelite.Graph)) or (not getattr(ctx.graph, "triplelite", None) is store.triplelite):
+    raise NotImplementedError
+  return store._evaluate_bgp(ctx, part.triples)
+
+rdflib.plugins.sparql.CUSTOM_EVALS["owlready2"] = _evaluate_bgp
+
+
 class TripleLiteRDFlibGraph(rdflib.Graph):
   onto = None
   def query_owlready(self, query, *args, **kargs):
@@ -203,9 +203,7 @@ def sync_reasoner_hermit(x = None, infer_property_values = False, debug = 1, kee
           a, b = pair[1:-1].split(">, <", 1)
           a_storid = ontology._abbreviate(a, False)
           b_storid = ontology._abbreviate(b, False)
-          if ((not a_storid is None) and (not b_storid is None) and
-              (not world._has_obj_triple_spo(a_storid, prop.storid, b_storid)) and
-             ((not prop._inverse_property) or (not world._has_obj_triple_spo(b_storid, prop._inverse_storid, a_storid)))):
+          if (not a_storid is None) and (not b_storid is None):
             inferred_obj_relations.append((a_storid, prop, b_storid))
           
     if not keep_tmp_file: os.unlink(tmp.name)
@@ -322,9 +320,7 @@ def sync_reasoner_pellet(x = None, infer_property_values = False, infer_data_pro
         if prop is None: continue
         a_storid = ontology._abbreviate(a_iri, False)
         b_storid = ontology._abbreviate(b_iri.strip(), False)
-        if ((not a_storid is None) and (not b_storid is None) and
-            (not world._has_obj_triple_spo(a_storid, prop.storid, b_storid)) and
-           ((not prop._inverse_property) or (not world._has_obj_triple_spo(b_storid, prop._inverse_storid, a_storid)))):
+        if (not a_storid is None) and (not b_storid is None):
           inferred_obj_relations.append((a_storid, prop, b_storid))
         
     if infer_data_property_values:
@@ -340,8 +336,7 @@ def sync_reasoner_pellet(x = None, infer_property_values = False, infer_data_pro
           python_datatype = owlready2.base._universal_abbrev_2_datatype.get(datatype)
           if   python_datatype is int:   value = int  (value)
           elif python_datatype is float: value = float(value)
-        if ((not a_storid is None) and
-            (not world._has_data_triple_spod(a_storid, prop.storid, value))):
+        if not a_storid is None:
           inferred_data_relations.append((a_storid, prop, value, datatype))
       
     if not keep_tmp_file: os.unlink(tmp.name)
@@ -357,32 +352,391 @@ def sync_reasoner_pellet(x = None, infer_property_values = False, infer_data_pro
 
 
 
+_RL_RULES = None
+def _rl_rules():
+  # (number of premises, SQL producing (s,p,o), property value rule?)
+  # {0}, {1}, ... are replaced by the premise tables: the whole closure or only the last delta (semi-naive evaluation).
+  global _RL_RULES
+  if _RL_RULES is None:
+    symmetric = SymmetricProperty .storid
+    transitive = TransitiveProperty.storid
+    _RL_RULES = [
+      (1, "SELECT s,%s,o FROM {0} WHERE p=%s" % (rdfs_subclassof, owl_equivalentclass), False), # cax-eqc1
+      (1, "SELECT o,%s,s FROM {0} WHERE p=%s" % (rdfs_subclassof, owl_equivalentclass), False), # cax-eqc2
+      (1, "SELECT s,%s,o FROM {0} WHERE p=%s" % (rdfs_subpropertyof, owl_equivalentproperty), False), # prp-eqp1
+      (1, "SELECT o,%s,s FROM {0} WHERE p=%s" % (rdfs_subpropertyof, owl_equivalentproperty), False), # prp-eqp2
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o AND a.s!=b.o" % (rdfs_subclassof, rdfs_subclassof, rdfs_subclassof), False), # scm-sco
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o AND a.s!=b.o" % (rdfs_subpropertyof, rdfs_subpropertyof, rdfs_subpropertyof), False), # scm-spo
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o" % (rdf_type, rdf_type, rdfs_subclassof), False), # cax-sco
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o" % (rdf_domain, rdf_domain, rdfs_subclassof), False), # scm-dom1
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o" % (rdf_range, rdf_range, rdfs_subclassof), False), # scm-rng1
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o" % (rdf_domain, rdfs_subpropertyof, rdf_domain), False), # scm-dom2
+      (2, "SELECT a.s,%s,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=%s AND b.s=a.o" % (rdf_range, rdfs_subpropertyof, rdf_range), False), # scm-rng2
+      (2, "SELECT b.s,%s,a.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=a.s" % (rdf_type, rdf_domain), False), # prp-dom
+      (2, "SELECT b.o,%s,a.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=a.s" % (rdf_type, rdf_range), False), # prp-rng
+      (1, "SELECT DISTINCT b.s,%s,a.o FROM {0} a, datas b WHERE a.p=%s AND b.p=a.s" % (rdf_type, rdf_domain), False), # prp-dom, data properties
+      (2, "SELECT a.s,%s,r.r FROM {0} a, {1} b, rl_svf r WHERE a.p=r.p AND b.s=a.o AND b.p=%s AND b.o=r.d" % (rdf_type, rdf_type), False), # cls-svf1
+      (1, "SELECT a.s,%s,r.r FROM {0} a, rl_svf r WHERE a.p=r.p AND r.d=%s" % (rdf_type, owl_thing), False), # cls-svf2
+      (1, "SELECT a.s,%s,r.r FROM {0} a, rl_hv r WHERE a.p=r.p AND a.o=r.v" % rdf_type, False), # cls-hv2
+      (1, "SELECT a.s,%s,i.m FROM {0} a, rl_int i WHERE a.p=%s AND a.o=i.r" % (rdf_type, rdf_type), False), # cls-int2
+      (1, "SELECT a.s,%s,i.r FROM {0} a, rl_int i WHERE a.p=%s AND a.o=i.m AND NOT EXISTS (SELECT 1 FROM rl_int i2 WHERE i2.r=i.r AND NOT EXISTS (SELECT 1 FROM rl_triples t WHERE t.s=a.s AND t.p=%s AND t.o=i2.m))" % (rdf_type, rdf_type, rdf_type), False), # cls-int1
+      (1, "SELECT a.s,r.p,r.v FROM {0} a, rl_hv r WHERE a.p=%s AND a.o=r.r" % rdf_type, True), # cls-hv1
+      (2, "SELECT b.s,a.o,b.o FROM {0} a, {1} b WHERE a.p=%s AND b.p=a.s" % rdfs_subpropertyof, True), # prp-spo1
+      (2, "SELECT b.o,a.o,b.s FROM {0} a, {1} b WHERE a.p=%s AND b.p=a.s" % owl_inverse_property, True), # prp-inv1
+      (2, "SELECT b.o,a.s,b.s FROM {0} a, {1} b WHERE a.p=%s AND b.p=a.o" % owl_inverse_property, True), # prp-inv2
+      (2, "SELECT b.o,b.p,b.s FROM {0} a, {1} b WHERE a.p=%s AND a.o=%s AND b.p=a.s" % (rdf_type, symmetric), True), # prp-symp
+      (3, "SELECT b.s,b.p,c.o FROM {0} a, {1} b, {2} c WHERE a.p=%s AND a.o=%s AND b.p=a.s AND c.p=b.p AND c.s=b.o" % (rdf_type, transitive), True), # prp-trp
+    ]
+  return _RL_RULES
+
+_RL_STATIC_PREDICATES = { SOME, VALUE, owl_onproperty, owl_intersectionof, rdf_first, rdf_rest }
+
+def _rl_materialize(world, asserted_condition, infer_property_values, added = None, added_datas = None):
+  execute = world.graph.execute
+  if added is None:
+    world._rl_session = None # Invalidate the closure kept by a previous session, if any
+    for table in ["rl_triples", "rl_delta", "rl_new"]:
+      execute("""CREATE TEMP TABLE IF NOT EXISTS %s (s INTEGER NOT NULL, p INTEGER NOT NULL, o INTEGER NOT NULL, PRIMARY KEY (s,p,o)) WITHOUT ROWID""" % table)
+      execute("""DELETE FROM %s""" % table)
+    execute("""CREATE INDEX IF NOT EXISTS rl_triples_pos ON rl_triples(p,o,s)""")
+    execute("""CREATE INDEX IF NOT EXISTS rl_delta_pos ON rl_delta(p,o,s)""")
+    execute("""CREATE TEMP TABLE IF NOT EXISTS rl_changed (s INTEGER PRIMARY KEY)""")
+    execute("""CREATE TEMP TABLE IF NOT EXISTS rl_svf (r INTEGER, p INTEGER, d INTEGER)""")
+    execute("""CREATE TEMP TABLE IF NOT EXISTS rl_hv  (r INTEGER, p INTEGER, v INTEGER)""")
+    execute("""CREATE TEMP TABLE IF NOT EXISTS rl_int (r INTEGER, m INTEGER)""")
+    for table in ["rl_changed", "rl_svf", "rl_hv", "rl_int"]: execute("""DELETE FROM %s""" % table)
+    
+    execute("""INSERT OR IGNORE INTO rl_triples SELECT s,p,o FROM objs WHERE %s""" % asserted_condition)
+    execute("""INSERT INTO rl_svf SELECT r.s,r2.o,r.o FROM rl_triples r, rl_triples r2 WHERE r.p=%s AND r2.s=r.s AND r2.p=%s""" % (SOME,  owl_onproperty))
+    execute("""INSERT INTO rl_hv  SELECT r.s,r2.o,r.o FROM rl_triples r, rl_triples r2 WHERE r.p=%s AND r2.s=r.s AND r2.p=%s""" % (VALUE, owl_onproperty))
+    execute("""
+WITH RECURSIVE l(r,node) AS (SELECT s,o FROM rl_triples WHERE p=%s UNION SELECT l.r,x.o FROM l, rl_triples x WHERE x.s=l.node AND x.p=%s)
+INSERT INTO rl_int SELECT l.r,x.o FROM l, rl_triples x WHERE x.s=l.node AND x.p=%s""" % (owl_intersectionof, rdf_rest, rdf_first))
+    execute("""INSERT OR IGNORE INTO rl_triples SELECT r,%s,m FROM rl_int""" % rdfs_subclassof) # scm-int
+    execute("""INSERT INTO rl_delta SELECT s,p,o FROM rl_triples""")
+    
+  else: # Incremental: the closure is already in rl_triples, only the added triples are new
+    execute("""DELETE FROM rl_changed""")
+    execute("""DELETE FROM rl_delta""")
+    world.graph.db.executemany("""INSERT OR IGNORE INTO rl_delta VALUES (?,?,?)""", added)
+    if added_datas: # prp-dom, data properties
+      world.graph.db.executemany("""INSERT OR IGNORE INTO rl_delta SELECT ?,%s,o FROM rl_triples WHERE s=? AND p=%s""" % (rdf_type, rdf_domain), added_datas)
+    execute("""DELETE FROM rl_delta WHERE EXISTS (SELECT 1 FROM rl_triples t WHERE t.s=rl_delta.s AND t.p=rl_delta.p AND t.o=rl_delta.o)""")
+    execute("""INSERT INTO rl_triples SELECT s,p,o FROM rl_delta""")
+    
+  rules = [(nb, sql) for (nb, sql, value_rule) in _rl_rules() if infer_property_values or not value_rule]
+  nb_iteration = 0
+  while True:
+    nb_iteration += 1
+    if not added is None: execute("""INSERT OR IGNORE INTO rl_changed SELECT DISTINCT s FROM rl_delta""")
+    for nb, sql in rules:
+      for i in range(nb):
+        execute("INSERT OR IGNORE INTO rl_new %s" % sql.format(*["rl_delta" if j == i else "rl_triples" for j in range(nb)]))
+    execute("""DELETE FROM rl_new WHERE EXISTS (SELECT 1 FROM rl_triples t WHERE t.s=rl_new.s AND t.p=rl_new.p AND t.o=rl_new.o)""")
+    execute("""DELETE FROM rl_delta""")
+    if not execute("""SELECT 1 FROM rl_new LIMIT 1""").fetchone(): break
+    execute("""INSERT INTO rl_delta SELECT s,p,o FROM rl_new""")
+    execute("""INSERT INTO rl_triples SELECT s,p,o FROM rl_new""")
+    execute("""DELETE FROM rl_new""")
+  return nb_iteration
+
+def _rl_most_specific(storids, supers):
+  return { storid for storid in storids
+           if not any((storid in supers.get(storid2, ())) and (not storid2 in supers.get(storid, ())) for storid2 in storids if not storid2 == storid) }
+
+def _rl_setup(x):
+  if   isinstance(x, World):    world = x
+  elif isinstance(x, Ontology): world = x.world
+  elif isinstance(x, list):     world = x[0].world
+  else:                         world = owlready2.default_world
+  
+  if world.backend == 'sparql-endpoint':
+    raise TypeError('Backend sparql-endpoint does not support OWL RL reasoning.')
+  
+  if   isinstance(x, Ontology):  ontology = x
+  elif CURRENT_NAMESPACES.get(): ontology = CURRENT_NAMESPACES.get()[-1].ontology
+  else:                          ontology = world.get_ontology(_INFERRENCES_ONTOLOGY)
+  
+  # Triples previously inferred in the inference ontology are not considered as asserted,
+  # so as they can be retracted if they are no longer entailed.
+  owned = ontology.base_iri == _INFERRENCES_ONTOLOGY
+  if isinstance(x, list): asserted_condition = "c IN (%s)" % ",".join(str(onto.graph.c) for onto in x if not onto is ontology)
+  else:                   asserted_condition = "1"
+  if owned:               asserted_condition = "%s AND c!=%s" % (asserted_condition, ontology.graph.c)
+  return world, ontology, owned, asserted_condition
+
+def _rl_apply(world, ontology, owned, asserted_condition, infer_property_values, debug, incremental = False):
+  execute = world.graph.execute
+  if incremental: # Only consider the entities that have new triples, and their parents
+    changed = " AND s IN (SELECT s FROM rl_changed)"
+    changed_and_parents = " AND (s IN (SELECT s FROM rl_changed) OR s IN (SELECT t.o FROM rl_triples t, rl_changed c WHERE t.s=c.s AND t.p IN (%s,%s,%s)))" % (rdfs_subclassof, rdfs_subpropertyof, rdf_type)
+  else:
+    changed = changed_and_parents = ""
+    
+  def fetch(p, restriction):
+    d = defaultdict(set)
+    for s, o in execute("SELECT s,o FROM rl_triples WHERE p=? AND s>0 AND o>0%s" % restriction, (p,)): d[s].add(o)
+    return d
+  
+  asserted = "SELECT s,o FROM objs WHERE p=? AND s>0 AND o>0 AND %s%s" % (asserted_condition, changed)
+  is_class      = { s for (s,) in execute("SELECT s FROM rl_triples WHERE p=? AND o=? AND s>0", (rdf_type, owl_class)) }
+  is_property   = dict(execute("SELECT s,o FROM rl_triples WHERE p=? AND o IN (?,?) AND s>0", (rdf_type, owl_object_property, owl_data_property)))
+  
+  new_parents   = defaultdict(list)
+  new_equivs    = defaultdict(list)
+  entity_2_type = {}
+  
+  is_a_supers = {}
+  for is_a, entity_type, candidates in [(rdfs_subclassof, "class", is_class), (rdfs_subpropertyof, "property", is_property)]:
+    supers = is_a_supers[is_a] = fetch(is_a, changed_and_parents)
+    for s in supers: supers[s].discard(s)
+    asserted_supers = defaultdict(set)
+    for s, o in execute(asserted, (is_a,)): asserted_supers[s].add(o)
+    equiv = owl_equivalentclass if is_a == rdfs_subclassof else owl_equivalentproperty
+    asserted_equivs = set(execute("SELECT s,o FROM objs WHERE p=? AND %s" % asserted_condition, (equiv,)))
+    for s in (supers if not incremental else [s for (s,) in execute("SELECT s FROM rl_changed")]):
+      parents = supers.get(s)
+      if (not parents) or (not s in candidates): continue
+      if (entity_type == "class") and (owl_nothing in parents):
+        if not (s, owl_nothing) in asserted_equivs:
+          new_equivs[s].append(owl_nothing)
+          entity_2_type[s] = entity_type
+        continue
+      parents = { parent for parent in parents if (parent in candidates) and (parent != owl_thing) }
+      for parent in parents:
+        if (s in supers.get(parent, ())) and (not (s, parent) in asserted_equivs) and (not (parent, s) in asserted_equivs):
+          new_equivs[s].append(parent)
+          entity_2_type[s] = entity_type
+      if parents - asserted_supers.get(s, set()):
+        new_parents[s] = list(_rl_most_specific(parents, supers) - { parent for parent in parents if s in supers.get(parent, ()) })
+        if new_parents[s]: entity_2_type[s] = entity_type
+        else:              del new_parents[s]
+        
+  class_supers = is_a_supers[rdfs_subclassof]
+  types = fetch(rdf_type, changed)
+  asserted_types = defaultdict(set)
+  for s, o in execute(asserted, (rdf_type,)): asserted_types[s].add(o)
+  for s, classes in types.items():
+    if (s in is_class) or (s in is_property): continue
+    classes = { o for o in classes if (o in is_class) and (o != owl_thing) }
+    if classes - asserted_types.get(s, set()):
+      new_parents[s] = list(_rl_most_specific(classes, class_supers))
+      entity_2_type[s] = "individual"
+      
+  if owned and not incremental:
+    # Retract previous inferences that are no longer entailed
+    predicates = [rdfs_subclassof, rdfs_subpropertyof, rdf_type, owl_equivalentclass, owl_equivalentproperty]
+    if infer_property_values: predicates.extend(s for (s,) in execute("SELECT s FROM rl_triples WHERE p=? AND o=?", (rdf_type, owl_object_property)))
+    stales = execute("""SELECT s,p,o FROM objs q WHERE c=? AND s!=? AND p IN (%s) AND NOT EXISTS (SELECT 1 FROM rl_triples t WHERE t.s=q.s AND t.p=q.p AND t.o=q.o)""" % ",".join(str(p) for p in predicates), (ontology.graph.c, ontology.storid)).fetchall()
+    for s, p, o in stales:
+      if debug: print("* Owlready * Retracting:", world._unabbreviate(s), world._unabbreviate(p), world._unabbreviate(o), file = sys.stderr)
+      ontology._del_obj_triple_raw_spo(s, p, o)
+      if (s in new_parents) or (not s in world._entities): continue
+      if   p in is_a_supers:
+        if p == rdfs_subclassof: entity_type, candidates, default = "class",    is_class,    owl_thing
+        else:                    entity_type, candidates, default = "property", is_property, is_property.get(s)
+        parents = { parent for parent in is_a_supers[p].get(s, ()) if (parent in candidates) and (parent != owl_thing) }
+        new_parents[s] = list(_rl_most_specific(parents, is_a_supers[p])) or [default]
+        entity_2_type[s] = entity_type
+      elif p == rdf_type:
+        if o in is_class:
+          classes = { c for c in types.get(s, ()) if (c in is_class) and (c != owl_thing) }
+          new_parents[s] = list(_rl_most_specific(classes, class_supers)) or [owl_thing]
+          entity_2_type[s] = "individual"
+      elif p in (owl_equivalentclass, owl_equivalentproperty):
+        entity1 = world._entities.get(s)
+        entity2 = world._entities.get(o)
+        with LOADING:
+          for e1, e2 in [(entity1, entity2), (entity2, entity1)]:
+            if (e1 is None) or (e2 is None): continue
+            if e2 in e1.equivalent_to: e1.equivalent_to._remove(e2)
+            e1.equivalent_to._indirect = None
+      else:
+        entity = world._entities.get(s)
+        prop   = world._get_by_storid(p)
+        if (not prop is None) and (prop._python_name in entity.__dict__): delattr(entity, prop._python_name)
+        
+  if infer_property_values:
+    inferred_obj_relations = []
+    for s, p, o in execute("""SELECT t.s,t.p,t.o FROM rl_triples t, rl_triples pt WHERE pt.s=t.p AND pt.p=? AND pt.o=? AND t.s>0 AND t.o>0%s AND NOT EXISTS (SELECT 1 FROM objs q WHERE q.s=t.s AND q.p=t.p AND q.o=t.o)""" % changed.replace(" s IN", " t.s IN"), (rdf_type, owl_object_property)).fetchall():
+      prop = world._get_by_storid(p)
+      if not prop is None: inferred_obj_relations.append((s, prop, o))
+      
+  _apply_reasoning_results(world, ontology, debug, new_parents, new_equivs, entity_2_type)
+  if infer_property_values:
+    _apply_inferred_obj_relations(world, ontology, debug, inferred_obj_relations)
+    
+def sync_reasoner_rl(x = None, infer_property_values = False, debug = 1):
+  world, ontology, owned, asserted_condition = _rl_setup(x)
+  
+  if debug:
+    import time
+    print("* Owlready2 * Running OWL RL materialization...", file = sys.stderr)
+    t0 = time.time()
+    
+  nb_iteration = _rl_materialize(world, asserted_condition, infer_property_values)
+  
+  if debug:
+    print("* Owlready2 * OWL RL materialization took %s seconds (%s iterations)" % (time.time() - t0, nb_iteration), file = sys.stderr)
+    
+  _rl_apply(world, ontology, owned, asserted_condition, infer_property_values, debug)
+  
+  if debug: print("* Owlready * (NB: only changes on entities loaded in Python are shown, other changes are done but not listed)", file = sys.stderr)
+  
+  
+class RLReasoningSession(object):
+  _TRACKED_METHODS = ["_add_obj_triple_raw_spo", "_set_obj_triple_raw_spo", "_del_obj_triple_raw_spo",
+                      "_add_data_triple_raw_spod", "_set_data_triple_raw_spod", "_del_data_triple_raw_spod"]
+  
+  def __init__(self, x = None, infer_property_values = False, debug = 1):
+    self.world, self.ontology, self.owned, self.asserted_condition = _rl_setup(x)
+    self.infer_property_values = infer_property_values
+    self.debug       = debug
+    self.scope       = { onto for onto in x if not onto is self.ontology } if isinstance(x, list) else None
+    self.added       = []
+    self.added_datas = []
+    self.need_full   = True
+    self.syncing     = False
+    self.nb_tracked  = 0    # Number of calls to the tracked methods since the last sync
+    self.version     = None # Data version of the quadstore at the end of the last sync
+    self.tracked     = {}
+    self._track(self.world)
+    for onto in list(self.world.ontologies.values()): self._track(onto)
+    
+  def _track(self, x):
+    trackers = self.tracked[x] = {}
+    in_scope = isinstance(x, Ontology) and ((self.scope is None) or (x in self.scope)) and not (self.owned and (x is self.ontology))
+    for method_name in self._TRACKED_METHODS:
+      method = x.__dict__.get(method_name)
+      if method is None: continue
+      tracker = trackers[method_name] = self._gen_tracker(method_name, method, in_scope)
+      tracker.original = method
+      setattr(x, method_name, tracker)
+      
+  def _gen_tracker(self, method_name, method, in_scope):
+    if   method_name == "_add_obj_triple_raw_spo":
+      def f(s, p, o):
+        method(s, p, o)
+        self.nb_tracked += 1
+        if in_scope and not self.syncing:
+          if p in _RL_STATIC_PREDICATES: self.need_full = True
+          else:                          self.added.append((s, p, o))
+    elif method_name in ("_add_data_triple_raw_spod", "_set_data_triple_raw_spod"):
+      def f(s, p, o, d):
+        method(s, p, o, d)
+        self.nb_tracked += 1
+        if in_scope and not self.syncing: self.added_datas.append((s, p))
+    elif method_name.startswith("_del_data"):
+      def f(s = None, p = None, o = None, d = None):
+        method(s, p, o, d)
+        self.nb_tracked += 1
+        if not self.syncing: self.need_full = True
+    elif method_name.startswith("_del"):
+      def f(s = None, p = None, o = None):
+        method(s, p, o)
+        self.nb_tracked += 1
+        if not self.syncing: self.need_full = True
+    else: # Set may remove triples
+      def f(s, p, o):
+        method(s, p, o)
+        self.nb_tracked += 1
+        if in_scope and not self.syncing: self.need_full = True
+    return f
+  
+  def sync(self):
+    if self.tracked is None: raise ValueError("Cannot sync a closed reasoning session!")
+    for onto in list(self.world.ontologies.values()):
+      if not onto in self.tracked:
+        self._track(onto)
+        self.need_full = True
+    if not getattr(self.world, "_rl_session", None) is self: self.need_full = True
+    if self._has_untracked_changes(): self.need_full = True
+    
+    if self.debug:
+      import time
+      print("* Owlready2 * Running %s OWL RL materialization..." % ("full" if self.need_full else "incremental"), file = sys.stderr)
+      t0 = time.time()
+      
+    self.syncing = True
+    try:
+      if self.need_full: nb_iteration = _rl_materialize(self.world, self.asserted_condition, self.infer_property_values)
+      else:              nb_iteration = _rl_materialize(self.world, self.asserted_condition, self.infer_property_values, self.added, self.added_datas)
+      if self.debug: print("* Owlready2 * OWL RL materialization took %s seconds (%s iterations)" % (time.time() - t0, nb_iteration), file = sys.stderr)
+      _rl_apply(self.world, self.ontology, self.owned, self.asserted_condition, self.infer_property_values, self.debug, not self.need_full)
+    finally:
+      self.syncing = False
+      
+    self.world._rl_session = self
+    self.added       = []
+    self.added_datas = []
+    self.need_full   = False
+    self.nb_tracked  = 0
+    self.version     = self.world.graph._get_data_version()
+    
+  def _has_untracked_changes(self):
+    # The quadstore may also be modified without the tracked methods, e.g. by SPARQL updates, incremental reloads or other connections.
+    # Each call to a tracked method modifies it once; any other change requires a full materialization.
+    if self.version is None: return True
+    nb_changes, data_version = self.world.graph._get_data_version()
+    return (nb_changes != self.version[0] + self.nb_tracked) or (data_version != self.version[1])
+    
+  def close(self):
+    if self.tracked is None: return
+    for x, trackers in self.tracked.items():
+      for method_name, tracker in trackers.items():
+        if x.__dict__.get(method_name) is tracker: setattr(x, method_name, tracker.original) # Else, wrapped again after the session was opened
+    self.tracked = None
+    self.syncing = True # The trackers that remain wrapped no longer record changes
+    if getattr(self.world, "_rl_session", None) is self: self.world._rl_session = None
+    
+  def __enter__(self): return self
+  def __exit__(self, exc_type = None, exc_val = None, exc_tb = None): self.close()
+  
+
+
+def _add_new_obj_triples(world, ontology, triples, return_new = False):
+  l = CURRENT_NAMESPACES.get()
+  ontology = (l and l[-1].ontology) or ontology
+  if ontology.__dict__.get("_add_obj_triple_raw_spo") == ontology.graph._add_obj_triple_raw_spo:
+    return ontology.graph._add_new_obj_triples_raw_spo(triples, return_new)
+  new = world.graph._new_obj_triples(triples) # Observed ontology => add triples one by one, for listeners
+  for s, p, o, ip in new: ontology._add_obj_triple_raw_spo(s, p, o)
+  return new
+
+def _add_new_data_triples(world, ontology, triples, return_new = False):
+  l = CURRENT_NAMESPACES.get()
+  ontology = (l and l[-1].ontology) or ontology
+  if ontology.__dict__.get("_add_data_triple_raw_spod") == ontology.graph._add_data_triple_raw_spod:
+    return ontology.graph._add_new_data_triples_raw_spod(triples, return_new)
+  new = world.graph._new_data_triples(triples)
+  for s, p, o, d in new: ontology._add_data_triple_raw_spod(s, p, o, d)
+  return new
+  
 def _apply_reasoning_results(world, ontology, debug, new_parents, new_equivs, entity_2_type):
   new_parents_loaded = defaultdict(list)
   new_equivs_loaded  = defaultdict(list)
-
-  for child_storid, parent_storids in new_parents.items():
+  
+  triples = [(child_storid, _TYPE_2_IS_A[entity_2_type[child_storid]], parent_storid, 0)
+             for child_storid, parent_storids in new_parents.items() for parent_storid in parent_storids]
+  triples.extend((concept1_storid, _TYPE_2_EQUIVALENT_TO[entity_2_type[concept1_storid]], concept2_storid, 0)
+                 for concept1_storid, concept2_storids in new_equivs.items() for concept2_storid in concept2_storids)
+  if triples: _add_new_obj_triples(world, ontology, triples)
+    
+  loaded_children = [(child, parent_storids) for child_storid, parent_storids in new_parents.items()
+                     for child in (world._entities.get(child_storid),) if not child is None]
+  parent_storids = list({ parent_storid for child, parent_storids in loaded_children for parent_storid in parent_storids })
+  storid_2_parent = dict(zip(parent_storids, world._get_by_storids(parent_storids, default_to_none = False)))
+  for child, parent_storids in loaded_children:
+    l = new_parents_loaded[child] = []
     for parent_storid in parent_storids:
-      owl_relation = _TYPE_2_IS_A[entity_2_type[child_storid]]
-      if not ontology.world._has_obj_triple_spo(child_storid, owl_relation, parent_storid):
-        ontology._add_obj_triple_spo(child_storid, owl_relation, parent_storid)
+      parent = storid_2_parent[parent_storid]
+      if parent is None:
+        print("* Owlready2 * Warning: Cannot find new parent '%s'" % parent_storid, file = sys.stderr)
+      else:
+        l.append(parent)
         
-    child = world._entities.get(child_storid)
-    if not child is None:
-      l = new_parents_loaded[child] = []
-      for parent_storid in parent_storids:
-        parent = world._get_by_storid(parent_storid)
-        if parent is None:
-          print("* Owlready2 * Warning: Cannot find new parent '%s'" % parent_storid, file = sys.stderr)
-        else:
-          l.append(parent)
-          
   for concept1_storid, concept2_storids in new_equivs.items():
     for concept2_storid in concept2_storids:
-      owl_relation = _TYPE_2_EQUIVALENT_TO[entity_2_type[concept1_storid]]
-      if not ontology.world._has_obj_triple_spo(concept1_storid, owl_relation, concept2_storid):
-        ontology._add_obj_triple_spo(concept1_storid, owl_relation, concept2_storid)
-        
       if concept2_storid == owl_nothing:
         concept1 = world._entities.get(concept1_storid)
         if not concept1 is None: new_equivs_loaded[concept1].append(Nothing)
@@ -431,9 +785,11 @@ def _apply_reasoning_results(world, ontology, debug, new_parents, new_equivs, en
 
           
 def _apply_inferred_obj_relations(world, ontology, debug, relations):
-  for a_storid, prop, b_storid in relations:
-    ontology._add_obj_triple_spo(a_storid, prop.storid, b_storid)
-    
+  storid_2_prop = { prop.storid : prop for a_storid, prop, b_storid in relations }
+  relations = _add_new_obj_triples(world, ontology, [(a_storid, prop.storid, b_storid, prop._inverse_storid if prop._inverse_property else 0) for a_storid, prop, b_storid in relations], True)
+  
+  for a_storid, p, b_storid, ip in relations:
+    prop = storid_2_prop[p]
     a = world._entities.get(a_storid)
     if not a is None:
       if debug:
@@ -450,13 +806,14 @@ def _apply_inferred_obj_relations(world, ontology, debug, relations):
           
           
 def _apply_inferred_data_relations(world, ontology, debug, relations):
-  for a_storid, prop, value, datatype in relations:
-    ontology._add_data_triple_spod(a_storid, prop.storid, value, datatype)
-    
+  storid_2_prop = { prop.storid : prop for a_storid, prop, value, datatype in relations }
+  relations = _add_new_data_triples(world, ontology, [(a_storid, prop.storid, value, datatype) for a_storid, prop, value, datatype in relations], True)
+  
+  for a_storid, p, value, datatype in relations:
+    prop = storid_2_prop[p]
     a = world._entities.get(a_storid)
     if not a is None:
       if debug:
         print("* Owlready * Adding relation %s %s %s" % (a, prop.name, value))
       if prop._python_name in a.__dict__:
         delattr(a, prop._python_name)
-        
@@ -132,12 +132,12 @@ def _get_regexp(pattern, flags):
     elif i == "m": f |= re.MULTILINE
   return re.compile(pattern, f)
 
-def _regex(s, pattern, flags):
+def _regex(s, pattern, flags = ""):
   pattern = _get_regexp(pattern, flags)
   return bool(pattern.search(s))
 
 _REGEX_SUB_ARG_RE = re.compile("\\$([0-9]*)")
-def _sparql_replace(s, pattern, replacement, flags):
+def _sparql_replace(s, pattern, replacement, flags = ""):
   pattern = _get_regexp(pattern, flags)
   replacement = _REGEX_SUB_ARG_RE.sub(r"\\\1", replacement)
   return pattern.sub(replacement, s)
@@ -165,6 +165,14 @@ def _timezone(x):
     "%dS" % delta.seconds if (not days and not hours and not minutes) else "",
   )
   
+from owlready2.driver import owlready2_optimized
+if owlready2_optimized and hasattr(owlready2_optimized, "sparql_regex"): # Compiled versions, with a cache of compiled regexps and a fast ISO datetime parser
+  _regex, _sparql_replace = owlready2_optimized.sparql_regex, owlready2_optimized.sparql_replace
+  _md5, _sha1, _sha256, _sha384, _sha512 = owlready2_optimized.md5, owlready2_optimized.sha1, owlready2_optimized.sha256, owlready2_optimized.sha384, owlready2_optimized.sha512
+  _parse_iso_datetime = owlready2_optimized.parse_datetime
+  def _parse_datetime(x, _parse_any_datetime = _parse_datetime): return _parse_iso_datetime(x) or _parse_any_datetime(x)
+  
+  
 class _Func(object):
   def __init__(self, world):
     self.world        = world
@@ -205,12 +213,13 @@ class _Func(object):
     return x in self.world._entities
   
 
-def register_python_function(world):
+def register_python_function(world, db = None):
+  db = db or world.graph.db
   if (sys.version_info.major == 3) and (sys.version_info.minor < 8):
     def create_function(name, num_params, func, deterministic = False):
-      world.graph.db.create_function(name, num_params, func)
+      db.create_function(name, num_params, func)
   else:
-    create_function = world.graph.db.create_function
+    create_function = db.create_function
   create_function("md5",            1, _md5,      deterministic = True)
   create_function("sha1",           1, _sha1,     deterministic = True)
   create_function("sha256",         1, _sha256,   deterministic = True)
@@ -225,16 +234,20 @@ def register_python_function(world):
   create_function("regex",         -1, _regex,          deterministic = True)
   create_function("sparql_replace",-1, _sparql_replace, deterministic = True)
   
-  world._nb_sparql_call = 0
+  if db is world.graph.db: world._nb_sparql_call = 0
   func = _Func(world)
   create_function("now",             0, func._now, deterministic = True)
   create_function("bnode",          -1, func._bnode)
   create_function("newinstanceiri",  1, func._newinstanceiri)
   create_function("loaded",          1, func._loaded)
   
+  def _path_length(s, o, min_length, max_length, *ps): # Negative ps are inverse relations
+    path = world.graph._get_obj_shortest_path(s, o, [p for p in ps if p > 0], [-p for p in ps if p < 0], min_length, max_length, db)
+    if not path is None: return len(path) - 1
+  create_function("path_length",    -1, _path_length, deterministic = True)
+  
   # Unindexed table for deprioritizing subqueries
-  world.graph.execute("""CREATE TEMP TABLE one (i INTEGER)""") # CREATE TEMP TABLE one (i INTEGER); INSERT INTO one VALUES (1);
-  world.graph.execute("""INSERT INTO one VALUES (1)""")
+  db.execute("""CREATE TEMP TABLE one AS SELECT 1 AS i""") # Not INSERT, which would open a transaction
   
   
 class FuncSupport(object):
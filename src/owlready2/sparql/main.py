@@ -17,15 +17,29 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import sys, os, re, math
+import sys, os, re, math, itertools, time
 from owlready2 import *
+from owlready2.base import _universal_abbrev_2_datatype, _universal_datatype_2_abbrev
+from owlready2.namespace import _LOAD_BATCH_SIZE
 from owlready2.sparql.parser import *
 from owlready2.sparql.func   import register_python_function, FuncSupport
 
 _RE_AUTOMATIC_INDEX = re.compile(r"([^ ]*?) USING AUTOMATIC.*\((.*?)\)")
+_RE_PRELIM_NAME     = re.compile(r"\bprelim\d+\b")
+_RE_SQL_PARAMETER_OUTSIDE_STRING = re.compile(r"'(?:[^']|'')*'|\?(\d+)")
+_RE_AGGREGATE       = re.compile(r"\b(?:COUNT|SUM|MIN|MAX|AVG|SAMPLE|GROUP_CONCAT)\(", re.IGNORECASE)
+_RE_NEW_ENTITY      = re.compile(r"\b(?:NEWINSTANCEIRI|BNODE)\(", re.IGNORECASE)
 #_RE_NORMAL_INDEX    = re.compile(r"(.*?) AS (.*?) USING (COVERING )?INDEX (.*?) ")
 
+_NATIVE_DATATYPES   = { "0", str(_universal_datatype_2_abbrev[int]), str(_universal_datatype_2_abbrev[float]), str(_universal_datatype_2_abbrev[str]) }
+
+# Predicates whose update changes loaded entities beyond their property values (is_a, equivalent_to,...)
+_PYTHON_LEVEL_PREDICATES = { rdf_type, rdfs_subclassof, rdfs_subpropertyof, owl_equivalentindividual, owl_equivalentclass, owl_equivalentproperty, owl_inverse_property, rdf_domain, rdf_range }
+
 _DEPRIORIZE_SUBQUERIES_OPT = True
+_TEMP_TABLE_IDS            = itertools.count(1)
+
+def _get_nb_sql_parameter(sql): return max((int(i) for i in _RE_SQL_PARAMETER_OUTSIDE_STRING.findall(sql) if i), default = 0) # Ignores "?1" in string literals
 
 class Translator(object):
   def __init__(self, world, error_on_undefined_entities = True):
@@ -42,6 +56,7 @@ class Translator(object):
     self.escape_mark                   = "@@@ESCAPE@@@"
     self.next_table_id                 = 1
     self.table_name_2_type             = {}
+    self.table_estimates               = {}
     self.table_type_2_cols             = { "objs" : ["s", "p", "o"], "datas" : ["s", "p", "o", "d"], "quads" : ["s", "p", "o", "d"] , "one" : ["i"] }
     
     if not getattr(world.graph, "_has_sparql_func", False):
@@ -59,29 +74,47 @@ class Translator(object):
       self.escape_mark += "ç"
     CURRENT_TRANSLATOR.set(self)
     self.main_query = PARSER.parse(LEXER.lex(sparql))
-    return self.finalize()
+    query = self.finalize()
+    query.sparql          = sparql
+    query.table_estimates = self.table_estimates
+    return query
     
+  def get_with_sql(self, prelims):
+    if not prelims: return ""
+    sql = "WITH "
+    if max(prelim.recursive for prelim in prelims): sql += "RECURSIVE "
+    sql += ",\n\n".join(prelim.sql() for prelim in prelims)
+    sql += "\n\n"
+    return sql
+  
   def finalize(self):
-    sql = ""
-    if self.preliminary_selects:
-      sql += "WITH "
-      if max(prelim.recursive for prelim in self.preliminary_selects): sql += "RECURSIVE "
-      sql += ",\n\n".join(prelim.sql() for prelim in self.preliminary_selects)
-      sql += "\n\n"
-    sql += self.main_query.sql()
-    
-    if self.solution_modifier[0]:
-      sql += " GROUP BY %s" % ", ".join(self.main_query.parse_expression(x) for x in self.solution_modifier[0])
-    if self.solution_modifier[1]:
-      sql += " HAVING %s" % self.main_query.parse_expression(self.solution_modifier[1])
-    if self.solution_modifier[2]:
-      sql += " ORDER BY %s" % ", ".join(self.main_query.parse_expression(x) for x in self.solution_modifier[2])
+    with_sql = self.get_with_sql(self.preliminary_selects)
+    sql = self.main_query.sql()
+    
+    group_by = self.solution_modifier[0] and ", ".join(self.main_query.parse_expression(x) for x in self.solution_modifier[0])
+    having   = self.solution_modifier[1] and self.main_query.parse_expression(self.solution_modifier[1])
+    order_by = self.solution_modifier[2] and ", ".join(self.main_query.parse_expression(x) for x in self.solution_modifier[2])
+    if group_by: sql += " GROUP BY %s" % group_by
+    if having:   sql += " HAVING %s" % having
+    if order_by: sql += " ORDER BY %s" % order_by
     if self.solution_modifier[3]:
       sql += " LIMIT %s"  % self._to_sql(self.solution_modifier[3])
     if self.solution_modifier[4]:
       if not self.solution_modifier[3]: sql += " LIMIT -1" # SQLite requires a LIMIT clause before the OFFSET clause
       sql += " OFFSET %s" % self._to_sql(self.solution_modifier[4])
       
+    if (self.main_query.type == "select") and (not self.escape_mark in with_sql) and (not self.escape_mark in sql):
+      parallel_plan = self.get_parallel_plan(sql)
+    else:
+      parallel_plan = None
+    if self.main_query.type == "select":
+      batch_sql, batch_one_row = self.get_batch_sql(group_by, having, order_by)
+      stats_count = self.get_stats_count(group_by, having, order_by)
+    else:
+      batch_sql, batch_one_row = None, False
+      stats_count = None
+    sql = with_sql + sql
+    
     nb_parameter = max(self.current_parameter, self.max_fixed_parameter)
     parameter_2_parameter_datatypes = {}
     parameter_datatypes = []
@@ -96,6 +129,10 @@ class Translator(object):
             parameter_datatypes.append(number - 1)
         return "?%s" % r
       sql = re.sub("%s[^ ]*" % self.escape_mark, sub, sql)
+      if batch_sql: batch_sql = re.sub("%s[^ ]*" % self.escape_mark, sub, batch_sql)
+    if batch_sql:
+      if nb_parameter: batch_sql = _RE_SQL_PARAMETER_OUTSIDE_STRING.sub(lambda match: "_params.p%s" % match.group(1) if match.group(1) else match.group(0), batch_sql)
+      else:            batch_sql = None
       
     #if sql:
     #  if   self.main_query.type == "select": nb_sql_parameter = nb_parameter + len(parameter_datatypes)
@@ -103,13 +140,108 @@ class Translator(object):
     #  sql = self.optimize_sql(sql, nb_sql_parameter)
     
     if   self.main_query.type == "select":
-      return PreparedSelectQuery(self.world, sql, [column.var for column in self.main_query.columns if not column.name.endswith("d")], [column.type for column in self.main_query.columns], nb_parameter, parameter_datatypes)
+      query = PreparedSelectQuery(self.world, sql, [column.var for column in self.main_query.columns if not column.name.endswith("d")], [column.type for column in self.main_query.columns], nb_parameter, parameter_datatypes)
+      query.parallel_plan = parallel_plan
+      query.batch_sql     = batch_sql
+      query.batch_one_row = batch_one_row
+      query.stats_count   = stats_count
+      columns = self.main_query.columns
+      query.native_columns = frozenset(column.index for column, d_column in zip(columns, columns[1:]) # Aggregates already computed by SQLite as Python numbers / strings
+                                       if d_column.name.endswith("_d") and _RE_AGGREGATE.match(str(column.binding).lstrip()) and (str(d_column.binding) in _NATIVE_DATATYPES))
+      return query
     
     elif self.main_query.type == "modify":
       select_param_indexes = [i - 1 for i in self.main_query.select_param_indexes]
       return PreparedModifyQuery(self.world, sql, [column.var for column in self.main_query.columns if not column.name.endswith("d")], [column.type for column in self.main_query.columns], nb_parameter, parameter_datatypes, self.world.get_ontology(self.main_query.ontology_iri.value) if self.main_query.ontology_iri else None, self.parse_inserts_deletes(self.main_query.deletes, self.main_query.columns), self.parse_inserts_deletes(self.main_query.inserts, self.main_query.columns), select_param_indexes)
     
     
+  def get_batch_sql(self, group_by, having, order_by):
+    # SQL query executing the main query for many parameter sets at once (see PreparedSelectQuery.execute_many()).
+    # The parameter sets are read from the _params temp table (columns i, p1, p2,...), which is joined first,
+    # and their index i is selected as the first column. Returns the SQL query (None if the query cannot be rewritten so),
+    # and whether the query has aggregates without GROUP BY (one row per parameter set, even if nothing matches).
+    main_query = self.main_query
+    if isinstance(main_query, SQLCompoundQuery) or self.preliminary_selects or (not main_query.tables) or main_query.extra_sql: return None, False
+    if self.solution_modifier[3] or self.solution_modifier[4]: return None, False # LIMIT / OFFSET apply to each parameter set
+    
+    columns = ", ".join(str(column.binding) for column in main_query.columns)
+    sql = "SELECT %s_params.i, %s FROM _params CROSS JOIN " % ("DISTINCT " if main_query.distinct else "", columns)
+    for table in main_query.tables:
+      if not table is main_query.tables[0]: sql += " %s " % table.join
+      sql += table.sql()
+    if main_query.conditions:
+      sql += " WHERE %s" % " AND ".join(str(condition) for condition in main_query.conditions)
+    one_row = (not group_by) and bool(_RE_AGGREGATE.search(columns))
+    if   group_by: sql += " GROUP BY _params.i, %s" % group_by
+    elif one_row:  sql += " GROUP BY _params.i"
+    if having:     sql += " HAVING %s" % having
+    sql += " ORDER BY _params.i%s" % (", %s" % order_by if order_by else "")
+    return sql, one_row
+  
+  def get_stats_count(self, group_by, having, order_by):
+    # Simple COUNT queries with a single triple pattern and a fixed predicate, e.g. "SELECT (COUNT(?x) AS ?nb) { ?x a onto:A }"
+    # or "SELECT ?c (COUNT(?x) AS ?nb) { ?x a ?c } GROUP BY ?c", can be answered from the statistics (see Graph.get_stats()),
+    # when they are exact (see Graph.has_exact_stats()). Returns (predicate, object, grouped, selects) for such queries, and None otherwise.
+    main_query = self.main_query
+    if isinstance(main_query, SQLCompoundQuery) or self.preliminary_selects or main_query.distinct or main_query.extra_sql or (len(main_query.tables) != 1): return None
+    if having or self.solution_modifier[3] or self.solution_modifier[4]: return None
+    table = main_query.tables[0]
+    if (not table.type in { "objs", "datas", "quads" }) or table.index or table.join_conditions: return None
+    
+    p = o = None
+    for condition in main_query.conditions:
+      match = re.fullmatch(r"(?:LIKELIHOOD\()?%s\.([po])=(\d+)(?:, [^,)]+\))?" % table.name, str(condition))
+      if not match: return None
+      if match.group(1) == "p": p = int(match.group(2))
+      else:                     o = int(match.group(2))
+    key = "%s.o" % table.name
+    if (p is None) or ((not o is None) and (p != rdf_type)): return None # Only rdf:type has per-object statistics
+    if group_by and ((group_by != key) or (p != rdf_type) or (not o is None)): return None
+    if order_by and ((order_by != key) or (not group_by)): return None
+    
+    selects = []
+    for column in main_query.columns:
+      binding = str(column.binding).strip()
+      if   re.fullmatch(r"COUNT\( ?(\*|%s\.[spo])\)" % table.name, binding): selects.append("nb")
+      elif binding.isdigit():                                             selects.append(int(binding))
+      elif group_by and (binding == key):                                 selects.append("o")
+      else: return None
+    if not "nb" in selects: return None
+    return p, o, bool(group_by), selects
+  
+  def get_parallel_plan(self, main_sql):
+    # Parts of the query that can be executed in parallel: the branches of a top-level UNION, or else
+    # the non-recursive preliminary queries that do not depend on other preliminary queries (e.g. UNION, subqueries).
+    # Returns a list of (prelim name, column names, SQL queries, distinct) and the remaining SQL query
+    def get_union_queries(query):
+      if (len(query.queries) > 1) and all(i.operator == "UNION" for i in query.queries[1:]): return [i.sql() for i in query.queries]
+      
+    if isinstance(self.main_query, SQLCompoundQuery):
+      if main_sql != self.main_query.sql(): return None # Solution modifiers
+      unit_sqls = get_union_queries(self.main_query)
+      if not unit_sqls: return None
+      with_sql = self.get_with_sql(self.preliminary_selects)
+      return [(None, None, [with_sql + unit_sql for unit_sql in unit_sqls], True)], None
+    
+    prelim_names = { prelim.name for prelim in self.preliminary_selects }
+    parts        = []
+    remnants     = []
+    for prelim in self.preliminary_selects:
+      unit_sqls = None
+      if not prelim.recursive:
+        if isinstance(prelim, SQLCompoundQuery):
+          unit_sqls = get_union_queries(prelim)
+        else:
+          prelim.preliminary = False
+          unit_sqls = [prelim.sql()]
+          prelim.preliminary = True
+        if unit_sqls and any(prelim_names.intersection(_RE_PRELIM_NAME.findall(unit_sql)) for unit_sql in unit_sqls): unit_sqls = None
+      if unit_sqls: parts.append((prelim.name, [column.name for column in prelim.columns], unit_sqls, len(unit_sqls) > 1))
+      else:         remnants.append(prelim)
+      
+    if sum(len(unit_sqls) for (prelim_name, column_names, unit_sqls, distinct) in parts) < 2: return None
+    return parts, self.get_with_sql(remnants) + main_sql
+  
   def optimize_sql(self, sql, nb_sql_parameter):
     plan = list(self.world.graph.execute("""EXPLAIN QUERY PLAN %s""" % sql, (1,) * nb_sql_parameter))
                 
@@ -126,7 +258,6 @@ class Translator(object):
           elif index_name.startswith("o="): index_name = "index_%s_op" % table_type
           else: continue
           
-          print("OPTIMIZE!!!", l, table_type, table_name, "=>", index_name)
           table_def = "%s %s" % (table_type, table_name)
           sql = sql.replace(table_def, "%s INDEXED BY %s" % (table_def, index_name), 1)
     return sql
@@ -323,32 +454,210 @@ class PreparedQuery(object):
     self.column_types        = column_types
     self.nb_parameter        = nb_parameter
     self.parameter_datatypes = parameter_datatypes
+    self.sparql              = None
+    self.table_estimates     = {}
+    self.parallel_plan       = None
+    self.batch_sql           = None
+    self.batch_one_row       = False
+    self.stats_count         = None
+    self.native_columns      = frozenset()
     
-  def execute(self, params = ()):
-    self.world._nb_sparql_call += 1
+  def _get_sql_params(self, params):
     sql_params = [self.world._to_rdf(param)[0] for param in params]
     for i in self.parameter_datatypes: sql_params.append(self.world._to_rdf(params[i])[1])
-    return self.world.graph.execute(self.sql, sql_params)
+    return sql_params
   
-class PreparedSelectQuery(PreparedQuery):
   def execute(self, params = ()):
-    for l in PreparedQuery.execute(self, params):
-      l2 = []
+    self.world._nb_sparql_call += 1
+    sql_params = self._get_sql_params(params)
+    if self.world._sparql_metrics is None: return self.world.graph.execute(self.sql, sql_params)
+    return self._execute_with_metrics(sql_params)
+  
+  def _get_metrics(self):
+    metrics = self.world._sparql_metrics.get(self.sparql or self.sql)
+    if metrics is None: metrics = self.world._sparql_metrics[self.sparql or self.sql] = { "nb_execution" : 0, "nb_row" : 0, "sql_time" : 0.0 }
+    return metrics
+  
+  def _add_metrics(self, nb_execution, nb_row, sql_time):
+    if self.world._sparql_metrics is None: return
+    metrics = self._get_metrics()
+    metrics["nb_execution"] += nb_execution
+    metrics["nb_row"]       += nb_row
+    metrics["sql_time"]     += sql_time
+    
+  def _execute_with_metrics(self, sql_params):
+    metrics = self._get_metrics()
+    metrics["nb_execution"] += 1
+    t0 = time.perf_counter()
+    cursor = iter(self.world.graph.execute(self.sql, sql_params))
+    metrics["sql_time"] += time.perf_counter() - t0
+    while True:
+      t0 = time.perf_counter()
+      rows = list(itertools.islice(cursor, _LOAD_BATCH_SIZE))
+      metrics["sql_time"] += time.perf_counter() - t0
+      if not rows: break
+      metrics["nb_row"] += len(rows)
+      yield from rows
+      
+  def explain(self):
+    nb_sql_parameter = _get_nb_sql_parameter(self.sql)
+    plan = [(id, parent, detail) for (id, parent, notused, detail) in self.world.graph.execute("""EXPLAIN QUERY PLAN %s""" % self.sql, (1,) * nb_sql_parameter)]
+    return {
+      "sql"       : self.sql,
+      "plan"      : plan,
+      "estimates" : { table_name : estimate for (table_name, estimate) in self.table_estimates.items() if not estimate is None },
+      "warnings"  : [detail for (id, parent, detail) in plan if _RE_AUTOMATIC_INDEX.search(detail)],
+    }
+    
+  def profile(self, params = ()):
+    # For INSERT / DELETE queries, only the WHERE part is executed
+    t0   = time.perf_counter()
+    rows = list(PreparedQuery.execute(self, params))
+    return { "nb_row" : len(rows), "sql_time" : time.perf_counter() - t0 }
+  
+class PreparedSelectQuery(PreparedQuery):
+  def _load_entities(self, rows, entity_format = "entity"):
+    # Returns a dict mapping the storids in rows to entities, IRIs or storids, depending on entity_format
+    storids = set()
+    for l in rows:
       i = 0
       while i < len(l):
         if self.column_types[i] == "objs":
-          if l[i] is None: l2.append(None)
-          else: l2.append(self.world._to_python(l[i], None) or l[i])
+          storid = l[i]
           i += 1
         else:
-          if l[i + 1] is None:
-            if l[i] is None: l2.append(None)
-            else:            l2.append(self.world._to_python(l[i], None) or l[i])
-          else:
-            l2.append(self.world._to_python(l[i], l[i + 1]))
+          storid = l[i] if l[i + 1] is None else None
           i += 2
-      yield l2
+        if isinstance(storid, int) and storid: storids.add(storid)
+    if   entity_format == "storid": return { storid : storid for storid in storids }
+    elif entity_format == "iri":    return { storid : self.world._unabbreviate(storid) if storid > 0 else "_:%s" % -storid for storid in storids }
+    storids = [storid for storid in storids if (storid > 0) and (not storid in _universal_abbrev_2_datatype)]
+    return dict(zip(storids, self.world._get_by_storids(storids, default_to_none = False)))
+  
+  def _convert_row(self, l, loaded):
+    l2 = []
+    i = 0
+    while i < len(l):
+      if self.column_types[i] == "objs":
+        if l[i] is None: l2.append(None)
+        else: l2.append(loaded.get(l[i]) or self.world._to_python(l[i], None) or l[i])
+        i += 1
+      else:
+        if   i in self.native_columns: l2.append(l[i])
+        elif l[i + 1] is None:
+          if l[i] is None: l2.append(None)
+          else:            l2.append(loaded.get(l[i]) or self.world._to_python(l[i], None) or l[i])
+        else:
+          l2.append(self.world._to_python(l[i], l[i + 1]))
+        i += 2
+    return l2
+  
+  def _execute_parallel_plan(self, params, nb_worker):
+    # Executes the independent parts of the query concurrently (see Translator.get_parallel_plan()),
+    # merges their results (applying UNION's DISTINCT), and then executes the rest of the query on them.
+    # Returns None if the parallel execution is not possible.
+    def with_params(sql): return sql, sql_params[:_get_nb_sql_parameter(sql)]
+    
+    self.world._nb_sparql_call += 1
+    sql_params  = self._get_sql_params(params)
+    parts, main_sql = self.parallel_plan
+    graph       = self.world.graph
+    rowss       = graph.execute_parallel([with_params(unit_sql) for (prelim_name, column_names, unit_sqls, distinct) in parts for unit_sql in unit_sqls],
+                                         None if nb_worker is True else nb_worker, lambda db: register_python_function(self.world, db))
+    if rowss is None: return None
+    
+    resultss = []
+    for prelim_name, column_names, unit_sqls, distinct in parts:
+      rows = list(itertools.chain.from_iterable(rowss[:len(unit_sqls)]))
+      del rowss[:len(unit_sqls)]
+      if distinct: rows = list(dict.fromkeys(rows))
+      resultss.append(rows)
+    if main_sql is None: return resultss[0]
+    
+    table_names = {}
+    try:
+      for (prelim_name, column_names, unit_sqls, distinct), rows in zip(parts, resultss):
+        table_names[prelim_name] = table_name = "%s_%s" % (prelim_name, next(_TEMP_TABLE_IDS))
+        graph.execute("""CREATE TEMP TABLE %s(%s)""" % (table_name, ",".join(column_names)))
+        graph.db.executemany("""INSERT INTO %s VALUES (%s)""" % (table_name, ",".join("?" for column_name in column_names)), rows)
+      graph.db.commit() # No other changes are pending, otherwise the parallel execution would not be possible
+      return graph.execute(*with_params(_RE_PRELIM_NAME.sub(lambda match: table_names.get(match.group(0), match.group(0)), main_sql))).fetchall()
+    finally:
+      for table_name in table_names.values(): graph.execute("""DROP TABLE %s""" % table_name)
+      
+  def execute(self, params = (), parallel = None, entity_format = "entity"):
+    rows = None
+    if   parallel and self.parallel_plan: rows = self._execute_parallel_plan(params, parallel)
+    elif self.stats_count and self.world.graph.has_exact_stats(): rows = self._execute_stats_count()
+    if rows is None: rows = PreparedQuery.execute(self, params)
+    rows = iter(rows)
+    while True:
+      ls = list(itertools.islice(rows, _LOAD_BATCH_SIZE))
+      if not ls: break
+      loaded = self._load_entities(ls, entity_format) # Load entities by batch; also keep them alive until the rows are yielded
+      for l in ls: yield self._convert_row(l, loaded)
       
+  def _execute_stats_count(self):
+    p, o, grouped, selects = self.stats_count
+    stats = self.world.graph.get_stats()
+    if grouped: nbs = { key : nb for ((p2, key), (nb, nb_s, nb_o)) in stats.items() if (p2 == p) and key }
+    else:       nbs = { o : (stats.get((p, o or 0)) or (0,))[0] }
+    return [[nbs[key] if select == "nb" else key if select == "o" else select for select in selects] for key in sorted(nbs)]
+  
+  def execute_parallel(self, paramss, nb_worker = None):
+    # Executes the query for each parameter set, concurrently; returns the list of results, in the same order
+    self.world._nb_sparql_call += 1
+    t0 = time.perf_counter()
+    sqls_params = [(self.sql, self._get_sql_params(params)) for params in paramss]
+    rowss = None
+    if len(sqls_params) > 1: rowss = self.world.graph.execute_parallel(sqls_params, None if nb_worker is True else nb_worker, lambda db: register_python_function(self.world, db))
+    if rowss is None: rowss = [self.world.graph.execute(*sql_params).fetchall() for sql_params in sqls_params]
+    self._add_metrics(len(rowss), sum(len(rows) for rows in rowss), time.perf_counter() - t0)
+    loaded = self._load_entities(list(itertools.chain.from_iterable(rowss)))
+    return [[self._convert_row(l, loaded) for l in rows] for rows in rowss]
+  
+  def execute_many(self, paramss, entity_format = "entity"):
+    # Executes the query for each parameter set; yields (index of the parameter set, result row) pairs.
+    # When possible, the parameter sets are inserted in a temp table, and a single SQL query joins them.
+    if self.batch_sql is None:
+      for i, params in enumerate(paramss):
+        for l in self.execute(params, entity_format = entity_format): yield i, l
+      return
+    
+    self.world._nb_sparql_call += 1
+    t0             = time.perf_counter()
+    paramss        = list(paramss)
+    graph          = self.world.graph
+    nb_column      = self.nb_parameter + len(self.parameter_datatypes)
+    in_transaction = graph.db.in_transaction
+    graph.execute("""CREATE TEMP TABLE _params(i INTEGER PRIMARY KEY, %s)""" % ",".join("p%s" % (j + 1) for j in range(nb_column)))
+    try:
+      graph.db.executemany("""INSERT INTO _params VALUES (%s)""" % ",".join("?" * (nb_column + 1)), ([i, *self._get_sql_params(params)] for i, params in enumerate(paramss)))
+      rows = graph.execute(self.batch_sql).fetchall()
+    finally:
+      graph.execute("""DROP TABLE _params""")
+      if not in_transaction: graph.db.commit() # Only the temp table has been modified
+      
+    if self.batch_one_row and (len(rows) < len(paramss)): # Aggregates on no match, e.g. COUNT() = 0, are missing in the grouped results
+      found = { l[0] for l in rows }
+      rows  = sorted(rows + [(i, *l) for i, params in enumerate(paramss) if not i in found for l in graph.execute(self.sql, self._get_sql_params(params))], key = lambda l: l[0])
+    self._add_metrics(len(paramss), len(rows), time.perf_counter() - t0)
+    
+    for start in range(0, len(rows), _LOAD_BATCH_SIZE):
+      ls     = rows[start : start + _LOAD_BATCH_SIZE]
+      loaded = self._load_entities([l[1:] for l in ls], entity_format)
+      for l in ls: yield l[0], self._convert_row(l[1:], loaded)
+      
+  def profile(self, params = ()):
+    t0     = time.perf_counter()
+    rows   = list(PreparedQuery.execute(self, params))
+    t1     = time.perf_counter()
+    loaded = self._load_entities(rows)
+    t2     = time.perf_counter()
+    for l in rows: self._convert_row(l, loaded)
+    t3     = time.perf_counter()
+    return { "nb_row" : len(rows), "sql_time" : t1 - t0, "entity_loading_time" : t2 - t1, "conversion_time" : t3 - t2, "total_time" : t3 - t0 }
+  
   def _execute_sql(self, params = ()):
     for l in PreparedQuery.execute(self, params):
       l2 = []
@@ -517,16 +826,76 @@ class PreparedModifyQuery(PreparedQuery):
     self.inserts  = inserts
     self.select_param_indexes = select_param_indexes
     
+    # Templates with a fixed predicate and without new blank node are executed as set-based INSERT / DELETE statements;
+    # the others are executed row by row. Not used if the WHERE part creates new entities.
+    def is_bulk(template): return (template[1][0] == "objs") and not any(type == "bn" for type, value in template)
+    if sql and not _RE_NEW_ENTITY.search(sql):
+      self.bulk_deletes = [delete for delete in deletes if is_bulk(delete)]
+      self.bulk_inserts = [insert for insert in inserts if is_bulk(insert)]
+    else:
+      self.bulk_deletes = self.bulk_inserts = []
+    self.row_deletes = [delete for delete in deletes if not delete in self.bulk_deletes]
+    self.row_inserts = [insert for insert in inserts if not insert in self.bulk_inserts]
+    
   def execute(self, params = ()):
-    nb_match = 0
-    if self.sql: resultss = PreparedQuery.execute(self, [params[i] for i in self.select_param_indexes])
-    else:        resultss = [()]
+    if not (self.bulk_deletes or self.bulk_inserts) or not self._can_execute_in_bulk(): return self._execute_by_row(params)
     
-    added_triples = []
-    for results in set(resultss):
-      nb_match += 1
+    self.world._nb_sparql_call += 1
+    graph   = self.world.graph
+    results = "_modify%s" % next(_TEMP_TABLE_IDS)
+    graph.execute("""CREATE TEMP TABLE %s(%s)""" % (results, ",".join("c%s" % i for i in range(len(self.column_types)))))
+    try:
+      graph.execute("""INSERT INTO %s SELECT DISTINCT * FROM (%s)""" % (results, self.sql), self._get_sql_params([params[i] for i in self.select_param_indexes]))
+      nb_match = graph.execute("""SELECT COUNT(*) FROM %s""" % results).fetchone()[0]
+      if not nb_match: return 0
       
-      for delete in self.deletes:
+      if any((template[1][1] in _PYTHON_LEVEL_PREDICATES) or (template[1][1] in self.world._entities) for template in self.bulk_deletes + self.bulk_inserts):
+        loaded = "_loaded%s" % next(_TEMP_TABLE_IDS) # Loaded entities, whose Python attributes must be updated
+        graph.execute("""CREATE TEMP TABLE %s(storid INTEGER PRIMARY KEY)""" % loaded)
+        graph.db.executemany("""INSERT OR IGNORE INTO %s VALUES (?)""" % loaded, ((storid,) for storid in self._get_loaded_storids()))
+      else:
+        loaded = None
+        
+      for delete in self.bulk_deletes: self._bulk_delete(results, delete, params)
+      if self.row_deletes: self._execute_rows(graph.execute("""SELECT * FROM %s""" % results).fetchall(), self.row_deletes, [], params)
+      if loaded:
+        for delete in self.bulk_deletes: self._update_loaded(results, loaded, delete, params, True)
+        
+      if self.bulk_inserts:
+        ontology = self.world._get_update_ontology(self.ontology)
+        for insert in self.bulk_inserts: self._bulk_insert(results, ontology, insert, params)
+      if self.row_inserts: self._execute_rows(graph.execute("""SELECT * FROM %s""" % results).fetchall(), [], self.row_inserts, params)
+      if loaded:
+        for insert in self.bulk_inserts: self._update_loaded(results, loaded, insert, params, False)
+        graph.execute("""DROP TABLE %s""" % loaded)
+        
+    finally:
+      graph.execute("""DROP TABLE %s""" % results)
+    return nb_match
+  
+  def _can_execute_in_bulk(self):
+    # Set-based statements bypass the raw triple methods; not possible if they have been wrapped (e.g. by observe() or RLReasoningSession)
+    if self.bulk_deletes:
+      for x in [self.world, *self.world.ontologies.values()]:
+        if (x.__dict__.get("_del_obj_triple_raw_spo")   != x.graph._del_obj_triple_raw_spo) or \
+           (x.__dict__.get("_del_data_triple_raw_spod") != x.graph._del_data_triple_raw_spod): return False
+    if self.bulk_inserts:
+      ontology = self.world._get_update_ontology(self.ontology)
+      if (ontology.__dict__.get("_add_obj_triple_raw_spo")   != ontology.graph._add_obj_triple_raw_spo) or \
+         (ontology.__dict__.get("_add_data_triple_raw_spod") != ontology.graph._add_data_triple_raw_spod): return False
+    return True
+  
+  def _execute_by_row(self, params):
+    if self.sql: resultss = set(PreparedQuery.execute(self, [params[i] for i in self.select_param_indexes]))
+    else:        resultss = [()]
+    self._execute_rows(resultss, self.deletes, self.inserts, params)
+    return len(resultss)
+  
+  def _execute_rows(self, resultss, deletes, inserts, params):
+    deleted_triples = set()
+    added_triples   = []
+    for results in resultss:
+      for delete in deletes:
         triple = []
         for type, value in delete:
           if   type == "vars":          triple.append(results[value])
@@ -534,10 +903,13 @@ class PreparedModifyQuery(PreparedQuery):
           elif type == "paramdatatype": triple.append(self.world._to_rdf(params[value])[1])
           else:                         triple.append(value)
         #print("DEL", triple)
-        self.world._del_triple_with_update(*triple)
+        triple = tuple(triple)
+        if not triple in deleted_triples: # Several rows may differ only by variables not used in the template
+          deleted_triples.add(triple)
+          self.world._del_triple_with_update(*triple)
         
       bns = {}
-      for insert in self.inserts:
+      for insert in inserts:
         triple = []
         for type, value in insert:
           if   type == "vars":          triple.append(results[value])
@@ -546,12 +918,83 @@ class PreparedModifyQuery(PreparedQuery):
           elif type == "paramdatatype": triple.append(self.world._to_rdf(params[value])[1])
           else:                         triple.append(value)
         #print("ADD", insert, triple)
-        added_triples.append(triple)
+        added_triples.append(tuple(triple))
         
-    if added_triples: self.world._add_triples_with_update(self.ontology, added_triples)
-    return nb_match
+    if added_triples: self.world._add_triples_with_update(self.ontology, list(dict.fromkeys(added_triples)))
+    
+  def _get_template_sql(self, template, params):
+    # Returns the SQL expressions (columns of the results table, or ?N) and the SQL parameters for the template
+    sqls       = []
+    sql_params = []
+    for type, value in template:
+      if   type == "vars":          sqls.append("c%s" % value); continue
+      elif type == "param":         value = self.world._to_rdf(params[value])[0]
+      elif type == "paramdatatype": value = self.world._to_rdf(params[value])[1]
+      sql_params.append(value)
+      sqls.append("?%s" % len(sql_params))
+    if len(template) == 3: # Object
+      sqls.append("NULL")
+    elif (template[3][0] != "vars") and (sql_params[-1] is None): # Entity parameter, no datatype
+      sqls[3] = "NULL"
+      del sql_params[-1]
+    return sqls, sql_params
   
+  def _bulk_delete(self, results, delete, params):
+    (s, p, o, d), sql_params = self._get_template_sql(delete, params)
+    graph = self.world.graph
+    graph.nb_changes += 1
+    if d != "NULL":
+      graph.execute("""DELETE FROM datas WHERE rowid IN (SELECT datas.rowid FROM %s, datas WHERE datas.s=%s AND datas.p=%s AND datas.o=%s AND datas.d=%s)""" % (results, s, p, o, d), sql_params)
+    if (d == "NULL") or d.startswith("c"): # Datatype column is NULL for entities
+      graph.execute("""DELETE FROM objs WHERE rowid IN (SELECT objs.rowid FROM %s, objs WHERE objs.s=%s AND objs.p=%s AND objs.o=%s%s)""" % (results, s, p, o, " AND %s IS NULL" % d if d != "NULL" else ""), sql_params)
+      
+  def _bulk_insert(self, results, ontology, insert, params):
+    (s, p, o, d), sql_params = self._get_template_sql(insert, params)
+    graph = ontology.graph
+    graph.parent.nb_changes += 1
+    nb = 0
+    if d != "NULL":
+      nb += graph.execute("""INSERT OR IGNORE INTO datas SELECT DISTINCT %s,%s,%s,%s,%s FROM %s WHERE %s IS NOT NULL AND %s IS NOT NULL AND %s IS NOT NULL""" % (graph.c, s, p, o, d, results, s, o, d), sql_params).rowcount
+    if (d == "NULL") or d.startswith("c"):
+      nb += graph.execute("""INSERT OR IGNORE INTO objs SELECT DISTINCT %s,%s,%s,%s FROM %s WHERE %s IS NOT NULL AND %s IS NOT NULL%s""" % (graph.c, s, p, o, results, s, o, " AND %s IS NULL" % d if d != "NULL" else ""), sql_params).rowcount
+    graph.parent.nb_added_triples += nb
+    if graph.parent.nb_added_triples > 1000: graph.parent.analyze()
     
+  def _get_loaded_storids(self):
+    for storid in list(self.world._entities.keys()):
+      if isinstance(storid, int): yield storid # Not fusion classes
+    for ontology in self.world.ontologies.values(): yield from ontology._bnodes.keys()
+    
+  def _update_loaded(self, results, loaded, template, params, delete):
+    # Invalidates the cached property values of the loaded subjects, in a batch. For predicates modifying is_a, equivalent_to, etc,
+    # the template is executed again for the rows with a loaded subject, in order to update the Python objects too.
+    p = template[1][1]
+    if p in _PYTHON_LEVEL_PREDICATES:
+      if template[0][0] == "vars":
+        rows = self.world.graph.execute("""SELECT * FROM %s WHERE c%s IN (SELECT storid FROM %s)""" % (results, template[0][1], loaded)).fetchall()
+      else:
+        (s, p, o, d), sql_params = self._get_template_sql(template, params)
+        if not self.world.graph.execute("""SELECT 1 FROM %s WHERE storid=?""" % loaded, sql_params[:1]).fetchone(): return
+        rows = self.world.graph.execute("""SELECT * FROM %s""" % results).fetchall()
+      if delete: self._execute_rows(rows, [template], [], params)
+      else:      self._execute_rows(rows, [], [template], params)
+      
+    else:
+      prop = self.world._entities.get(p)
+      if prop is None: return
+      if template[0][0] == "vars":
+        subjects = self.world.graph.execute("""SELECT DISTINCT c%s FROM %s WHERE c%s IN (SELECT storid FROM %s)""" % (template[0][1], results, template[0][1], loaded))
+      else:
+        (s, p, o, d), sql_params = self._get_template_sql(template, params)
+        subjects = [sql_params[:1]]
+      for (s,) in subjects:
+        if s > 0: sub = self.world._entities.get(s)
+        else:     sub = next((ontology._bnodes[s] for ontology in self.world.ontologies.values() if s in ontology._bnodes), None)
+        if not sub is None:
+          try: delattr(sub, prop.python_name)
+          except: pass
+          
+  
 class Column(object):
   def __init__(self, var, type, binding, name, index):
     self.var         = var
@@ -666,6 +1109,8 @@ class SQLQuery(FuncSupport):
             sql = """VALUES %s""" % ",".join("(%s)" % (",".join(str(value) for value in values)) for values in zip(*[[i[0] for i in var.static] for var in vars]))
           else:
             sql = """SELECT %s FROM %s""" % (",".join("%s.col1_o" % var.in_select.name for var in vars), ",".join(var.in_select.name for var in vars))
+        elif self.conditions: # E.g. property path with both ends bound
+          sql = """SELECT %s WHERE %s""" % (",".join(str(column.binding) for column in self.columns), " AND ".join(str(condition) for condition in self.conditions))
         else:
           sql = """VALUES (%s)""" % (",".join(str(column.binding) for column in self.columns))
         
@@ -791,6 +1236,13 @@ class SQLQuery(FuncSupport):
       triple.consider_s = triple.consider_p = triple.consider_o = True
       
       if p.modifier:
+        path_length_condition = self.get_path_length_condition(triple)
+        if path_length_condition:
+          self.triples.remove(triple)
+          remnant_triples.discard(triple)
+          self.conditions.append(path_length_condition)
+          continue
+        
         if   (s.name != "VAR"): fixed = "s"
         elif (o.name != "VAR"): fixed = "o"
         else:
@@ -851,7 +1303,11 @@ class SQLQuery(FuncSupport):
         if (o.name == "VAR") and (self.parse_var(o) in vars_needing_binding) and self.parse_var(o).nb_table == 0: continue
         triple.to_skip = True
         extra = ""
-        if p.modifier == "+": extra = " WHERE nb>0"
+        nb_condition = _get_nb_condition(p)
+        if nb_condition: extra = " WHERE %s" % nb_condition
+        if (s.name != "VAR") and (o.name != "VAR"): # Both ends bound (and not handled by path_length()); s is the fixed end
+          self.conditions.append("""EXISTS(SELECT 1 FROM %s WHERE o=%s%s)""" % (triple.local_table_type, self._to_sql(o)[0], " AND %s" % nb_condition if nb_condition else ""))
+          continue
         if s.name == "VAR":
           s = self.parse_var(s)
           s.bindings.insert(0, """IN (SELECT s FROM %s%s)""" % (triple.local_table_type, extra))
@@ -859,6 +1315,7 @@ class SQLQuery(FuncSupport):
           o = self.parse_var(o)
           o.bindings.insert(0, """IN (SELECT o FROM %s%s)""" % (triple.local_table_type, extra))
           
+    self.apply_stats()
     conditions = self.conditions
     for triple in self.triples: # Pass 6: create triples tables and conditions
       if   isinstance(triple, Bind):
@@ -885,6 +1342,7 @@ class SQLQuery(FuncSupport):
       if self.name == "main": select_name = ""
       else:                   select_name = "%s_" % (self.name or "")
       table = Table(self, "%sq%s" % (select_name, self.translator.next_table_id), triple.local_table_type)
+      self.translator.table_estimates[table.name] = self.estimate_triple(triple, ())
       if triple.optional:
         table.join = "LEFT JOIN"
         conditions = table.join_conditions
@@ -896,7 +1354,8 @@ class SQLQuery(FuncSupport):
       if triple.consider_p: self.create_conditions(conditions, table, "p", p, triple.likelihood_p)
       if triple.consider_o: self.create_conditions(conditions, table, "o", o, triple.likelihood_o)
       
-      if p.modifier == "+": conditions.append("%s.nb>0"  % table.name)
+      nb_condition = _get_nb_condition(p)
+      if nb_condition: conditions.append("%s.%s" % (table.name, nb_condition))
       
       
     if isinstance(triples, SimpleTripleBlock):
@@ -944,6 +1403,78 @@ class SQLQuery(FuncSupport):
               conditions.append("%s=%s.col%s_o" % (sql, prelim.name, i + 1))
               
               
+  def get_path_length_condition(self, triple):
+    # Both ends of the property path are bound: a bidirectional search stops at the first meet,
+    # while a recursive preliminary select would expand the whole closure from one end
+    s, p, o = triple
+    if triple.optional or (not s.name in ("IRI", "PARAM")) or (not o.name in ("IRI", "PARAM")): return None
+    if   p.modifier == "*":  min_length, max_length = 0, None
+    elif p.modifier == "+":  min_length, max_length = 1, None
+    elif p.modifier == "{}": min_length, max_length = p.min_length, p.max_length
+    else: return None
+    if min_length > 1: return None
+    
+    if   isinstance(p, UnionPropPath): ps = list(p)
+    elif isinstance(p, PropPath):      return None
+    else:                              ps = [p]
+    sql_ps = []
+    for i in ps:
+      if isinstance(i, PropPath) or (not i.name in ("IRI", "PARAM")): return None
+      sql_ps.append("%s%s" % ("-" if (i is not p) and i.inversed else "", self._to_sql(i)[0]))
+    return "path_length(%s, %s, %s, %s, %s) IS NOT NULL" % (self._to_sql(s)[0], self._to_sql(o)[0], min_length, "NULL" if max_length is None else max_length, ", ".join(sql_ps))
+  
+  def estimate_triple(self, triple, fixed_var_names):
+    # Estimated number of matches for the triple, from the quadstore statistics; None if unknown
+    s, p, o = triple
+    if (p.name != "IRI") or p.modifier: return None
+    stats   = self.translator.world.graph.get_stats()
+    s_fixed = (s.name != "VAR") or (s.value in fixed_var_names)
+    o_fixed = (o.name != "VAR") or (o.value in fixed_var_names)
+    if (p.storid == rdf_type) and (o.name == "IRI"):
+      nb = stats.get((rdf_type, o.storid))
+      if nb: return 1.0 if s_fixed else float(nb[0])
+    nb = stats.get((p.storid, 0))
+    if not nb: return None
+    nb, nb_s, nb_o = nb
+    if s_fixed and o_fixed: return 1.0
+    if s_fixed: return nb / nb_s
+    if o_fixed: return nb / nb_o
+    return float(nb)
+  
+  def get_selectivity(self, triple, fixed_var_names):
+    if not self.translator.world.graph.get_stats(): return 1.0
+    estimate = self.estimate_triple(triple, fixed_var_names)
+    if estimate is None: estimate = 3.0 # As in the default statistics given to SQLite
+    return 1.0 / (1.0 + math.log10(1.0 + estimate))
+  
+  def apply_stats(self):
+    # Gives the estimated cardinalities to SQLite, as the likelihood of the object conditions,
+    # and reorders each run of simple triples, most selective first
+    stats = self.translator.world.graph.get_stats()
+    if not stats: return
+    nb_objs = stats.get((0, 0), (0,))[0]
+    if nb_objs:
+      for triple in self.triples:
+        if isinstance(triple, Triple) and (triple[2].name == "IRI"):
+          estimate = self.estimate_triple(triple, ())
+          if not estimate is None: triple.likelihood_o = repr(min(1.0, max(estimate, 1.0) / nb_objs))
+          
+    fixed_var_names = { var.name for var in self.vars.values() if var.bindings }
+    i = 0
+    while i < len(self.triples):
+      j = i
+      while (j < len(self.triples)) and isinstance(self.triples[j], Triple) and (not self.triples[j].optional) and (not self.triples[j][1].modifier): j += 1
+      if j - i > 1:
+        remnants = self.triples[i:j]
+        for k in range(i, j):
+          estimates = [self.estimate_triple(triple, fixed_var_names) for triple in remnants]
+          best = min(range(len(remnants)), key = lambda l: (estimates[l] is None, estimates[l] or 0.0, l))
+          self.triples[k] = triple = remnants.pop(best)
+          fixed_var_names.update(triple.var_names)
+      for triple in self.triples[i : j + 1]:
+        fixed_var_names.update(getattr(triple, "var_names", ()))
+      i = j + 1
+      
   def get_fix_levels(self, vars0, exclude_triple = None):
     vars0_names = { var.name for var in vars0 }
     fix_levels  = defaultdict(float)
@@ -968,13 +1499,13 @@ class SQLQuery(FuncSupport):
         if   isinstance(triple, Triple):
           if   len(triple.var_names) == 1:
             var = self.parse_var(tuple(triple.var_names)[0])
-            fix(var, triple, [], w)
+            fix(var, triple, [], w * self.get_selectivity(triple, ()))
             
           elif len(triple.var_names) == 2:
             if triple.var_names != vars0_names:
               vars = [self.parse_var(var_name) for var_name in triple.var_names]
               for v1, v2 in [(vars[0], vars[1]), (vars[1], vars[0])]:
-                fix(v1, triple, [v2], w)
+                fix(v1, triple, [v2], w * self.get_selectivity(triple, (v2.name,)))
                 
         elif isinstance(triple, Filter):
           pass
@@ -1222,6 +1753,10 @@ class SQLNestedQuery(SQLQuery):
   def __str__(self): return self.sql()
   
 
+def _get_nb_condition(p): # Condition on the path length in recursive preliminary selects
+  if p.modifier == "+": return "nb>0"
+  if (p.modifier == "{}") and p.min_length: return "nb>=%s" % p.min_length
+  
 class SQLRecursivePreliminaryQuery(SQLQuery):
   def __init__(self, name, triple, fixed, fixed_var):
     s, p, o = triple
@@ -1235,6 +1770,12 @@ class SQLRecursivePreliminaryQuery(SQLQuery):
     
     self.need_orig    = not self.fixed_var is None # XXX Optimizable
     self.need_nb      = p.modifier != "*"
+    if   p.modifier == "+": self.rec_nb = "1" # Saturated, so as the recursion ends on cycles
+    elif (p.modifier == "{}") and (p.max_length is None): self.rec_nb = "MIN(rec.nb+1, %s)" % p.min_length
+    else:                   self.rec_nb = "rec.nb+1"
+    if   p.modifier == "?":  self.rec_condition = "AND rec.nb=0 "
+    elif (p.modifier == "{}") and (not p.max_length is None): self.rec_condition = "AND rec.nb<%s " % p.max_length
+    else:                    self.rec_condition = ""
     
     SQLQuery.__init__(self, "%s_%s" % (name, "quads" if self.need_d else "objs"))
     self.recursive    = True
@@ -1278,10 +1819,10 @@ SELECT q.%s%s%s%s FROM %s q, %s rec WHERE %s %sAND q.%s=rec.%s""" % (
   self.non_fixed,
   ", q.d"                 if self.need_d    else "",
   ", rec.%s" % self.fixed if self.need_orig else "",
-  ", rec.nb+1"            if self.need_nb   else "",
+  ", %s" % self.rec_nb    if self.need_nb   else "",
   "quads"                 if self.need_d    else "objs",
   self.name, " AND ".join(p_direct_conditions),
-  "AND rec.nb=0 " if p.modifier == "?" else "",
+  self.rec_condition,
   self.fixed, self.non_fixed)
   
     if p_inversed_conditions:
@@ -1291,10 +1832,10 @@ SELECT q.%s%s%s%s FROM %s q, %s rec WHERE %s %sAND q.%s=rec.%s""" % (
   self.fixed,
   ", q.d"                     if self.need_d    else "",
   ", rec.%s" % self.non_fixed if self.need_orig else "",
-  ", rec.nb+1"                if self.need_nb   else "",
+  ", %s" % self.rec_nb        if self.need_nb   else "",
   "quads"                     if self.need_d    else "objs",
   self.name, " AND ".join(p_inversed_conditions),
-  "AND rec.nb=0 " if p.modifier == "?" else "",
+  self.rec_condition,
   self.non_fixed, self.non_fixed)
 
     
@@ -676,7 +676,18 @@ pg.list("path_element_or_inverse+", "/")
 
 @pg.production("path_element : path_primary path_mod?")
 def f(p):
-  p[0].modifier = p[1] and p[1].value
+  if isinstance(p[1], tuple): # Length bounds
+    min_length, max_length = p[1]
+    if   (min_length, max_length) == (0, 1):    p[0].modifier = "?"
+    elif (min_length, max_length) == (0, None): p[0].modifier = "*"
+    elif (min_length, max_length) == (1, None): p[0].modifier = "+"
+    else:
+      if (not max_length is None) and (max_length < min_length): raise ValueError("Invalid property path length bounds {%s,%s}!" % (min_length, max_length))
+      p[0].modifier   = "{}"
+      p[0].min_length = min_length
+      p[0].max_length = max_length
+  else:
+    p[0].modifier = p[1] and p[1].value
   return p[0]
 
 @pg.production("path_mod : ?")
@@ -684,6 +695,14 @@ def f(p):
 @pg.production("path_mod : *")
 @pg.production("path_mod : +")
 def f(p): return p[0]
+@pg.production("path_mod : { INTEGER }")
+def f(p): return int(p[1].value), int(p[1].value)
+@pg.production("path_mod : { INTEGER , }")
+def f(p): return int(p[1].value), None
+@pg.production("path_mod : { INTEGER , INTEGER }")
+def f(p): return int(p[1].value), int(p[3].value)
+@pg.production("path_mod : { , INTEGER }")
+def f(p): return 0, int(p[2].value)
 pg.optional("path_mod?")
 
 @pg.production("path_primary : iri")
@@ -1074,7 +1093,7 @@ class UnionBlock(Block):
       ss.add(repr(i[0][0]))
       ps.add(repr(i[0][1]))
       os.add(repr(i[0][2]))
-      mods.add(i[0][1].modifier)
+      mods.add((i[0][1].modifier, getattr(i[0][1], "min_length", None), getattr(i[0][1], "max_length", None)))
     if len(mods) > 1: return None
     nb_many = 0
     if len(ss) > 1: nb_many += 1; n = 0
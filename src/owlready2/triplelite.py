@@ -17,7 +17,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys, os, os.path, sqlite3, time, re, multiprocessing
+import sys, os, os.path, sqlite3, time, re, multiprocessing, io, mmap, zlib, json, struct, array
 from collections import defaultdict
 from itertools import chain
 
@@ -36,22 +36,64 @@ def all_combinations(l):
   for a in l[0]: r.extend((a,) + b for b in all_combinations(l[1:]))
   return r
 
+_MAX_SQL_PARAMS = 900 # Below SQLITE_MAX_VARIABLE_NUMBER for old SQLite3
+
+_SNAPSHOT_MAGIC   = b"OWLREADY2-SNAPSHOT\n"
+_SNAPSHOT_VERSION = 1
+
+def _blank_node_keys(triples):
+  """returns a key for each blank node in the given (s,p,o,d) triples (d is None for object triples), that depends on the content
+of the blank node and on the place where it is used, but not on its storid."""
+  content  = defaultdict(list)
+  incoming = defaultdict(list)
+  for s,p,o,d in triples:
+    if s < 0: content[s].append((p,o,d))
+    if (d is None) and (o < 0): incoming[o].append((s,p))
+    
+  def propagate(links, compute):
+    # Iterative post-order traversal, because RDF lists can be very long; cycles are broken arbitrarily
+    r = {}
+    visiting = set()
+    for root in chain(content, incoming):
+      stack = [(root, False)]
+      while stack:
+        bn, expanded = stack.pop()
+        if bn in r: continue
+        if expanded:
+          r[bn] = compute(bn, r)
+          continue
+        if bn in visiting: continue
+        visiting.add(bn)
+        stack.append((bn, True))
+        for other in links(bn):
+          if not other in r: stack.append((other, False))
+    return r
+  
+  hashes = propagate(lambda bn: [o for p,o,d in content.get(bn, ()) if (d is None) and (o < 0)],
+                     lambda bn, r: hash(tuple(sorted(repr((p, r.get(o, 0) if (d is None) and (o < 0) else o, d)) for p,o,d in content.get(bn, ())))))
+  return propagate(lambda bn: [s for s,p in incoming.get(bn, ()) if s < 0],
+                   lambda bn, r: hash((hashes[bn], tuple(sorted(repr((r.get(s, 0) if s < 0 else s, p)) for s,p in incoming.get(bn, ()))))))
+
 
 class Graph(BaseMainGraph):
   _SUPPORT_CLONING = True
-  def __init__(self, filename, clone = None, exclusive = True, sqlite_tmp_dir = "", world = None, profiling = False, read_only = False):
+  def __init__(self, filename, clone = None, exclusive = True, sqlite_tmp_dir = "", world = None, profiling = False, read_only = False, snapshot = None):
     exists        = os.path.exists(filename) and os.path.getsize(filename) # BEFORE creating db!
     initialize_db = (clone is None) and ((filename == ":memory:") or (not exists))
 
+    if snapshot and not initialize_db: raise ValueError("Cannot load a snapshot in an existing quadstore!")
+
     if clone and (filename != ":memory:"):
       if exists: raise ValueError("Cannot save existent quadstore in '%s': File already exists! Use a new filename for saving quadstore or, for opening an already existent quadstore, do not create any triple before calling set_backend() (including creating an empty ontology or loading a module that does so)." % filename)
 
     if sqlite_tmp_dir: os.environ["SQLITE_TMPDIR"] = sqlite_tmp_dir
 
     if filename == ":memory:":
+      self.filename = None
       filename = str(id(self))
       extra_options = "&mode=memory"
     else:
+      self.filename = filename
       extra_options = ""
 
     self.read_only = read_only
@@ -161,6 +203,10 @@ class Graph(BaseMainGraph):
     self.world             = world
     self.c                 = None
     self.nb_added_triples  = 0
+    self.nb_changes        = 0 # Modifications of the triples by this connection, see has_exact_stats()
+    self._stats            = None
+    self._stats_version    = None
+    self._read_only_dbs    = []
 
     if read_only:
       self.lock = multiprocessing.RLock()
@@ -175,7 +221,7 @@ class Graph(BaseMainGraph):
       self.prop_fts         = set()
 
       self.execute("""CREATE TABLE store (version INTEGER, current_blank INTEGER, current_resource INTEGER)""")
-      self.execute("""INSERT INTO store VALUES (10, 0, 300)""")
+      self.execute("""INSERT INTO store VALUES (11, 0, 300)""")
       self.execute("""CREATE TABLE objs (c INTEGER, s INTEGER, p INTEGER, o INTEGER)""")
       self.execute("""CREATE TABLE datas (c INTEGER, s INTEGER, p INTEGER, o BLOB, d INTEGER)""")
       self.execute("""CREATE VIEW quads AS SELECT c,s,p,o,NULL AS d FROM objs UNION ALL SELECT c,s,p,o,d FROM datas""")
@@ -187,21 +233,16 @@ class Graph(BaseMainGraph):
         self.execute("""CREATE TABLE resources (storid INTEGER PRIMARY KEY, iri TEXT) WITHOUT ROWID""")
       except sqlite3.OperationalError: # Old SQLite3 does not support WITHOUT ROWID -- here it is just an optimization
         self.execute("""CREATE TABLE resources (storid INTEGER PRIMARY KEY, iri TEXT)""")
-      self.db.executemany("INSERT INTO resources VALUES (?,?)", _universal_abbrev_2_iri.items())
-      self.execute("""CREATE UNIQUE INDEX index_resources_iri ON resources(iri)""")
-
-      self.execute("""CREATE INDEX index_objs_sp ON objs(s,p)""")
-      self.execute("""CREATE UNIQUE INDEX index_objs_op ON objs(o,p,c,s)""") # c is for onto.classes(), etc
-      self.execute("""CREATE INDEX index_objs_c ON objs(c)""")
-
-      self.execute("""CREATE INDEX index_datas_sp ON datas(s,p)""")
-      self.execute("""CREATE UNIQUE INDEX index_datas_op ON datas(o,p,c,d,s)""")
-      self.execute("""CREATE INDEX index_datas_c ON datas(c)""")
-      self.indexed = True
-
       self.execute("""CREATE TABLE last_numbered_iri(prefix TEXT, i INTEGER)""")
       self.execute("""CREATE INDEX index_last_numbered_iri ON last_numbered_iri(prefix)""")
+      self.execute("""CREATE TABLE stats (c INTEGER, p INTEGER, o INTEGER, nb INTEGER, nb_s INTEGER, nb_o INTEGER, PRIMARY KEY (c,p,o)) WITHOUT ROWID""")
 
+      if snapshot: # Indexes are created after the bulk insertion, for speed
+        self._load_snapshot(snapshot)
+      else:
+        self.db.executemany("INSERT INTO resources VALUES (?,?)", _universal_abbrev_2_iri.items())
+        self._create_indexes()
+        
       self.analyze()
       self.db.commit()
 
@@ -419,6 +460,12 @@ class Graph(BaseMainGraph):
         self.execute("""UPDATE store SET version=10""")
         self.db.commit()
         version += 1
+      if version == 10:
+        print("* Owlready2 * Converting quadstore to internal format 11...", file = sys.stderr)
+        self.execute("""CREATE TABLE stats (c INTEGER, p INTEGER, o INTEGER, nb INTEGER, nb_s INTEGER, nb_o INTEGER, PRIMARY KEY (c,p,o)) WITHOUT ROWID""")
+        self.execute("""UPDATE store SET version=11""")
+        self.db.commit()
+        version += 1
 
       self.prop_fts = { storid for (storid,) in self.execute("""SELECT storid FROM prop_fts;""") }
 
@@ -427,6 +474,18 @@ class Graph(BaseMainGraph):
     self.current_changes = self.db.total_changes
     self.select_abbreviate_method()
 
+  def _create_indexes(self):
+    self.execute("""CREATE UNIQUE INDEX index_resources_iri ON resources(iri)""")
+
+    self.execute("""CREATE INDEX index_objs_sp ON objs(s,p)""")
+    self.execute("""CREATE UNIQUE INDEX index_objs_op ON objs(o,p,c,s)""") # c is for onto.classes(), etc
+    self.execute("""CREATE INDEX index_objs_c ON objs(c)""")
+
+    self.execute("""CREATE INDEX index_datas_sp ON datas(s,p)""")
+    self.execute("""CREATE UNIQUE INDEX index_datas_op ON datas(o,p,c,d,s)""")
+    self.execute("""CREATE INDEX index_datas_c ON datas(c)""")
+    self.indexed = True
+
   def analyze(self):
     self.nb_added_triples = 0
 
@@ -465,10 +524,62 @@ class Graph(BaseMainGraph):
 """ % (nb_objs, nb_objs, nb_datas, nb_datas, nb_iris, nb_iris))
     self.execute("""ANALYZE sqlite_schema""")
 
+  def update_stats(self):
+    # Per-predicate cardinalities (o=0), per-class cardinalities for rdf:type, and number of object triples (p=o=0);
+    # used by the SPARQL engine for ordering joins. Not computed at load time, see World.update_stats() and World.enable_auto_stats()
+    self.execute("""DELETE FROM stats""")
+    self.execute("""INSERT INTO stats SELECT c,0,0,COUNT(),0,0 FROM objs GROUP BY c""")
+    self.execute("""INSERT INTO stats SELECT c,p,0,COUNT(),COUNT(DISTINCT s),COUNT(DISTINCT o) FROM quads GROUP BY c,p""")
+    self.execute("""INSERT INTO stats SELECT c,p,o,COUNT(),COUNT(),1 FROM objs WHERE p=%s GROUP BY c,o""" % rdf_type)
+    self._stats         = None
+    self._stats_version = self._get_data_version()
+    
+  def _get_data_version(self):
+    # Not db.total_changes, which also counts the changes in TEMP tables (e.g. for read-only queries)
+    return self.nb_changes, self.execute("""PRAGMA data_version""").fetchone()[0]
+  
+  def has_exact_stats(self):
+    # True if the quadstore has not been modified (by this connection or by another one) since the last update of all statistics
+    return (not self._stats_version is None) and (self._stats_version == self._get_data_version())
+
+  def get_stats(self):
+    if self._stats is None:
+      try:
+        self._stats = { (p, o) : (nb, nb_s, nb_o) for (p, o, nb, nb_s, nb_o) in self.execute("""SELECT p,o,SUM(nb),SUM(nb_s),SUM(nb_o) FROM stats GROUP BY p,o""") }
+      except sqlite3.OperationalError: # Read-only quadstore in an older format
+        self._stats = {}
+    return self._stats
+
   def set_indexed(self, indexed): pass
 
   def close(self):
     self.db.close()
+    for db in self._read_only_dbs: db.close()
+    self._read_only_dbs = []
+
+  def execute_parallel(self, sqls_params, nb_worker = None, prepare_db = None):
+    # Executes independent SQL queries concurrently, in threads with separate query-only connections (SQLite releases the GIL).
+    # Returns the list of rows of each query, or None if the connections cannot see the quadstore
+    # (in-memory quadstore, changes not yet saved, or database locked by the exclusive mode)
+    if (not self.filename) or self.db.in_transaction: return None
+    import concurrent.futures
+    
+    def run(sql_params):
+      if self._read_only_dbs: db = self._read_only_dbs.pop()
+      else:
+        db = sqlite3.connect(self.filename, check_same_thread = False, timeout = 0)
+        db.execute("""PRAGMA cache_size = -200000""")
+        db.execute("""PRAGMA mmap_size = 30000000000""")
+        if prepare_db: prepare_db(db) # May create temp tables, hence query_only is set afterward
+        db.execute("""PRAGMA query_only = 1""")
+      try:     return db.execute(*sql_params).fetchall()
+      finally: self._read_only_dbs.append(db)
+      
+    try:
+      with concurrent.futures.ThreadPoolExecutor(min(nb_worker or os.cpu_count() or 1, len(sqls_params))) as executor:
+        return list(executor.map(run, sqls_params))
+    except sqlite3.OperationalError:
+      return None
 
   def acquire_write_lock(self):
     if not self.db.in_transaction: self.execute("BEGIN IMMEDIATE")
@@ -709,6 +820,61 @@ class Graph(BaseMainGraph):
   def _get_obj_triples_sp_co(self, s, p):
     return self.execute("SELECT c,o FROM objs WHERE s=? AND p=?", (s, p)).fetchall()
 
+  # Optimized queries for multiple subjects/predicates
+  def _get_obj_triples_sp_cspo(self, s, p):
+    if not isinstance(s, list): s = [s]
+    if not isinstance(p, list): p = [p]
+    ps = ",".join(str(int(x)) for x in p)
+    r  = []
+    for i in range(0, len(s), _MAX_SQL_PARAMS):
+      ss = s[i : i + _MAX_SQL_PARAMS]
+      r.extend(self.execute("SELECT c,s,p,o FROM objs WHERE s IN (%s) AND p IN (%s)" % (",".join("?" for x in ss), ps), ss).fetchall())
+    return r
+
+  def _get_obj_triples_po_cspo(self, p, o):
+    if not isinstance(o, list): o = [o]
+    if not isinstance(p, list): p = [p]
+    ps = ",".join(str(int(x)) for x in p)
+    r  = []
+    for i in range(0, len(o), _MAX_SQL_PARAMS):
+      oo = o[i : i + _MAX_SQL_PARAMS]
+      r.extend(self.execute("SELECT c,s,p,o FROM objs WHERE o IN (%s) AND p IN (%s)" % (",".join("?" for x in oo), ps), oo).fetchall())
+    return r
+
+  def _unabbreviate_storids(self, storids):
+    storids = list(storids)
+    r = {}
+    for i in range(0, len(storids), _MAX_SQL_PARAMS):
+      ss = storids[i : i + _MAX_SQL_PARAMS]
+      r.update(self.execute("SELECT storid, iri FROM resources WHERE storid IN (%s)" % ",".join("?" for x in ss), ss).fetchall())
+    return r
+
+  def _load_new_obj_triples(self, triples):
+    # triples are (s, p, o, inverse p or 0); keeps in temp table new_objs those not already asserted, in either direction
+    self.execute("""CREATE TEMP TABLE IF NOT EXISTS new_objs (s INTEGER, p INTEGER, o INTEGER, ip INTEGER)""")
+    self.execute("""DELETE FROM new_objs""")
+    self.db.executemany("""INSERT INTO new_objs VALUES (?,?,?,?)""", triples)
+    self.execute("""DELETE FROM new_objs WHERE EXISTS (SELECT 1 FROM objs q WHERE q.s=new_objs.s AND q.p=new_objs.p AND q.o=new_objs.o) OR ((new_objs.ip!=0) AND EXISTS (SELECT 1 FROM objs q WHERE q.s=new_objs.o AND q.p=new_objs.ip AND q.o=new_objs.s))""")
+
+  def _new_obj_triples(self, triples):
+    self._load_new_obj_triples(triples)
+    r = self.execute("""SELECT DISTINCT s,p,o,ip FROM new_objs""").fetchall()
+    self.execute("""DELETE FROM new_objs""")
+    return r
+
+  def _load_new_data_triples(self, triples):
+    # triples are (s, p, o, d); keeps in temp table new_datas those whose value is not already asserted
+    self.execute("""CREATE TEMP TABLE IF NOT EXISTS new_datas (s INTEGER, p INTEGER, o BLOB, d INTEGER)""")
+    self.execute("""DELETE FROM new_datas""")
+    self.db.executemany("""INSERT INTO new_datas VALUES (?,?,?,?)""", triples)
+    self.execute("""DELETE FROM new_datas WHERE EXISTS (SELECT 1 FROM datas q WHERE q.s=new_datas.s AND q.p=new_datas.p AND q.o=new_datas.o)""")
+
+  def _new_data_triples(self, triples):
+    self._load_new_data_triples(triples)
+    r = self.execute("""SELECT DISTINCT s,p,o,d FROM new_datas""").fetchall()
+    self.execute("""DELETE FROM new_datas""")
+    return r
+
   def _get_triples_s_p(self, s):
     for (x,) in self.execute("SELECT DISTINCT p FROM quads WHERE s=?", (s,)).fetchall(): yield x
 
@@ -797,6 +963,7 @@ class Graph(BaseMainGraph):
     return not cur.fetchone() is None
 
   def _del_obj_triple_raw_spo(self, s, p, o):
+    self.nb_changes += 1
     if s is None:
       if p is None:
         if o is None: self.execute("DELETE FROM objs")
@@ -813,6 +980,7 @@ class Graph(BaseMainGraph):
         else:         self.execute("DELETE FROM objs INDEXED BY index_objs_sp WHERE s=? AND p=? AND o=?", (s, p, o,))
 
   def _del_data_triple_raw_spod(self, s, p, o, d):
+    self.nb_changes += 1
     if s is None:
       if p is None:
         if o is None:   self.execute("DELETE FROM datas")
@@ -887,6 +1055,98 @@ AS (  SELECT s FROM objs WHERE p=? AND o=?
 UNION SELECT objs.s FROM objs, transit WHERE objs.p=? AND objs.o=transit.x)
 SELECT x FROM transit""", (p, o, p)).fetchall(): yield x
 
+  def _get_obj_triples_transitive_sp_indirect_many(self, ss, predicates_inverses):
+    # Same as _get_obj_triples_transitive_sp_indirect() for all the subjects in ss, with a recursive query per chunk of subjects.
+    # Returns (subject, object) pairs
+    ps  = ",".join(str(int(p)) for p, i in predicates_inverses)
+    ips = ",".join(str(int(i)) for p, i in predicates_inverses if i)
+    r   = []
+    for i in range(0, len(ss), _MAX_SQL_PARAMS):
+      sss    = ss[i : i + _MAX_SQL_PARAMS]
+      params = ",".join("?" for x in sss)
+      if ips:
+        r.extend(self.execute("""
+WITH RECURSIVE transit(s, o)
+AS (  SELECT s, o FROM objs WHERE s IN (%s) AND p IN (%s)
+UNION SELECT o, s FROM objs WHERE o IN (%s) AND p IN (%s)
+UNION SELECT transit.s, objs.o FROM objs, transit WHERE objs.s=transit.o AND objs.p IN (%s)
+UNION SELECT transit.s, objs.s FROM objs, transit WHERE objs.o=transit.o AND objs.p IN (%s))
+SELECT s, o FROM transit""" % (params, ps, params, ips, ps, ips), sss + sss).fetchall())
+      else:
+        r.extend(self.execute("""
+WITH RECURSIVE transit(s, o)
+AS (  SELECT s, o FROM objs WHERE s IN (%s) AND p IN (%s)
+UNION SELECT transit.s, objs.o FROM objs, transit WHERE objs.s=transit.o AND objs.p IN (%s))
+SELECT s, o FROM transit""" % (params, ps, ps), sss).fetchall())
+    return r
+
+  def _get_obj_shortest_path(self, s, o, ps, inverse_ps = (), min_length = 0, max_length = None, db = None):
+    # Bidirectional breadth-first search from s and from o, along the ps relations (and the inverse_ps relations, backward).
+    # Returns the storids of a shortest path from s to o with min_length (0 or 1) to max_length steps, or None.
+    execute = (db or self.db).execute
+    ps         = ",".join(str(p) for p in ps)
+    inverse_ps = ",".join(str(p) for p in inverse_ps)
+    def step(frontier, forward):
+      frontier = ",".join(str(x) for x in frontier)
+      for (ps2, a, b) in ((ps, "s", "o"), (inverse_ps, "o", "s")):
+        if not ps2: continue
+        if not forward: a, b = b, a
+        yield from execute("""SELECT %s, %s FROM objs WHERE %s IN (%s) AND p IN (%s)""" % (a, b, a, frontier, ps2))
+        
+    if (s == o) and (min_length == 0): return [s]
+    visiteds  = [{ s : (None, 0) }, { o : (None, 0) }] # node => (previous node on the path, distance)
+    frontiers = [[s], [o]]
+    depths    = [0, 0]
+    while frontiers[0] and frontiers[1] and ((max_length is None) or (depths[0] + depths[1] < max_length)):
+      i = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1 # Expands the smallest frontier
+      visited, other_visited = visiteds[i], visiteds[1 - i]
+      depths[i] += 1
+      frontier = []
+      best = None
+      for x, y in step(frontiers[i], i == 0):
+        if (y in other_visited) and ((best is None) or (other_visited[y][1] < other_visited[best[1]][1])): best = (x, y) # Meet
+        if not y in visited:
+          visited[y] = (x, depths[i])
+          frontier.append(y)
+      if best:
+        x, y = best
+        half  = [y, x]
+        while visited[half[-1]][0] is not None: half.append(visited[half[-1]][0])
+        half.reverse()
+        while other_visited[half[-1]][0] is not None: half.append(other_visited[half[-1]][0])
+        return half if i == 0 else half[::-1]
+      frontiers[i] = frontier
+    return None
+    
+  def _get_list_od(self, bnode):
+    # Correlated subqueries are used rather than joins with the recursive table, because SQLite may build a Bloom filter
+    # (i.e. scan the whole table) at each recursive step
+    return [(o, None) if not o is None else (data_o, d) for o, data_o, d in self.execute("""
+WITH RECURSIVE cells(i, s)
+AS (      SELECT 0, ?
+UNION ALL SELECT i+1, (SELECT o FROM objs WHERE s=cells.s AND p=?) FROM cells WHERE s!=?)
+SELECT (SELECT o FROM objs  WHERE s=cells.s AND p=?),
+       (SELECT o FROM datas WHERE s=cells.s AND p=?),
+       (SELECT d FROM datas WHERE s=cells.s AND p=?)
+FROM cells WHERE s!=? ORDER BY i""", (bnode, rdf_rest, rdf_nil, rdf_first, rdf_first, rdf_first, rdf_nil)).fetchall()]
+
+  def _get_bnode_subtree(self, bnode): # Return { bnode : [(p, o, d)] } for bnode and all the blank nodes reachable from it, in a single query
+    try:
+      rows = self.execute("""
+WITH RECURSIVE bnodes(s)
+AS (  SELECT ?
+UNION SELECT children.value FROM bnodes, json_each((SELECT json_group_array(o) FROM objs WHERE s=bnodes.s AND +o<0)) AS children)
+          SELECT s,p,o,NULL FROM objs  WHERE s IN bnodes
+UNION ALL SELECT s,p,o,d    FROM datas WHERE s IN bnodes""", (bnode,)).fetchall()
+    except sqlite3.OperationalError: # SQLite without JSON support
+      return BaseMainGraph._get_bnode_subtree(self, bnode)
+    subtree = {}
+    for s, p, o, d in rows:
+      l = subtree.get(s)
+      if l is None: l = subtree[s] = []
+      l.append((p, o, d))
+    return subtree
+
 # Slower than Python implementation
 #  def _get_obj_triples_transitive_sym2(self, s, p):
 #    r = { s }
@@ -978,6 +1238,7 @@ SELECT c, o FROM objs q1 WHERE s=? AND o < 0 AND (SELECT COUNT() FROM objs q2 WH
       destroyer(storid)
 
 
+    self.nb_changes += 1
     for storid in destroyed_storids:
       if undoer_objs is not None:
         undoer_objs .extend(self.execute("SELECT c,s,p,o FROM objs WHERE s=? OR o=?", (storid, storid)))
@@ -1029,6 +1290,184 @@ SELECT c, o FROM objs q1 WHERE s=? AND o < 0 AND (SELECT COUNT() FROM objs q2 WH
 
     return cursor
 
+  def _iter_ntriples(self, quads = False, c = None):
+    # Yield the N-Triples (or N-Quads) lines, formatted inside SQLite by joining with the resources table.
+    # Float literals are formatted in Python, because SQLite formats them differently.
+    if c: where = "q.c=%s AND " % c
+    else: where = ""
+    if quads: graph = "'<' || (SELECT iri FROM ontologies WHERE ontologies.c=q.c) || '> ' || "
+    else:     graph = ""
+    s = "CASE WHEN q.s < 0 THEN '_:' || (-q.s) ELSE '<' || (SELECT iri FROM resources WHERE storid=q.s) || '>' END"
+    p = "'<' || (SELECT iri FROM resources WHERE storid=q.p) || '>'"
+    d = "CASE WHEN typeof(q.d) = 'text' AND substr(q.d, 1, 1) = '@' THEN q.d WHEN q.d = 0 THEN '' ELSE '^^<' || (SELECT iri FROM resources WHERE storid=q.d) || '>' END"
+    
+    cursor = self.db.cursor() # Use a new cursor => can iterate without loading all data in a big list, while still being able to query the default cursor
+    cursor.execute("""SELECT %s%s || ' ' || %s || ' ' || CASE WHEN q.o < 0 THEN '_:' || (-q.o) ELSE '<' || (SELECT iri FROM resources WHERE storid=q.o) || '>' END || ' .' FROM objs q %s""" % (graph, s, p, where and "WHERE %s" % where[:-5]))
+    while True:
+      rows = cursor.fetchmany(50000)
+      if not rows: break
+      yield [line for (line,) in rows]
+      
+    # For floats, the line is returned in 3 parts: the beginning, the value, and the end
+    cursor.execute("""SELECT %s%s || ' ' || %s || ' "' || CASE WHEN typeof(q.o) = 'real' THEN '' ELSE CASE WHEN typeof(q.o) = 'text' THEN replace(replace(replace(q.o, '\\', '\\\\'), '"', '\\"'), char(10), '\\n') ELSE q.o END || '"' || %s || ' .' END, CASE WHEN typeof(q.o) = 'real' THEN q.o END, CASE WHEN typeof(q.o) = 'real' THEN '"' || %s || ' .' END FROM datas q %s""" % (graph, s, p, d, d, where and "WHERE %s" % where[:-5]))
+    while True:
+      rows = cursor.fetchmany(50000)
+      if not rows: break
+      yield [line if o is None else "%s%s%s" % (line, o, tail) for (line, o, tail) in rows]
+    
+  def save_snapshot(self, f, compress = True):
+    # Snapshot format: magic string, columns, JSON header, header length (8 bytes).
+    # Each column is an array of 64-bit integers or floats, or concatenated UTF-8 strings, optionally compressed with zlib.
+    # Uncompressed columns are 8-byte aligned, so as they can be used directly from a memory-mapped file.
+    columns = {}
+    cursor  = self.db.cursor()
+    def fetch(sql):
+      cursor.execute(sql)
+      while True:
+        rows = cursor.fetchmany(50000)
+        if not rows: break
+        yield rows
+        
+    def int_columns(names, sql):
+      arrays = [array.array("q") for name in names]
+      for rows in fetch(sql):
+        for a, values in zip(arrays, zip(*rows)): a.extend(values)
+      columns.update(zip(names, arrays))
+      
+    int_columns(["objs_c", "objs_s", "objs_p", "objs_o"], "SELECT c,s,p,o FROM objs")
+    int_columns(["datas_c", "datas_s", "datas_p"], "SELECT c,s,p FROM datas")
+    
+    storids = array.array("q")
+    iris    = []
+    for rows in fetch("SELECT storid, iri FROM resources"):
+      for storid, iri in rows:
+        storids.append(storid)
+        iris.append(iri)
+    columns["resources_storid"] = storids
+    columns["resources_iri"]    = "\n".join(iris).encode("utf8") # IRIs cannot contain newlines
+    del iris
+    
+    # Data values are split by type; language tags are stored as negative datatypes
+    langs     = {}
+    datas_d   = array.array("q")
+    kinds     = array.array("b")
+    ints      = array.array("q")
+    floats    = array.array("d")
+    str_sizes = array.array("q")
+    strs      = []
+    for rows in fetch("SELECT o,d FROM datas"):
+      for o, d in rows:
+        if d.__class__ is str:
+          lang = langs.get(d)
+          if lang is None: lang = langs[d] = -1 - len(langs)
+          d = lang
+        datas_d.append(d or 0)
+        if   o.__class__ is int:   kinds.append(0); ints  .append(o)
+        elif o.__class__ is float: kinds.append(1); floats.append(o)
+        else:
+          if o.__class__ is str: kinds.append(2); o = o.encode("utf8")
+          else:                  kinds.append(3)
+          str_sizes.append(len(o))
+          strs.append(o)
+    columns["datas_d"]        = datas_d
+    columns["datas_kind"]     = kinds
+    columns["datas_int"]      = ints
+    columns["datas_float"]    = floats
+    columns["datas_str_size"] = str_sizes
+    columns["datas_str"]      = b"".join(strs)
+    del strs
+    
+    header = {
+      "version"           : _SNAPSHOT_VERSION,
+      "byteorder"         : sys.byteorder,
+      "compress"          : bool(compress),
+      "columns"           : {},
+      "current_blank"     : self.execute("SELECT current_blank FROM store").fetchone()[0],
+      "langs"             : list(langs),
+      "ontologies"        : self.execute("SELECT c, iri, last_update FROM ontologies").fetchall(),
+      "ontology_alias"    : self.execute("SELECT iri, alias FROM ontology_alias").fetchall(),
+      "last_numbered_iri" : self.execute("SELECT prefix, i FROM last_numbered_iri").fetchall(),
+      "prop_fts"          : sorted(self.prop_fts),
+    }
+    
+    f.write(_SNAPSHOT_MAGIC)
+    offset = len(_SNAPSHOT_MAGIC)
+    for name, column in columns.items():
+      if isinstance(column, array.array): typecode = column.typecode; column = column.tobytes()
+      else:                               typecode = "B"
+      if compress: column = zlib.compress(column, 1)
+      padding = -offset % 8
+      if padding: f.write(b"\0" * padding); offset += padding
+      f.write(column)
+      header["columns"][name] = [offset, len(column), typecode]
+      offset += len(column)
+      
+    header = json.dumps(header).encode("utf8")
+    f.write(header)
+    f.write(struct.pack("<Q", len(header)))
+    
+  def _load_snapshot(self, snapshot):
+    if isinstance(snapshot, str):
+      if snapshot.endswith(".gz"):
+        import gzip
+        f = gzip.open(snapshot, "rb")
+      else:
+        f = open(snapshot, "rb")
+    else:
+      f = snapshot
+    if isinstance(f, io.BufferedReader): content = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    else:                                content = f.read()
+    if f is not snapshot: f.close()
+    
+    content = memoryview(content)
+    if bytes(content[:len(_SNAPSHOT_MAGIC)]) != _SNAPSHOT_MAGIC: raise ValueError("Not an Owlready snapshot!")
+    header_size = struct.unpack("<Q", content[-8:])[0]
+    header = json.loads(bytes(content[-8 - header_size : -8]).decode("utf8"))
+    if header["version"] != _SNAPSHOT_VERSION: raise ValueError("Unsupported Owlready snapshot version %s!" % header["version"])
+    
+    def column(name):
+      offset, size, typecode = header["columns"][name]
+      data = content[offset : offset + size]
+      if header["compress"]: data = memoryview(zlib.decompress(data))
+      if typecode == "B": return data
+      if header["byteorder"] == sys.byteorder: return data.cast(typecode)
+      data = array.array(typecode, data)
+      data.byteswap()
+      return data
+    
+    if owlready2.namespace._LOG_LEVEL: print("* OwlReady2 * Loading snapshot...", file = sys.stderr)
+    self.nb_changes += 1
+    self.execute("""UPDATE store SET current_blank=?""", (header["current_blank"],))
+    self.db.executemany("""INSERT INTO ontologies VALUES (?,?,?)""", header["ontologies"])
+    self.db.executemany("""INSERT INTO ontology_alias VALUES (?,?)""", header["ontology_alias"])
+    self.db.executemany("""INSERT INTO last_numbered_iri VALUES (?,?)""", header["last_numbered_iri"])
+    
+    self.db.executemany("""INSERT INTO resources VALUES (?,?)""", zip(column("resources_storid"), bytes(column("resources_iri")).decode("utf8").split("\n")))
+    self.db.executemany("""INSERT INTO objs VALUES (?,?,?,?)""", zip(column("objs_c"), column("objs_s"), column("objs_p"), column("objs_o")))
+    
+    langs     = header["langs"]
+    ints      = iter(column("datas_int"))
+    floats    = iter(column("datas_float"))
+    str_sizes = column("datas_str_size")
+    strs      = column("datas_str")
+    def values():
+      i = j = 0
+      for kind in column("datas_kind"):
+        if   kind == 0: yield next(ints)
+        elif kind == 1: yield next(floats)
+        else:
+          size = str_sizes[j]
+          o = bytes(strs[i : i + size])
+          i += size
+          j += 1
+          yield o.decode("utf8") if kind == 2 else o
+    ds = [langs[-1 - d] if d < 0 else d for d in column("datas_d")]
+    self.db.executemany("""INSERT INTO datas VALUES (?,?,?,?,?)""", zip(column("datas_c"), column("datas_s"), column("datas_p"), values(), ds))
+    
+    self._create_indexes()
+    for prop_storid in header["prop_fts"]: self.enable_full_text_search(prop_storid)
+    self.db.commit()
+    
   def get_fts_prop_storid(self): return self.prop_fts
 
 #   def enable_full_text_search(self, prop_storid):
@@ -1098,14 +1537,25 @@ class SubGraph(BaseSubGraph):
 
     self.parent.onto_2_subgraph[onto] = self
 
-  def create_parse_func(self, filename = None, delete_existing_triples = True, datatype_attr = "http://www.w3.org/1999/02/22-rdf-syntax-ns#datatype"):
+  def create_parse_func(self, filename = None, delete_existing_triples = True, datatype_attr = "http://www.w3.org/1999/02/22-rdf-syntax-ns#datatype", incremental = False):
     objs         = []
     datas        = []
     new_abbrevs  = []
 
     cur = self.db.cursor()
 
-    if delete_existing_triples:
+    if incremental: # Parse in staging tables, and then apply only the differences with the existing triples
+      cur.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_objs (s INTEGER, p INTEGER, o INTEGER)""")
+      cur.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_datas (s INTEGER, p INTEGER, o BLOB, d INTEGER)""")
+      cur.execute("""DELETE FROM staging_objs""")
+      cur.execute("""DELETE FROM staging_datas""")
+      insert_objs_sql  = "INSERT INTO staging_objs VALUES (?,?,?)"
+      insert_datas_sql = "INSERT INTO staging_datas VALUES (?,?,?,?)"
+    else:
+      insert_objs_sql  = "INSERT OR IGNORE INTO objs VALUES (%s,?,?,?)" % self.c
+      insert_datas_sql = "INSERT OR IGNORE INTO datas VALUES (%s,?,?,?,?)" % self.c
+      
+    if delete_existing_triples and not incremental:
       cur.execute("DELETE FROM objs WHERE c=?", (self.c,))
       cur.execute("DELETE FROM datas WHERE c=?", (self.c,))
 
@@ -1131,14 +1581,14 @@ class SubGraph(BaseSubGraph):
       nonlocal objs, new_abbrevs
       if owlready2.namespace._LOG_LEVEL: print("* OwlReady2 * Importing %s object triples from ontology %s ..." % (len(objs), self.onto.base_iri), file = sys.stderr)
       cur.executemany("INSERT INTO resources VALUES (?,?)", new_abbrevs)
-      cur.executemany("INSERT OR IGNORE INTO objs VALUES (%s,?,?,?)" % self.c, objs)
+      cur.executemany(insert_objs_sql, objs)
       objs        .clear()
       new_abbrevs .clear()
 
     def insert_datas():
       nonlocal datas, new_abbrevs
       if owlready2.namespace._LOG_LEVEL: print("* OwlReady2 * Importing %s data triples from ontology %s ..." % (len(datas), self.onto.base_iri), file = sys.stderr)
-      cur.executemany("INSERT OR IGNORE INTO datas VALUES (%s,?,?,?,?)" % self.c, datas)
+      cur.executemany(insert_datas_sql, datas)
       datas.clear()
 
     def on_prepare_obj(s, p, o):
@@ -1158,8 +1608,10 @@ class SubGraph(BaseSubGraph):
       if filename: date = os.path.getmtime(filename)
       else:        date = time.time()
 
+      self.parent.nb_changes += 1
       insert_objs()
       insert_datas()
+      if incremental: changed = self._apply_staging_diff()
 
 
       onto_base_iri = cur.execute("SELECT resources.iri FROM objs, resources WHERE objs.c=? AND objs.o=? AND resources.storid=objs.s LIMIT 1", (self.c, owl_ontology)).fetchone()
@@ -1176,6 +1628,8 @@ class SubGraph(BaseSubGraph):
 
       self.parent.select_abbreviate_method()
       self.parent.analyze()
+      
+      if incremental: self.onto._refresh_cached_entities(changed)
 
       return onto_base_iri
 
@@ -1183,6 +1637,49 @@ class SubGraph(BaseSubGraph):
     return objs, datas, on_prepare_obj, on_prepare_data, insert_objs, insert_datas, self.parent.new_blank_node, _abbreviate, on_finish
 
 
+  def _apply_staging_diff(self):
+    # Blank nodes of the new version are renamed as the equivalent blank nodes of the current version, if any
+    old_keys = _blank_node_keys(self.execute("""SELECT s,p,o,NULL FROM objs WHERE c=? AND (s<0 OR o<0) UNION ALL SELECT s,p,o,d FROM datas WHERE c=? AND s<0""", (self.c, self.c)).fetchall())
+    new_keys = _blank_node_keys(self.execute("""SELECT s,p,o,NULL FROM staging_objs WHERE s<0 OR o<0 UNION ALL SELECT s,p,o,d FROM staging_datas WHERE s<0""").fetchall())
+    key_2_old_bns = defaultdict(list)
+    for bn, key in old_keys.items(): key_2_old_bns[key].append(bn)
+    bn_renames = []
+    for bn, key in new_keys.items():
+      old_bns = key_2_old_bns.get(key)
+      if old_bns: bn_renames.append((bn, old_bns.pop()))
+      
+    if bn_renames:
+      self.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_bns (new INTEGER PRIMARY KEY, old INTEGER)""")
+      self.execute("""DELETE FROM staging_bns""")
+      self.db.executemany("""INSERT INTO staging_bns VALUES (?,?)""", bn_renames)
+      self.execute("""UPDATE staging_objs  SET s=(SELECT old FROM staging_bns WHERE new=staging_objs.s)  WHERE s IN (SELECT new FROM staging_bns)""")
+      self.execute("""UPDATE staging_objs  SET o=(SELECT old FROM staging_bns WHERE new=staging_objs.o)  WHERE o IN (SELECT new FROM staging_bns)""")
+      self.execute("""UPDATE staging_datas SET s=(SELECT old FROM staging_bns WHERE new=staging_datas.s) WHERE s IN (SELECT new FROM staging_bns)""")
+      self.execute("""DELETE FROM staging_bns""")
+      
+    removed_objs  = self.execute("""SELECT s,p,o FROM objs WHERE c=? EXCEPT SELECT s,p,o FROM staging_objs""", (self.c,)).fetchall()
+    added_objs    = self.execute("""SELECT s,p,o FROM staging_objs EXCEPT SELECT s,p,o FROM objs WHERE c=?""", (self.c,)).fetchall()
+    removed_datas = self.execute("""SELECT s,p,o,d FROM datas WHERE c=? EXCEPT SELECT s,p,o,d FROM staging_datas""", (self.c,)).fetchall()
+    added_datas   = self.execute("""SELECT s,p,o,d FROM staging_datas EXCEPT SELECT s,p,o,d FROM datas WHERE c=?""", (self.c,)).fetchall()
+    self.execute("""DELETE FROM staging_objs""")
+    self.execute("""DELETE FROM staging_datas""")
+    
+    self.db.executemany("""DELETE FROM objs WHERE c=%s AND s=? AND p=? AND o=?""" % self.c, removed_objs)
+    self.db.executemany("""DELETE FROM datas WHERE c=%s AND s=? AND p=? AND o=? AND d=?""" % self.c, removed_datas)
+    self.db.executemany("""INSERT OR IGNORE INTO objs VALUES (%s,?,?,?)""" % self.c, added_objs)
+    self.db.executemany("""INSERT OR IGNORE INTO datas VALUES (%s,?,?,?,?)""" % self.c, added_datas)
+    
+    if owlready2.namespace._LOG_LEVEL: print("* OwlReady2 * Incremental reload of ontology %s: %s triples removed, %s added" % (self.onto.base_iri, len(removed_objs) + len(removed_datas), len(added_objs) + len(added_datas)), file = sys.stderr)
+    
+    changed = defaultdict(set) # storid => predicates of the changed triples
+    for s,p,o in chain(removed_objs, added_objs):
+      if s > 0:
+        changed[s].add(p)
+        if o > 0: changed[o].add(p) # For inverse property values
+    for s,p,o,d in chain(removed_datas, added_datas):
+      if s > 0: changed[s].add(p)
+    return changed
+  
   def context_2_user_context(self, c): return self.parent.context_2_user_context(c)
 
   def add_ontology_alias(self, iri, alias):
@@ -1195,12 +1692,16 @@ class SubGraph(BaseSubGraph):
     self.execute("UPDATE ontologies SET last_update=? WHERE c=?", (t, self.c))
 
   def destroy(self):
+    self.parent.nb_changes += 1
     self.execute("DELETE FROM objs WHERE c=?",       (self.c,))
     self.execute("DELETE FROM datas WHERE c=?",      (self.c,))
     self.execute("DELETE FROM ontologies WHERE c=?", (self.c,))
+    self.execute("DELETE FROM stats WHERE c=?",      (self.c,))
+    self.parent._stats = None
 
   def _set_obj_triple_raw_spo(self, s, p, o):
     if (s is None) or (p is None) or (o is None): raise ValueError
+    self.parent.nb_changes += 1
     self.execute("DELETE FROM objs WHERE c=? AND s=? AND p=?", (self.c, s, p,))
     self.execute("INSERT INTO objs VALUES (?, ?, ?, ?)", (self.c, s, p, o))
     self.parent.nb_added_triples += 1
@@ -1208,11 +1709,23 @@ class SubGraph(BaseSubGraph):
 
   def _add_obj_triple_raw_spo(self, s, p, o):
     if (s is None) or (p is None) or (o is None): raise ValueError
+    self.parent.nb_changes += 1
     self.execute("INSERT OR IGNORE INTO objs VALUES (?, ?, ?, ?)", (self.c, s, p, o))
     self.parent.nb_added_triples += 1
     if self.parent.nb_added_triples > 1000: self.parent.analyze()
 
+  def _add_new_obj_triples_raw_spo(self, triples, return_new = False):
+    self.parent.nb_changes += 1
+    self.parent._load_new_obj_triples(triples)
+    r = self.execute("SELECT DISTINCT s,p,o,ip FROM new_objs").fetchall() if return_new else None
+    nb = self.execute("INSERT OR IGNORE INTO objs SELECT %s,s,p,o FROM new_objs ORDER BY o,p,s" % self.c).rowcount # Ordered for index locality
+    self.execute("DELETE FROM new_objs")
+    self.parent.nb_added_triples += nb
+    if self.parent.nb_added_triples > 1000: self.parent.analyze()
+    return r
+
   def _del_obj_triple_raw_spo(self, s = None, p = None, o = None):
+    self.parent.nb_changes += 1
     if s is None:
       if p is None:
         if o is None: self.execute("DELETE FROM objs WHERE c=?", (self.c,))
@@ -1230,6 +1743,7 @@ class SubGraph(BaseSubGraph):
 
   def _set_data_triple_raw_spod(self, s, p, o, d):
     if (s is None) or (p is None) or (o is None) or (d is None): raise ValueError
+    self.parent.nb_changes += 1
     self.execute("DELETE FROM datas WHERE c=? AND s=? AND p=?", (self.c, s, p,))
     self.execute("INSERT INTO datas VALUES (?, ?, ?, ?, ?)", (self.c, s, p, o, d))
     self.parent.nb_added_triples += 1
@@ -1237,11 +1751,23 @@ class SubGraph(BaseSubGraph):
 
   def _add_data_triple_raw_spod(self, s, p, o, d):
     if (s is None) or (p is None) or (o is None) or (d is None): raise ValueError
+    self.parent.nb_changes += 1
     self.execute("INSERT OR IGNORE INTO datas VALUES (?, ?, ?, ?, ?)", (self.c, s, p, o, d))
     self.parent.nb_added_triples += 1
     if self.parent.nb_added_triples > 1000: self.parent.analyze()
 
+  def _add_new_data_triples_raw_spod(self, triples, return_new = False):
+    self.parent.nb_changes += 1
+    self.parent._load_new_data_triples(triples)
+    r = self.execute("SELECT DISTINCT s,p,o,d FROM new_datas").fetchall() if return_new else None
+    nb = self.execute("INSERT OR IGNORE INTO datas SELECT %s,s,p,o,d FROM new_datas ORDER BY o,p,s" % self.c).rowcount
+    self.execute("DELETE FROM new_datas")
+    self.parent.nb_added_triples += nb
+    if self.parent.nb_added_triples > 1000: self.parent.analyze()
+    return r
+
   def _del_data_triple_raw_spod(self, s, p, o, d):
+    self.parent.nb_changes += 1
     if s is None:
       if p is None:
         if o is None:   self.execute("DELETE FROM datas WHERE c=?", (self.c,))
@@ -1455,6 +1981,9 @@ class SubGraph(BaseSubGraph):
   def _iter_triples(self, quads = False, sort_by_s = False):
     return self.parent._iter_triples(quads, sort_by_s, self.c)
 
+  def _iter_ntriples(self, quads = False):
+    return self.parent._iter_ntriples(quads, self.c)
+
   def _refactor(self, storid, new_iri): return self.parent._refactor(storid, new_iri)
 
   def _get_obj_triples_transitive_sp(self, s, p): # Return all nested properties with the given s and p
@@ -1471,6 +2000,33 @@ AS (  SELECT s FROM objs WHERE c=? AND p=? AND o=?
 UNION SELECT objs.s FROM objs, transit WHERE objs.c=? AND objs.p=? AND objs.o=transit.x)
 SELECT x FROM transit""", (self.c, p, o, self.c, p)).fetchall(): yield x
 
+  def _get_list_od(self, bnode):
+    return [(o, None) if not o is None else (data_o, d) for o, data_o, d in self.execute("""
+WITH RECURSIVE cells(i, s)
+AS (      SELECT 0, ?
+UNION ALL SELECT i+1, (SELECT o FROM objs WHERE s=cells.s AND p=? AND +c=?) FROM cells WHERE s!=?)
+SELECT (SELECT o FROM objs  WHERE s=cells.s AND p=? AND +c=?),
+       (SELECT o FROM datas WHERE s=cells.s AND p=? AND +c=?),
+       (SELECT d FROM datas WHERE s=cells.s AND p=? AND +c=?)
+FROM cells WHERE s!=? ORDER BY i""", (bnode, rdf_rest, self.c, rdf_nil, rdf_first, self.c, rdf_first, self.c, rdf_first, self.c, rdf_nil)).fetchall()]
+
+  def _get_bnode_subtree(self, bnode):
+    try:
+      rows = self.execute("""
+WITH RECURSIVE bnodes(s)
+AS (  SELECT ?
+UNION SELECT children.value FROM bnodes, json_each((SELECT json_group_array(o) FROM objs WHERE s=bnodes.s AND +o<0 AND +c=?)) AS children)
+          SELECT s,p,o,NULL FROM objs  WHERE s IN bnodes AND +c=?
+UNION ALL SELECT s,p,o,d    FROM datas WHERE s IN bnodes AND +c=?""", (bnode, self.c, self.c, self.c)).fetchall()
+    except sqlite3.OperationalError: # SQLite without JSON support
+      return BaseSubGraph._get_bnode_subtree(self, bnode)
+    subtree = {}
+    for s, p, o, d in rows:
+      l = subtree.get(s)
+      if l is None: l = subtree[s] = []
+      l.append((p, o, d))
+    return subtree
+
 #  def _get_obj_triples_transitive_sym(self, s, p):
 #    r = { s }
 #    for (s, o) in self.execute("""
@@ -1505,10 +2061,10 @@ class _SearchMixin(list):
         else:
           o_2_bm25[o] = bm25
       os_bm25s = sorted(o_2_bm25.items(), key = lambda x: x[1])
-      return ((self.world._get_by_storid(o), bm25) for (o, bm25) in os_bm25s)
+      return zip(self.world._get_by_storids([o for (o, bm25) in os_bm25s]), [bm25 for (o, bm25) in os_bm25s])
     else:
       sql, params = self.sql_request()
-      return (self.world._get_by_storid(o) for (o,) in self.world.graph.execute(sql, params).fetchall())
+      return self.world._get_by_storids([o for (o,) in self.world.graph.execute(sql, params).fetchall()])
   _get_content = _do_search
 
   def _do_search_rdf(self):
@@ -1973,7 +2529,7 @@ class _IntersectionSearchList(FirstList, _SearchMixin, _LazyListMixin):
   def explode(self, gen): raise NotImplementedError("Nested search with intersection are not supported.")
 
   def _do_search(self):
-    return (self.world._get_by_storid(o) for (o,) in self._do_search_rdf())
+    return self.world._get_by_storids([o for (o,) in self._do_search_rdf()])
   _get_content = _do_search
 
   def _do_search_rdf(self):
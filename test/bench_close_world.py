@@ -0,0 +1,38 @@
+# python ./owlready2/test/bench_close_world.py [NB_CLASS] [NB_INSTANCE]
+
+# Closes (with close_world()) the root of a synthetic hierarchy of NB_CLASS classes with NB_INSTANCE instances;
+# each instance is related to 0-2 targets, and one class out of 10 has an existential restriction.
+
+import sys, time, random
+
+from owlready2 import *
+
+NB_CLASS    = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+NB_INSTANCE = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_close.owl#")
+with onto:
+  class Root  (Thing): pass
+  class Target(Thing): pass
+  class rel(ObjectProperty):
+    domain = [Root]
+  classes = [Root]
+  for i in range(NB_CLASS): classes.append(types.new_class("C%s" % i, (random.choice(classes),)))
+  for Class in classes[1::10]: Class.is_a.append(rel.some(Target))
+
+c       = onto.graph.c
+targets = [world._abbreviate("http://test.org/bench_close.owl#t%s" % i) for i in range(1000)]
+objs    = [(c, target, rdf_type, Target.storid) for target in targets]
+for i in range(NB_INSTANCE):
+  x = world._abbreviate("http://test.org/bench_close.owl#i%s" % i)
+  objs.append((c, x, rdf_type, random.choice(classes).storid))
+  objs.extend((c, x, rel.storid, target) for target in random.sample(targets, random.randint(0, 2)))
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.analyze()
+
+t0 = time.time()
+close_world(Root)
+print("%8.4f s  close_world() on %s classes and %s instances" % (time.time() - t0, NB_CLASS + 1, NB_INSTANCE))
+print("          %s triples" % world.graph.execute("SELECT COUNT(*) FROM objs").fetchone()[0])
@@ -0,0 +1,44 @@
+# python ./owlready2/test/bench_indirect_values.py [NB_INDIVIDUAL]
+
+# Computes the indirect values of a transitive property (with a subproperty, an inverse, and existential
+# restrictions on the classes) for NB_INDIVIDUAL individuals, one individual at a time and with indirect_values_for().
+
+import sys, time, random
+
+from owlready2 import *
+
+NB_INDIVIDUAL = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_indirect.owl#")
+with onto:
+  class Region(Thing): pass
+  class part_of         (ObjectProperty, TransitiveProperty): pass
+  class directly_part_of(part_of): pass
+  class has_part        (ObjectProperty): inverse_property = part_of
+  classes = [types.new_class("C%s" % i, (Thing,)) for i in range(50)]
+  regions = [Region("r%s" % i) for i in range(1000)]
+  for i, region in enumerate(regions[1:], 1): region.directly_part_of = [regions[random.randrange(i)]]
+  for Class in classes[::5]: Class.is_a.append(part_of.some(Region))
+
+c    = onto.graph.c
+objs = []
+for i in range(NB_INDIVIDUAL):
+  x = world._abbreviate("http://test.org/bench_indirect.owl#i%s" % i)
+  objs.append((c, x, rdf_type, random.choice(classes).storid))
+  if i % 10: objs.append((c, x, directly_part_of.storid, random.choice(regions).storid))
+  else:      objs.append((c, random.choice(regions).storid, has_part.storid, x))
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.analyze()
+individuals = list(world.search(iri = "http://test.org/bench_indirect.owl#i*"))
+
+t0 = time.time()
+r1 = { individual : part_of._get_indirect_values_for_individual(individual) for individual in individuals }
+print("%8.4f s  one individual at a time" % (time.time() - t0))
+
+t0 = time.time()
+r2 = part_of.indirect_values_for(individuals)
+print("%8.4f s  indirect_values_for()" % (time.time() - t0))
+
+assert { x.name : set(map(repr, vs)) for x, vs in r1.items() } == { x.name : set(map(repr, vs)) for x, vs in r2.items() }
@@ -0,0 +1,57 @@
+# python ./owlready2/test/bench_reasoning.py [nb_edges] [-legacy]
+
+# Applies a synthetic reasoning result (nb_edges new rdf:type edges, 1000000 by default) to the quadstore,
+# as sync_reasoner() does after running HermiT or Pellet.
+# With -legacy, the result is also applied edge by edge, as in previous versions, for comparison.
+
+import sys, time
+
+from owlready2 import *
+from owlready2.reasoning import _apply_reasoning_results, _apply_inferred_obj_relations
+
+NB = int(([arg for arg in sys.argv[1:] if not arg.startswith("-")] or [1000000])[0])
+
+world = World()
+onto  = world.get_ontology("http://test.org/bench.owl")
+with onto:
+  classes = [types.new_class("C%s" % i, (Thing,)) for i in range(100)]
+  class rel(ObjectProperty): pass
+  loaded = [Thing("loaded%s" % i) for i in range(100)]
+
+t = time.time()
+storids = [world._abbreviate("http://test.org/bench.owl#i%s" % i) for i in range(NB - len(loaded))] + [i.storid for i in loaded]
+world.graph.db.executemany("INSERT OR IGNORE INTO objs VALUES (?,?,?,?)", [(onto.graph.c, storid, rdf_type, owl_named_individual) for storid in storids])
+print("Setup time %s s." % (time.time() - t), file = sys.stderr)
+
+new_parents   = { storid : [classes[i % 100].storid] for i, storid in enumerate(storids) }
+entity_2_type = dict.fromkeys(storids, "individual")
+relations     = [(storid, rel, storids[i - 1]) for i, storid in enumerate(storids)]
+
+def bench(label, f):
+  t = time.time()
+  f()
+  print("%s: %s s." % (label, time.time() - t), file = sys.stderr)
+
+inferences = world.get_ontology("http://inferrences/")
+
+def legacy(ontology):
+  for child_storid, parent_storids in new_parents.items():
+    for parent_storid in parent_storids:
+      if not world._has_obj_triple_spo(child_storid, rdf_type, parent_storid):
+        ontology._add_obj_triple_spo(child_storid, rdf_type, parent_storid)
+  for a_storid, prop, b_storid in relations:
+    if not world._has_obj_triple_spo(a_storid, prop.storid, b_storid):
+      ontology._add_obj_triple_spo(a_storid, prop.storid, b_storid)
+
+if "-legacy" in sys.argv:
+  legacy_inferences = world.get_ontology("http://inferrences/legacy/")
+  bench("Apply %s is-a and %s relation edges, legacy" % (NB, NB), lambda: legacy(legacy_inferences))
+  legacy_inferences.destroy()
+
+bench("Apply %s is-a edges, batched" % NB, lambda: _apply_reasoning_results(world, inferences, 0, new_parents, {}, entity_2_type))
+bench("Apply %s relation edges, batched" % NB, lambda: _apply_inferred_obj_relations(world, inferences, 0, relations))
+bench("Re-apply the same %s + %s edges (nothing new)" % (NB, NB), lambda: (_apply_reasoning_results(world, inferences, 0, new_parents, {}, entity_2_type),
+                                                                           _apply_inferred_obj_relations(world, inferences, 0, relations)))
+
+assert len(inferences.graph) == 2 * NB + 1
+assert set(loaded[0].is_a) == { classes[(NB - 100) % 100] }
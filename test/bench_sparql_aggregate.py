@@ -0,0 +1,45 @@
+# python ./owlready2/test/bench_sparql_aggregate.py [NB_CLASS] [NB_INSTANCE]
+
+# Counts the instances of each class (a typical dashboard query) on a synthetic quadstore,
+# with the results as entities or as storids, and with the counts computed from the quadstore statistics.
+
+import sys, time, random
+
+from owlready2 import *
+
+NB_CLASS    = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+NB_INSTANCE = int(sys.argv[2]) if len(sys.argv) > 2 else 500000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_aggregate.owl#")
+
+c       = onto.graph.c
+classes = [world._abbreviate("http://test.org/bench_aggregate.owl#C%s" % i) for i in range(NB_CLASS)]
+objs    = [(c, klass, rdf_type, owl_class) for klass in classes]
+objs   += [(c, world._abbreviate("http://test.org/bench_aggregate.owl#i%s" % i), rdf_type, random.choice(classes)) for i in range(NB_INSTANCE)]
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.analyze()
+
+PER_CLASS = """SELECT ?c (COUNT(?x) AS ?nb) { ?x a ?c . } GROUP BY ?c"""
+ONE_CLASS = """SELECT (COUNT(?x) AS ?nb) { ?x a <http://test.org/bench_aggregate.owl#C1> . }"""
+
+def timed(label, func):
+  t0 = time.time()
+  r  = func()
+  t  = time.time() - t0
+  print("%8.4f s  %s" % (t, label))
+  return r
+
+per_class = world.prepare_sparql(PER_CLASS)
+one_class = world.prepare_sparql(ONE_CLASS)
+r1 = timed("counts per class, as entities",                   lambda: { getattr(c, "storid", c) : nb for (c, nb) in per_class.execute() })
+r2 = timed("counts per class, as storids",                    lambda: dict(per_class.execute(entity_format = "storid")))
+n1 = timed("count of one class",                              lambda: list(one_class.execute()))
+world.update_stats()
+per_class = world.prepare_sparql(PER_CLASS)
+one_class = world.prepare_sparql(ONE_CLASS)
+r3 = timed("counts per class, as storids, from statistics",   lambda: dict(per_class.execute(entity_format = "storid")))
+n2 = timed("count of one class, from statistics",             lambda: list(one_class.execute()))
+assert r1 == r2 == r3
+assert n1 == n2
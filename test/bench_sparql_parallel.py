@@ -0,0 +1,70 @@
+# python ./owlready2/test/bench_sparql_parallel.py [N] [NB_WORKER]
+
+# Compares sequential and parallel execution of SPARQL queries (UNION branches, and batches of parameters)
+# on a synthetic quadstore stored in a file, opened in non-exclusive mode.
+
+import sys, os, time, random, tempfile
+
+from owlready2 import *
+
+N         = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+NB_WORKER = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+random.seed(0)
+filename = tempfile.mktemp(suffix = ".sqlite3")
+world = World(filename = filename, exclusive = False)
+onto  = world.get_ontology("http://test.org/bench_parallel.owl#")
+with onto:
+  class A(Thing): pass
+  class B(Thing): pass
+  class C(Thing): pass
+  class D(Thing): pass
+  class p(ObjectProperty): pass
+  class v(DataProperty): pass
+
+c     = onto.graph.c
+Ss    = [world._abbreviate("http://test.org/bench_parallel.owl#s%s" % i) for i in range(N)]
+Cs    = [A.storid, B.storid, C.storid, D.storid]
+objs  = [(c, s, rdf_type, Cs[i % 4]) for i, s in enumerate(Ss)]
+objs += [(c, s, p.storid, random.choice(Ss)) for s in Ss]
+datas = [(c, s, v.storid, random.randint(0, 99), 0) for s in Ss]
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.db.executemany("INSERT INTO datas VALUES (?,?,?,?,?)", datas)
+world.graph.analyze()
+world.update_stats()
+world.save()
+
+UNION = """PREFIX onto: <http://test.org/bench_parallel.owl#>
+SELECT ?x ?z {
+  { ?x a onto:A . ?x onto:p ?y . ?y onto:p ?z . ?z onto:v 1 }  UNION
+  { ?x a onto:B . ?x onto:p ?y . ?y onto:p ?z . ?z onto:v 2 }  UNION
+  { ?x a onto:C . ?x onto:p ?y . ?y onto:p ?z . ?z onto:v 3 }  UNION
+  { ?x a onto:D . ?x onto:p ?y . ?y onto:p ?z . ?z onto:v 4 }
+}"""
+PARAM = """PREFIX onto: <http://test.org/bench_parallel.owl#>
+SELECT (COUNT(?z) AS ?nb) { ?x onto:v ??1 . ?x onto:p ?y . ?y onto:p ?z . ?z onto:v ?w . FILTER(?w < 50) }"""
+
+def timed(label, func):
+  t0 = time.time()
+  r  = func()
+  t  = time.time() - t0
+  print("%8.4f s  %s" % (t, label))
+  return r, t
+
+q = world.prepare_sparql(UNION)
+list(q.execute()) # Warm the cache
+r1, t1 = timed("UNION, sequential", lambda: sorted(map(str, q.execute())))
+r2, t2 = timed("UNION, %s workers" % NB_WORKER, lambda: sorted(map(str, q.execute(parallel = NB_WORKER))))
+assert r1 == r2
+
+q = world.prepare_sparql(PARAM)
+paramss = [[i] for i in range(100)]
+r3, t3 = timed("100 parameter sets, sequential", lambda: [list(q.execute(params)) for params in paramss])
+r4, t4 = timed("100 parameter sets, %s workers" % NB_WORKER, lambda: q.execute_parallel(paramss, NB_WORKER))
+assert r3 == r4
+
+print()
+print("Speedup: UNION %.1f, parameter sets %.1f" % (t1 / t2, t3 / t4))
+
+world.close()
+os.unlink(filename)
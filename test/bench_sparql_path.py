@@ -0,0 +1,57 @@
+# python ./owlready2/test/bench_sparql_path.py [DEPTH] [WIDTH]
+
+# Reachability checks (both ends of the property path bound) on a deep synthetic polyhierarchy of DEPTH levels
+# of WIDTH concepts, each concept having 2 random broader concepts in the level above. The same checks are
+# also written with a variable end and a FILTER, which expands the whole closure from one end.
+# The bidirectional search stops at the first meet, and at once if one end has no relation at all;
+# when both closures cover most of the hierarchy (e.g. leaf -> root), it is as fast as the expansion from one end.
+
+import sys, time, random
+
+from owlready2 import *
+
+DEPTH = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+WIDTH = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_path.owl#")
+with onto:
+  class broader(ObjectProperty): pass
+
+c       = onto.graph.c
+levels  = [[world._abbreviate("http://test.org/bench_path.owl#C%s_%s" % (i, j)) for j in range(WIDTH)] for i in range(DEPTH)]
+parents = { x : random.sample(levels[i - 1], 2) for i in range(1, DEPTH) for x in levels[i] }
+objs    = [(c, x, rdf_type, owl_named_individual) for level in levels for x in level]
+objs   += [(c, x, broader.storid, parent) for x in parents for parent in parents[x]]
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.analyze()
+
+leaf, other_leaf, root = levels[-1][0], levels[-1][1], levels[0][0]
+ancestor = parents[parents[parents[leaf][0]][0]][0]
+leaf, other_leaf, root, ancestor = [world._unabbreviate(x) for x in (leaf, other_leaf, root, ancestor)]
+CHECKS = [
+  ("leaf -> ancestor 3 levels up",   leaf, "+",      ancestor),
+  ("leaf -> root",                   leaf, "+",      root),
+  ("root -> leaf (no path)",         root, "+",      leaf),
+  ("leaf -> leaf (no path)",         leaf, "+",      other_leaf),
+  ("leaf -> root, 10 steps at most", leaf, "{1,10}", root),
+]
+
+def timed(label, func):
+  t0 = time.time()
+  r  = func()
+  print("%8.4f s  %s" % (time.time() - t0, label))
+  return r
+
+for label, s, modifier, o in CHECKS:
+  q1 = world.prepare_sparql("""SELECT (COUNT(*) AS ?nb) { <%s> <%s>%s ?x . FILTER(?x = <%s>) }""" % (s, broader.iri, modifier, o))
+  q2 = world.prepare_sparql("""SELECT (COUNT(*) AS ?nb) { <%s> <%s>%s <%s> . }"""                 % (s, broader.iri, modifier, o))
+  r1 = timed("%s, expanded from one end" % label, lambda: list(q1.execute()))
+  r2 = timed("%s, bidirectional search"  % label, lambda: list(q2.execute()))
+  assert r1 == r2
+
+leaf = world._get_by_storid(world._abbreviate(leaf))
+root = world._get_by_storid(world._abbreviate(root))
+path = timed("shortest path leaf -> root", lambda: world.get_shortest_path(leaf, root, broader))
+print("          (%s steps)" % (len(path) - 1))
@@ -0,0 +1,61 @@
+# python ./owlready2/test/bench_sparql_regex.py [N]
+
+# Measures FILTER(REGEX(...)) and other SPARQL functions over N labels, with the Python implementations
+# of the functions (owlready2.sparql.func) and with the compiled ones (owlready2_optimized), if available.
+
+import sys, time, random, importlib.util
+
+from owlready2 import *
+import owlready2.driver, owlready2.sparql.func as func
+
+# Loads a second copy of owlready2.sparql.func, without the compiled functions
+optimized = owlready2.driver.owlready2_optimized
+owlready2.driver.owlready2_optimized = None
+spec        = importlib.util.spec_from_file_location("python_func", func.__file__)
+python_func = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(python_func)
+owlready2.driver.owlready2_optimized = optimized
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_regex.owl#")
+with onto:
+  class label2(DataProperty): pass
+
+WORDS = ["heart", "lung", "kidney", "liver", "brain", "disease", "acute", "chronic", "failure", "tumor", "infection"]
+c     = onto.graph.c
+datas = [(c, -i - 1, label2.storid, " ".join(random.choice(WORDS) for j in range(4)), 0) for i in range(N)]
+datas += [(c, -i - 1, label2.storid, "2020-01-%02dT10:11:%02d+02:00" % (i % 28 + 1, i % 60), 0) for i in range(N // 10)]
+world.graph.db.executemany("INSERT INTO datas VALUES (?,?,?,?,?)", datas)
+world.graph.analyze()
+list(world.sparql("""SELECT ?x { ?x a owl:Class . }""")) # Registers the SPARQL functions, before replacing them below
+
+QUERIES = [
+  """SELECT (COUNT(?l) AS ?nb) { ?x onto:label2 ?l . FILTER(REGEX(?l, "kidney failure")) }""",
+  """SELECT (COUNT(?l) AS ?nb) { ?x onto:label2 ?l . FILTER(REGEX(?l, "^(acute|chronic) .*tumor", "i")) }""",
+  """SELECT (COUNT(?l) AS ?nb) { ?x onto:label2 ?l . FILTER(STRLEN(MD5(?l)) = 32) }""",
+  """SELECT (SUM(?s) AS ?nb) { ?x onto:label2 ?l . FILTER(STRSTARTS(?l, "2020")) BIND(SECONDS(?l) AS ?s) }""",
+]
+
+def run(label, functions):
+  db = world.graph.db
+  for name, nb_param, f in functions: db.create_function(name, nb_param, f, deterministic = True)
+  results = []
+  print(label)
+  for sparql in QUERIES:
+    q  = world.prepare_sparql("PREFIX onto: <http://test.org/bench_regex.owl#>\n%s" % sparql)
+    t0 = time.time()
+    results.append(list(q.execute()))
+    print("%8.4f s  %s" % (time.time() - t0, sparql))
+  print()
+  return results
+
+python_results = run("Python functions:", [("regex", -1, python_func._regex), ("md5", 1, python_func._md5), ("seconds", 1, python_func._seconds)])
+
+if func._regex is not python_func._regex:
+  compiled_results = run("Compiled functions:", [("regex", -1, func._regex), ("md5", 1, func._md5), ("seconds", 1, func._seconds)])
+  assert python_results == compiled_results
+else:
+  print("Compiled functions are not available (owlready2_optimized needs to be rebuilt)")
@@ -0,0 +1,68 @@
+# python ./owlready2/test/bench_sparql_stats.py
+
+# Compares SPARQL queries before and after collecting the quadstore statistics (World.update_stats()).
+# The queries of perftest.py need the GO / OMOP quadstores; here a synthetic quadstore is used instead,
+# with a big class A, a small class B, and a rare and a common data property.
+
+import sys, time, random
+
+from owlready2 import *
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+random.seed(0)
+world = World()
+onto  = world.get_ontology("http://test.org/bench_stats.owl#")
+with onto:
+  class A(Thing): pass
+  class B(Thing): pass
+  class p(ObjectProperty): pass
+  class q(ObjectProperty): pass
+  class rare(DataProperty): pass
+  class common(DataProperty): pass
+
+c  = onto.graph.c
+As = [world._abbreviate("http://test.org/bench_stats.owl#a%s" % i) for i in range(N)]
+Bs = [world._abbreviate("http://test.org/bench_stats.owl#b%s" % i) for i in range(20)]
+objs  = [(c, s, rdf_type, A.storid) for s in As] + [(c, s, rdf_type, B.storid) for s in Bs]
+objs += [(c, s, p.storid, random.choice(As)) for s in As]
+objs += [(c, random.choice(As), p.storid, b) for b in Bs for i in range(5)]
+objs += [(c, s, q.storid, random.choice(As)) for s in As]
+datas  = [(c, s, common.storid, i % 1000, 0) for i, s in enumerate(As)]
+datas += [(c, As[i * (N // 10)], rare.storid, i, 0) for i in range(10)]
+world.graph.db.executemany("INSERT INTO objs VALUES (?,?,?,?)", objs)
+world.graph.db.executemany("INSERT INTO datas VALUES (?,?,?,?,?)", datas)
+world.graph.analyze()
+
+QUERIES = [
+  """SELECT ?x ?y WHERE { ?x a onto:A . ?x onto:p ?y . ?y a onto:B . }""",
+  """SELECT ?x ?v WHERE { ?x a onto:A . ?x onto:common ?c . ?x onto:rare ?v . }""",
+  """SELECT ?x ?y ?z WHERE { ?x onto:q ?y . ?y onto:p ?z . ?z a onto:B . }""",
+  """SELECT ?x ?y WHERE { ?x a onto:A . ?x onto:q/onto:p+ ?y . ?y a onto:B . }""",
+  """SELECT ?x ?c WHERE { ?y a onto:B . ?x onto:p ?y . ?x onto:common ?c . }""",
+]
+
+def run():
+  world.graph.execute("""SELECT COUNT() FROM objs""").fetchall() # Warm the cache
+  results = []
+  total   = 0.0
+  for sparql in QUERIES:
+    sql = world.prepare_sparql("PREFIX onto: <http://test.org/bench_stats.owl#>\n%s" % sparql).sql
+    t0 = time.time()
+    r  = world.graph.execute(sql).fetchall()
+    t  = time.time() - t0
+    total += t
+    results.append(sorted(r))
+    print("%8.4f s  %6s results  %s" % (t, len(r), sparql))
+  print("%8.4f s  total" % total)
+  return results, total
+
+print("Without statistics:")
+r1, t1 = run()
+world.update_stats()
+print()
+print("With statistics:")
+r2, t2 = run()
+assert r1 == r2
+print()
+print("Speedup: %.1f" % (t1 / t2))
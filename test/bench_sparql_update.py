@@ -0,0 +1,39 @@
+# python ./owlready2/test/bench_sparql_update.py [N]
+
+# Executes a SPARQL DELETE / INSERT query over N bindings, row by row and with set-based INSERT / DELETE statements.
+
+import sys, time
+
+from owlready2 import *
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+UPDATE = """PREFIX onto: <http://test.org/bench_update.owl#>
+DELETE { ?x onto:v ?v . }
+INSERT { ?x onto:v2 ?v . ?x onto:p onto:target . }
+WHERE  { ?x onto:v ?v . }"""
+
+def run(label, by_row):
+  world = World()
+  onto  = world.get_ontology("http://test.org/bench_update.owl#")
+  with onto:
+    class p (ObjectProperty): pass
+    class v (DataProperty): pass
+    class v2(DataProperty): pass
+    Thing("target")
+  c = onto.graph.c
+  world.graph.db.executemany("INSERT INTO datas VALUES (?,?,?,?,?)", [(c, -i - 1, v.storid, i, 0) for i in range(N)])
+  world.graph.analyze()
+  
+  q = world.prepare_sparql(UPDATE)
+  if by_row:
+    q.row_deletes, q.row_inserts = q.deletes, q.inserts
+    q.bulk_deletes = q.bulk_inserts = []
+  t0 = time.time()
+  with onto: nb = q.execute()
+  print("%8.4f s  %s (%s matches)" % (time.time() - t0, label, nb))
+  return sorted(world.graph.execute("SELECT s,p,o FROM quads"))
+  
+r1 = run("row by row", True)
+r2 = run("set-based",  False)
+assert r1 == r2
@@ -158,8 +158,7 @@ class Test(BaseTest, unittest.TestCase):
     iri = x.storid
     assert x is n.Vegetable
     x = None
-    import owlready2.namespace
-    owlready2.namespace._cache = [None] * 1000
+    default_world._entity_cache.clear()
     import gc
     gc.collect(); gc.collect(); gc.collect()
     assert not iri in default_world._entities
@@ -328,6 +327,117 @@ class Test(BaseTest, unittest.TestCase):
         C()
         
     assert before != world.graph.execute("SELECT * FROM sqlite_stat1").fetchall()
+
+  def test_world_11(self):
+    tmp   = self.new_tmp_file()
+    world = World(filename = tmp)
+    onto  = world.get_ontology("http://test.org/t_bulk.owl")
+    with onto:
+      class C1(Thing): pass
+      class C3(Thing): pass
+      class C2(C1): pass
+      C3.is_a = [C2]
+      class p(C1 >> C2): pass
+      class p2(p): pass
+      c = C3("c")
+    world.save()
+    world.close()
+
+    world = World(filename = tmp)
+    onto  = world.get_ontology("http://test.org/t_bulk.owl")
+    storids = [onto.storid, world._abbreviate("http://test.org/t_bulk.owl#C3"), world._abbreviate("http://test.org/t_bulk.owl#c"), world._abbreviate("http://test.org/t_bulk.owl#p2")]
+    assert world._entities.get(storids[1]) is None # Not yet loaded
+    entities = world._get_by_storids(storids)
+    assert [e.name for e in entities[1:]] == ["C3", "c", "p2"]
+    assert entities[1].is_a == [onto.C2]
+    assert onto.C2.is_a == [onto.C1]
+    assert entities[2].is_a == [onto.C3]
+    assert onto.p in entities[3].is_a
+    assert set(onto.classes()) == { onto.C1, onto.C2, onto.C3 }
+    assert set(onto.individuals()) == { onto.c }
+    assert set(onto.object_properties()) == { onto.p, onto.p2 }
+
+  def test_world_12(self):
+    world = World(entity_cache_size = 10)
+    onto  = world.get_ontology("http://test.org/t_cache.owl")
+    with onto:
+      class C(Thing): pass
+      cs = [C("c%s" % i) for i in range(20)]
+    assert len(world._entity_cache) == 10
+    assert world._entity_cache.nb_eviction == 11
+    assert not cs[0] in world._entity_cache
+    assert cs[-1] in world._entity_cache
+
+    world._get_by_storid(cs[0].storid)
+    assert cs[0] in world._entity_cache
+    assert world.get_entity_cache_stats()["nb_hit"] >= 1
+
+    world.pin_entities(cs[:5])
+    world._entity_cache.size = 2
+    assert len(world._entity_cache) == 2
+    assert cs[1] in world._entity_cache
+
+    storid = cs[1].storid
+    world.unpin_entities(cs[:5])
+    cs = C = None
+    world._entity_cache.clear()
+    import gc
+    gc.collect()
+    assert not storid in world._entities
+    
+    onto.destroy()
+    onto  = world.get_ontology("http://test.org/t_cache2.owl")
+    with onto:
+      class D(Thing): pass
+      d = D("d")
+    world.pin_entities([D, d])
+    with onto: es = [D("e%s" % i) for i in range(3)] # Evicts D and d from the LRU part of the cache
+    assert world.get_entity_cache_stats()["nb_pinned"] == 2
+    onto._destroy_cached_entities()
+    assert world.get_entity_cache_stats()["nb_pinned"] == 0
+    assert not D.storid in world._entities
+    
+    world.pin_entities([onto.D, onto.d])
+    onto.destroy()
+    assert world.get_entity_cache_stats()["nb_pinned"] == 0
+
+  def test_world_13(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://www.semanticweb.org/jiba/ontologies/2017/0/test").load()
+    onto2 = world.get_ontology("http://test.org/t_snapshot.owl")
+    with onto2:
+      class d(Thing >> str): pass
+      x = Thing("x", d = [locstr("a", "en"), "b\nc", 1, 2.5, True, datetime.date(2020, 1, 2), normstr("n")])
+    world.full_text_search_properties.append(d)
+    
+    def ntriples(world):
+      f = BytesIO(); world.save(f, format = "nquads")
+      return sorted(f.getvalue().split(b"\n"))
+    
+    for compress in [True, False]:
+      tmp = self.new_tmp_file()
+      world.save(tmp, format = "owlready-snapshot", compress = compress)
+      
+      world2 = World(snapshot = tmp)
+      assert ntriples(world2) == ntriples(world)
+      assert set(world2.ontologies) == set(world.ontologies)
+      onto2_2 = world2.get_ontology("http://test.org/t_snapshot.owl")
+      assert set(onto2_2.x.d) == set(x.d)
+      assert world2.get_ontology("http://www.semanticweb.org/jiba/ontologies/2017/0/test").Pizza.iri == onto.Pizza.iri
+      assert world2.search(d = FTS("a")) == [onto2_2.x]
+      assert world2.new_blank_node() == world.graph.execute("SELECT -current_blank - 1 FROM store").fetchone()[0]
+      
+      with onto2_2:
+        class C(Thing): pass
+      assert C.storid > max(storid for (storid,) in world.graph.execute("SELECT storid FROM resources"))
+      
+    tmp = self.new_tmp_file() + ".gz"
+    world.save(tmp, format = "owlready-snapshot")
+    world2 = World(snapshot = tmp)
+    assert ntriples(world2) == ntriples(world)
+    os.unlink(tmp)
+    
+    with self.assertRaises(ValueError): onto.save(BytesIO(), format = "owlready-snapshot")
     
   def test_ontology_1(self):
     o1 = get_ontology("http://test/test_ontology_1_1.owl")
@@ -766,6 +876,103 @@ class Test(BaseTest, unittest.TestCase):
     assert len(list(o.metadata)) == 2
     assert set(o.metadata) == { label, comment }
     
+  def test_ontology_33(self):
+    tmp = self.new_tmp_file()
+    w1  = self.new_world()
+    o1  = w1.get_ontology("http://test.org/t.owl")
+    with o1:
+      class p(Thing >> Thing): pass
+      class C(Thing): pass
+      class D(Thing): pass
+      D.is_a.append(p.some(C | D))
+      class E(Thing): is_a = [p.only(OneOf([C("c1"), C("c2")]))]
+      c1 = C("c1", label = ["c1"])
+    o1.save(tmp)
+    
+    w2 = self.new_world()
+    o2 = w2.get_ontology("http://test.org/t.owl").load(fileobj = open(tmp, "rb"))
+    p2, D2, E2, c1_2 = o2.p, o2.D, o2.E, o2.c1
+    D2_bns = set(w2.graph.execute("""SELECT o FROM objs WHERE s=? AND o<0""", (D2.storid,)).fetchall())
+    
+    c1.label = ["c1 bis"]
+    E.is_a[-1].value.instances.append(C("c3"))
+    with o1:
+      class F(D): pass
+    o1.save(tmp)
+    
+    o2.load(fileobj = open(tmp, "rb"), reload = True, incremental = True)
+    
+    assert o2.p is p2 # Changed entities are refreshed in place, and unchanged blank nodes are kept
+    assert set(w2.graph.execute("""SELECT o FROM objs WHERE s=? AND o<0""", (D2.storid,)).fetchall()) == D2_bns
+    assert o2.c1 is c1_2
+    assert o2.c1.label == ["c1 bis"]
+    assert o2.E is E2
+    assert set(o2.E.is_a[-1].value.instances) == { o2.c1, o2.c2, o2.c3 }
+    assert o2.F.is_a == [o2.D]
+    
+    w3 = self.new_world()
+    o3 = w3.get_ontology("http://test.org/t.owl").load(fileobj = open(tmp, "rb"))
+    def canonize(o):
+      f = BytesIO(); o.save(f, format = "ntriples")
+      return sorted(re.sub(rb"_:[a-z0-9]+", b"_", line) for line in f.getvalue().split(b"\n"))
+    assert canonize(o2) == canonize(o3)
+    
+  def test_ontology_34(self):
+    tmp = self.new_tmp_file()
+    w1  = self.new_world()
+    o1  = w1.get_ontology("http://test.org/t.owl")
+    with o1:
+      class A(Thing): pass
+      class B(A): pass
+      class C(Thing): pass
+      class p(Thing >> Thing): pass
+      class q(Thing >> Thing): inverse = p
+      a = A("a")
+      b = B("b", p = [a])
+    o1.save(tmp)
+    
+    w2 = self.new_world()
+    o2 = w2.get_ontology("http://test.org/t.owl").load(fileobj = open(tmp, "rb"))
+    A2, B2, C2, a2, b2 = o2.A, o2.B, o2.C, o2.a, o2.b
+    assert B2.is_a == [A2]
+    assert a2.q == [b2]
+    
+    A.label = ["A"]
+    a.is_a = [C]
+    b.p = []
+    with o1: B.equivalent_to = [C]
+    o1.save(tmp)
+    
+    o2.load(fileobj = open(tmp, "rb"), reload = True, incremental = True)
+    assert o2.A is A2 and o2.B is B2 and o2.a is a2 and o2.b is b2
+    assert o2.B.is_a[0] is o2.A
+    assert A2.label == ["A"]
+    assert a2.is_a == [C2]
+    assert b2.p == [] and a2.q == []
+    assert B2.equivalent_to == [C2]
+    
+  def test_ontology_35(self):
+    tmp = self.new_tmp_file()
+    w1  = self.new_world()
+    o1  = w1.get_ontology("http://test.org/t.owl")
+    with o1:
+      for i in range(10): types.new_class("C%s" % i, (Thing,))
+    o1.save(tmp)
+    
+    w2 = self.new_world()
+    o2 = w2.get_ontology("http://test.org/t.owl").load(fileobj = open(tmp, "rb"))
+    old_size = owlready2.namespace._LOAD_BATCH_SIZE
+    owlready2.namespace._LOAD_BATCH_SIZE = 3
+    try:
+      nb = len(w2._entities)
+      classes = o2.classes()
+      next(classes)
+      assert len(w2._entities) - nb == 3
+      assert len(list(classes)) == 9
+      assert len(w2._entities) - nb == 10
+    finally:
+      owlready2.namespace._LOAD_BATCH_SIZE = old_size
+    
     
   def test_class_1(self):
     n = get_ontology("http://www.semanticweb.org/jiba/ontologies/2017/0/test")
@@ -2593,6 +2800,59 @@ class Test(BaseTest, unittest.TestCase):
     assert set(DataProperty      .subclasses(world = w)) == { dp, dq }
     assert set(AnnotationProperty.subclasses(world = w)) == { ap, aq, versionInfo, comment, priorVersion, seeAlso, backwardCompatibleWith, deprecated, label, incompatibleWith, isDefinedBy }
     
+  def test_prop_52(self):
+    world   = self.new_world()
+    o       = world.get_ontology("http://www.semanticweb.org/test.owl")
+    
+    with o:
+      class C(Thing): pass
+      class D(Thing): pass
+      class E(Thing): pass
+      class F(Thing): pass
+      class G(Thing): pass
+      class H(Thing): pass
+      class I(Thing): pass
+      class J(Thing): pass
+      class p (Thing >> Thing, TransitiveProperty): pass
+      class p2(p): pass
+      class q (Thing >> Thing): pass
+      class iq(Thing >> Thing): inverse_property = q
+      class dp(Thing >> str): pass
+      
+    c = C()
+    d = D()
+    e = E()
+    f = F()
+    g = G()
+    h = H()
+    i = I()
+    j = J()
+    k = J()
+    c.p2 = [d]
+    D.is_a.append(p.some(E))
+    E.is_a.append(p.value(f))
+    G.equivalent_to.append(E)
+    G.is_a.append(p.value(h))
+    i.equivalent_to.append(h)
+    h.p = [j]
+    k.p = [c]
+    c.q = [d]
+    e.iq = [c]
+    g.equivalent_to.append(c)
+    c.dp = ["1"]
+    C.is_a.append(dp.value("2"))
+    
+    r = p.indirect_values_for([c, d, e, g, k])
+    assert set(r) == { c, d, e, g, k }
+    for x in [c, d, e, g, k]: assert set(r[x]) == set(p._get_indirect_values_for_individual(x))
+    assert set(r[c]) == set([d, E, f, G, h, i, j])
+    assert set(r[k]) == set([c, g, d, E, f, G, h, i, j])
+    
+    r = q.indirect_values_for([c, g])
+    assert set(r[c]) == set(r[g]) == { d, e }
+    assert set(dp.indirect_values_for([c, g])[c]) == { "1", "2" }
+    assert p.indirect_values_for([]) == {}
+    
     
   def test_prop_inverse_1(self):
     n = get_ontology("http://www.semanticweb.org/jiba/ontologies/2017/0/test")
@@ -3020,6 +3280,38 @@ class Test(BaseTest, unittest.TestCase):
         D.is_a.append(p)
     
       
+  def test_and_or_6(self):
+    w = self.new_world()
+    o = w.get_ontology("http://www.test.org/test.owl")
+    with o:
+      class p(Thing >> Thing): pass
+      class d(Thing >> int): pass
+      class C1(Thing): pass
+      class C2(Thing): pass
+      class C3(Thing): pass
+      i = C1("i")
+      class D(Thing):
+        equivalent_to = [C1 & (p.some(C2 | Not(C3)) | p.only(OneOf([i]))) & d.max(2, int) & (p.value(i) | Inverse(p).some(C1 & C2 & C3))]
+    f = BytesIO()
+    o.save(f, format = "ntriples")
+    
+    w = self.new_world()
+    o = w.get_ontology("http://www.test.org/test.owl").load(fileobj = BytesIO(f.getvalue()))
+    bnode = o._get_obj_triple_sp_o(o.D.storid, owl_equivalentclass)
+    o.C1; o.C2; o.C3; o.i; o.p; o.d
+    
+    nb_queries = 0
+    execute = o.graph.execute
+    def counting_execute(*args):
+      nonlocal nb_queries
+      nb_queries += 1
+      return execute(*args)
+    o.graph.execute = counting_execute
+    
+    construct = o._parse_bnode(bnode)
+    assert repr(construct) == "test.C1 & (test.p.some(test.C2 | Not(test.C3)) | test.p.only(OneOf([test.i]))) & test.d.max(2, <class 'int'>) & (test.p.value(test.i) | Inverse(test.p).some(test.C1 & test.C2 & test.C3))"
+    assert nb_queries == 1
+    
     
   def test_one_of_1(self):
     n = self.new_ontology()
@@ -3339,6 +3631,145 @@ I took a placebo
     assert p2.is_a == [DataProperty, FunctionalProperty]
     assert p3.is_a == [DataProperty, FunctionalProperty]
     
+  def test_reasoning_12(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/test.owl")
+    
+    with onto:
+      class A(Thing): pass
+      class B(A): pass
+      class C(Thing): pass
+      class D(Thing): equivalent_to = [C]
+      class E(Thing): equivalent_to = [A & C]
+      class p(ObjectProperty): domain = [C]
+      class q(ObjectProperty): pass
+      class r(ObjectProperty, TransitiveProperty): pass
+      class Q(Thing): equivalent_to = [q.some(A)]
+      b = B("b")
+      x = Thing("x", p = [b], q = [b])
+      y = Thing("y", r = [x])
+      z = Thing("z", r = [y])
+      c = Thing("c")
+      c.is_a.append(A)
+      c.is_a.append(C)
+      
+    sync_reasoner_rl(world, infer_property_values = True, debug = 0)
+    
+    assert set(x.is_a) == { C, D, Q }
+    assert c.is_a == [E]
+    assert b.is_a == [B]
+    assert set(z.r) == { x, y }
+    
+    inferences = world.get_ontology("http://inferrences/")
+    assert (x.storid, rdf_type, Q.storid) in list(inferences.get_triples())
+    assert not (b.storid, rdf_type, A.storid) in list(inferences.get_triples())
+    
+  def test_reasoning_13(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/test.owl")
+    
+    with onto:
+      class A(Thing): pass
+      class B(A): pass
+      class C(Thing): pass
+      class p(ObjectProperty): domain = [C]
+      b = B("b")
+      x = Thing("x", p = [b])
+      
+    sync_reasoner_rl(world, debug = 0)
+    assert x.is_a == [C]
+    
+    with onto: x.p = []
+    sync_reasoner_rl(world, debug = 0)
+    assert x.is_a == [Thing]
+    assert not world._has_obj_triple_spo(x.storid, rdf_type, C.storid)
+    
+    with onto: x.p = [b]
+    sync_reasoner_rl(world, debug = 0)
+    assert x.is_a == [C]
+    
+  def test_reasoning_14(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/test.owl")
+    
+    with onto:
+      class A(Thing): pass
+      class B(A): pass
+      class C(Thing): pass
+      class p(ObjectProperty): domain = [C]
+      class d(DataProperty): domain = [A]
+      class Q(Thing): equivalent_to = [p.some(B)]
+      b = B("b")
+      x = Thing("x")
+      
+    with RLReasoningSession(world, debug = 0) as session:
+      session.sync()
+      assert x.is_a == [Thing]
+      
+      with onto: x.p = [b]
+      assert session.added and not session.need_full and not session._has_untracked_changes()
+      session.sync()
+      assert set(x.is_a) == { C, Q }
+      
+      with onto:
+        y = Thing("y")
+        y.d = [1]
+      session.sync()
+      assert y.is_a == [A]
+      
+      with onto: x.p = []
+      assert session.need_full
+      session.sync()
+      assert x.is_a == [Thing]
+      
+      with onto: world.sparql("""INSERT { <http://test.org/test.owl#x> <http://test.org/test.owl#p> <http://test.org/test.owl#b> } WHERE {}""")
+      session.sync() # Not seen by the tracked methods => full materialization
+      assert set(x.is_a) == { C, Q }
+      
+    assert not "_add_obj_triple_raw_spo" in onto.__dict__ or onto._add_obj_triple_raw_spo == onto.graph._add_obj_triple_raw_spo
+    
+    session = RLReasoningSession(world, debug = 0)
+    tracker = onto._add_obj_triple_raw_spo
+    added   = []
+    def wrapper(s, p, o):
+      tracker(s, p, o)
+      added.append((s, p, o))
+    onto._add_obj_triple_raw_spo = wrapper # Installed after the session was opened
+    session.close()
+    assert onto._add_obj_triple_raw_spo is wrapper
+    with onto: Thing("z")
+    assert added and not session.added
+    
+  def test_reasoning_15(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/test.owl")
+    
+    with onto:
+      class C(Thing): pass
+      class D(C): pass
+      class p(ObjectProperty): pass
+      class i(ObjectProperty): inverse = p
+      class d(DataProperty): pass
+      a = C("a")
+      b = C("b")
+      c = C("c")
+      a.p = [b]
+      
+    inferences = world.get_ontology("http://inferrences/")
+    owlready2.reasoning._apply_reasoning_results(world, inferences, 0, { a.storid : [D.storid], b.storid : [C.storid] }, {}, { a.storid : "individual", b.storid : "individual" })
+    assert a.is_a == [D]
+    assert list(inferences.get_triples()) == [(inferences.storid, rdf_type, owl_ontology), (a.storid, rdf_type, D.storid)]
+    
+    assert a.p == [b]
+    owlready2.reasoning._apply_inferred_obj_relations(world, inferences, 0, [(a.storid, p, b.storid), (b.storid, i, a.storid), (a.storid, p, c.storid), (a.storid, p, c.storid)])
+    assert set(a.p) == { b, c }
+    assert c.i == [a]
+    assert len(inferences.graph) == 3
+    
+    owlready2.reasoning._apply_inferred_data_relations(world, inferences, 0, [(a.storid, d, 1, world._abbreviate("http://www.w3.org/2001/XMLSchema#integer"))] * 2)
+    assert a.d == [1]
+    assert len(inferences.graph) == 4
+    
      
   def test_pellet_reasoning_1(self):
     world = self.new_world()
@@ -4075,6 +4506,37 @@ I took a placebo
     
     assert repr(O.is_a) == repr([Thing, OneOf([o]), has_for_p.only((P | OneOf([p])))])
 
+  def test_close_8(self):
+    w = self.new_world()
+    n = w.get_ontology("http://test.org/test.owl")
+    with n:
+      class O (Thing): pass
+      class P (Thing): pass
+      class Q (Thing): pass
+      class has_for_p(ObjectProperty): domain = [O]
+      class is_p_of  (ObjectProperty): inverse_property = has_for_p
+      class O2(O): pass
+      class O3(Thing): equivalent_to = [O2]
+      class O4(O): pass
+      O3.is_a.append(has_for_p.some(Q))
+      p1 = P()
+      p2 = P()
+      O4.equivalent_to.append(O & has_for_p.value(p2))
+      o1 = O (has_for_p = [p1])
+      o2 = O2()
+      o3 = O2()
+      o4 = O4()
+      p2.is_p_of = [o2]
+    close_world(O)
+    
+    assert repr(O .is_a) == repr([Thing, OneOf([o1, o2, o3, o4]), has_for_p.only(Q | OneOf([p2, p1])), is_p_of.only(Nothing)])
+    assert repr(O2.is_a) == repr([O, OneOf([o2, o3]), has_for_p.only(Q | OneOf([p2])), is_p_of.only(Nothing)])
+    assert repr(O4.is_a) == repr([O, OneOf([o4]), has_for_p.only(OneOf([p2])), is_p_of.only(Nothing)])
+    assert repr(o1.is_a) == repr([O,  has_for_p.only(OneOf([p1])), is_p_of.only(Nothing)])
+    assert repr(o2.is_a) == repr([O2, has_for_p.only(Q | OneOf([p2])), is_p_of.only(Nothing)])
+    assert repr(o3.is_a) == repr([O2, has_for_p.only(Q), is_p_of.only(Nothing)])
+    assert repr(o4.is_a) == repr([O4, has_for_p.only(OneOf([p2])), is_p_of.only(Nothing)])
+
     
   def test_class_prop_1(self):
     onto = self.new_ontology()
@@ -5137,6 +5599,95 @@ multiple lines with " and ’ and \ and & and < and > and é."""
     c = list(onto.individuals())[0]
     assert c.__class__.iri == "https://test.org/o#TEST:C"
     
+  def test_format_29(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/t.owl")
+    with onto:
+      class p(Thing >> Thing): pass
+      class d(Thing >> int): pass
+      class C1(Thing): pass
+      class C2(Thing): pass
+      class C3(Thing):
+        is_a = [p.some(C1 | Not(C2 & p.only(OneOf([C1(), C2()])))), d.value(3)]
+      AllDisjoint([C1, C2, C3])
+      
+    f = BytesIO()
+    onto.save(f, format = "rdfxml")
+    rdfxml = f.getvalue().decode("utf8")
+    assert rdfxml.split("\n\n")[1].startswith("<owl:Ontology")
+    
+    world2 = self.new_world()
+    onto2  = world2.get_ontology("http://test.org/t.owl").load(fileobj = BytesIO(f.getvalue()))
+    f1 = BytesIO(); onto .save(f1, format = "ntriples")
+    f2 = BytesIO(); onto2.save(f2, format = "ntriples")
+    self.assert_ntriples_equivalent(f2.getvalue().decode("utf8"), f1.getvalue().decode("utf8"))
+    
+    with onto: # List mixing literals, a blank node and an entity
+      class C4(Thing): pass
+      r = world.new_blank_node()
+      onto._add_obj_triple_spo(r, rdf_type, owl_restriction)
+      onto._add_obj_triple_spo(r, owl_onproperty, p.storid)
+      onto._add_obj_triple_spo(r, SOME, C1.storid)
+      l = world.new_blank_node()
+      onto._set_list_as_rdf(l, [onto._to_rdf(1), (r, None), (C2.storid, None), onto._to_rdf("a")])
+      onto._add_obj_triple_spo(C4.storid, owl_oneof, l)
+      
+    f = BytesIO()
+    onto.save(f, format = "rdfxml")
+    world2 = self.new_world()
+    onto2  = world2.get_ontology("http://test.org/t.owl").load(fileobj = BytesIO(f.getvalue()))
+    f1 = BytesIO(); onto .save(f1, format = "ntriples")
+    f2 = BytesIO(); onto2.save(f2, format = "ntriples")
+    self.assert_ntriples_equivalent(f2.getvalue().decode("utf8"), f1.getvalue().decode("utf8"))
+    
+  def test_format_30(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/t.owl")
+    with onto:
+      class p(Thing >> Thing): pass
+      class d(Thing >> str): pass
+      class C(Thing):
+        is_a = [p.some(Thing)]
+      c = C("c")
+      c.d = ['a "quoted"\nmulti-line \\ string', locstr("fr", "fr"), 0.1, 1 / 3, 1e20, 5, True]
+      
+    for format in ["ntriples", "nquads"]:
+      for graph in [onto.graph, world.graph]:
+        f1 = BytesIO(); graph.save(f1, format)
+        f2 = BytesIO(); graph.save(f2, format, filter = lambda *args: True) # Python implementation
+        assert f1.getvalue() == f2.getvalue()
+        
+    import gzip
+    tmp = self.new_tmp_file() + ".gz"
+    onto.save(tmp, format = "ntriples")
+    f1 = BytesIO(); onto.save(f1, format = "ntriples")
+    assert gzip.open(tmp).read() == f1.getvalue()
+    os.unlink(tmp)
+    
+  def test_format_31(self):
+    tmp = self.new_tmp_file()
+    with open(tmp, "w") as f:
+      f.write("""<http://test.org/t.owl> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2002/07/owl#Ontology> .\n""")
+      f.write("""_:b0 <http://test.org/t.owl#p> "first" .\n""")
+      for i in range(20000):
+        f.write("""<http://test.org/t.owl#i%s> <http://test.org/t.owl#d> "%s"^^<http://www.w3.org/2001/XMLSchema#integer> .\n""" % (i, i))
+        f.write("""<http://test.org/t.owl#i%s> <http://test.org/t.owl#r> _:b%s .\n""" % (i, i % 7))
+      f.write("""_:b0 <http://test.org/t.owl#p> "last"@en .\n""")
+      
+    assert os.path.getsize(tmp) > 2 * (1 << 20) # Several chunks
+    
+    ntriples = []
+    for processes in [None, 2]:
+      world = self.new_world()
+      onto  = world.get_ontology("http://test.org/t.owl").load(fileobj = open(tmp, "rb"), processes = processes)
+      f = BytesIO(); onto.save(f, format = "ntriples")
+      ntriples.append(sorted(f.getvalue().split(b"\n")))
+      
+      assert len(world.graph.execute("SELECT DISTINCT o FROM objs WHERE o < 0").fetchall()) == 7 # Blank nodes are shared between chunks
+      assert len(world.graph.execute("SELECT DISTINCT s FROM datas WHERE s < 0").fetchall()) == 1
+      
+    assert ntriples[0] == ntriples[1]
+    
     
   def test_search_1(self):
     world = self.new_world()
@@ -5784,7 +6335,7 @@ multiple lines with " and ’ and \ and & and < and > and é."""
     p2.price
     p2.is_a
     p2.has_topping
-    assert p2 in owlready2.namespace._cache
+    assert p2 in world._entity_cache
     
     with o:
       r = g.update("""
@@ -5947,6 +6498,55 @@ ask where
     res4 = list(graph.query_owlready(rq_template.format("C2", "C1")))
     assert res4 == [False]
 
+  def test_rdflib_14(self):
+    import rdflib.plugins.sparql
+    world = self.new_world()
+    onto1 = world.get_ontology("http://test.org/onto1.owl")
+    onto2 = world.get_ontology("http://test.org/onto2.owl")
+    with onto1:
+      class C(Thing): pass
+      class r(C >> C): pass
+      class ir(C >> C): inverse = r
+      class v(C >> int): pass
+      cs = [C("c%s" % i, v = [i % 3], label = [locstr("c%s" % i, "en")]) for i in range(10)]
+    with onto2:
+      for i in range(0, 10, 2): cs[i].r = [cs[i + 1]]
+      
+    graph = world.as_rdflib_graph()
+    store = graph.store
+    
+    # Single SQL query vs generic implementation
+    C_, r_, ir_, c1 = rdflib.URIRef(C.iri), rdflib.URIRef(r.iri), rdflib.URIRef(ir.iri), rdflib.URIRef(cs[1].iri)
+    for pattern in [(None, None, None), (c1, None, None), (None, ir_, None), (None, None, c1), (c1, ir_, None), (None, r_, c1), (None, v.iri, rdflib.Literal(1))]:
+      pattern = tuple(rdflib.URIRef(x) if isinstance(x, str) else x for x in pattern)
+      for context in [graph, graph.get_context(onto2)]:
+        rs, rp, ro, rd = store._rdflib_2_owlready(pattern)
+        assert sorted(store._owlready_2_rdflib_rows(store._sql_triples(context.triplelite, rs, rp, ro, rd))) == sorted(store._owlready_2_rdflib_rows(store._generic_triples(context.triplelite, rs, rp, ro, rd)))
+    assert set(graph.triples((c1, ir_, None))) == { (c1, ir_, rdflib.URIRef(cs[0].iri)) }
+    
+    # Context-aware length
+    assert len(graph) == len(world.graph)
+    assert len(graph.get_context(onto2)) == 6 # 5 relations and the ontology declaration
+    assert len(store) == len(world.graph)
+    
+    # Basic graph patterns pushed down to the native SPARQL engine give the same results as rdflib's evaluation
+    queries = ["""SELECT ?x ?y WHERE { ?x <http://test.org/onto1.owl#r> ?y . ?y <http://test.org/onto1.owl#v> 1 . }""",
+               """SELECT ?x ?y WHERE { ?x <http://test.org/onto1.owl#ir> ?y . ?x a <http://test.org/onto1.owl#C> . }""",
+               """SELECT ?x ?l WHERE { ?x <http://www.w3.org/2000/01/rdf-schema#label> ?l . ?x <http://test.org/onto1.owl#v> 2 . }""",
+               """SELECT ?x WHERE { ?x <http://www.w3.org/2000/01/rdf-schema#label> "c3"@en . }""",
+               """SELECT ?x ?n WHERE { ?x <http://test.org/onto1.owl#v> ?n . OPTIONAL { ?x <http://test.org/onto1.owl#r> ?y . } FILTER(?n > 0) }""",
+               """SELECT ?x WHERE { ?x <http://test.org/onto1.owl#unknown> ?y . }"""]
+    for query in queries:
+      r1 = sorted(map(tuple, graph.query(query)))
+      evaluate = rdflib.plugins.sparql.CUSTOM_EVALS.pop("owlready2")
+      try:     r2 = sorted(map(tuple, graph.query(query)))
+      finally: rdflib.plugins.sparql.CUSTOM_EVALS["owlready2"] = evaluate
+      assert r1 == r2
+    assert len(list(graph.query(queries[0]))) == 2
+    
+    cs[3].iri = "http://test.org/onto1.owl#renamed"
+    assert list(graph.query(queries[3])) == [(rdflib.URIRef("http://test.org/onto1.owl#renamed"),)]
+    
   def test_refactor_1(self):
     world = self.new_world()
     n = world.get_ontology("http://www.semanticweb.org/jiba/ontologies/2017/0/test").load()
@@ -6130,8 +6730,7 @@ ask where
     self.assert_triple(c1.storid, p.storid, "0e", hex_storid, world)
 
     c1 = C = None
-    import owlready2.namespace
-    owlready2.namespace._cache = [None] * 1000
+    world._entity_cache.clear()
     import gc
     gc.collect(); gc.collect(); gc.collect()
     
@@ -6872,6 +7471,87 @@ http://test.org/t.owl#c1 http://www.w3.org/1999/02/22-rdf-syntax-ns#type
 
     assert listened == """\nhttp://test.org/t.owl#c2 http://test.org/t.owl#i\n"""
     
+  def test_observe_9(self):
+    import owlready2.observe
+    
+    w = self.new_world()
+    onto = w.get_ontology("http://test.org/t.owl")
+    
+    with onto:
+      class C(Thing): pass
+      class D(C): pass
+      class ps(C >> int): pass
+      c1 = C()
+      c2 = C()
+      
+    l = owlready2.observe.InstancesOfClass(C, use_observe = True)
+    assert list(l) == [c1, c2]
+    
+    listened = []
+    def listener(o, p): listened.append((o, p))
+    owlready2.observe.start_observing(onto)
+    owlready2.observe.observe(c1, listener)
+    owlready2.observe.observe(l, listener)
+    
+    with owlready2.observe.observation_batch(w):
+      c1.ps = [1, 2, 3]
+      c1.ps.append(4)
+      with onto:
+        ds = [D() for i in range(10)]
+      c2.is_a.append(D)
+      c2.is_a.remove(C) # Still an instance of C, through D
+      destroy_entity(ds[0])
+      assert listened == []
+      
+    assert listened == [(c1.storid, ps.storid), (0, "Inverse(http://www.w3.org/1999/02/22-rdf-syntax-ns#type)")]
+    assert not l._storids is None # Updated incrementally
+    assert list(l) == [c1, c2] + ds[1:]
+    
+    with onto: c3 = C()
+    assert list(l) == [c1, c2] + ds[1:] + [c3]
+    assert set(l) == set(owlready2.observe.InstancesOfClass(C))
+    
+    onto.graph._del_obj_triple_raw_spo(c3.storid, rdf_type, C.storid) # Not observed => c3 has a single type triple after the next addition
+    c3.is_a.append(D)
+    assert list(l) == [c1, c2] + ds[1:] + [c3]
+    
+  def test_observe_10(self):
+    import owlready2.observe
+    
+    w = self.new_world()
+    onto = w.get_ontology("http://test.org/t.owl")
+    
+    with onto:
+      class C(Thing): pass
+      class D(C): pass
+      class key(C >> str, FunctionalProperty): pass
+      c1 = C(key = "b")
+      c2 = D(key = "d")
+      c3 = C()
+      
+    owlready2.observe.start_observing(onto)
+    l = owlready2.observe.InstancesOfClass(C, order_by = key, use_observe = True)
+    def fresh(): return list(owlready2.observe.InstancesOfClass(C, order_by = key))
+    assert list(l) == [c3, c1, c2]
+    
+    with onto:
+      c4 = D(key = "a")
+      c5 = C(key = "c")
+    assert not l._storids is None # Updated incrementally
+    assert list(l) == [c3, c4, c1, c5, c2] == fresh()
+    
+    c1.key = "z"
+    c3.key = "e"
+    assert list(l) == [c4, c5, c2, c3, c1] == fresh()
+    
+    with owlready2.observe.observation_batch(w):
+      destroy_entity(c5)
+      c2.is_a.remove(D)
+      c4.key = None
+      with onto: c6 = C(key = "f")
+    assert not l._storids is None
+    assert list(l) == [c4, c3, c6, c1] == fresh()
+    
     
   def test_fts_1(self):
     world = self.new_world()
@@ -7359,6 +8039,51 @@ for i in range(500):
     s = world.graph.execute("SELECT MAX(storid) FROM resources").fetchone()[0]
     assert s == 300 + 4 + 200 * NB
 
+  def test_pym_1(self):
+    from owlready2.pymedtermino2.model import PYM
+    with PYM:
+      class terminology(AnnotationProperty): pass
+      class mapped_to(ObjectProperty): pass
+      class unifieds (ObjectProperty): pass
+      class originals(ObjectProperty): pass
+    def new_concept(terminology_name, code, parents, terminology):
+      with PYM.get_namespace("http://PYM/%s/" % terminology_name): Concept = types.new_class(code, tuple(parents))
+      PYM._add_obj_triple_spo(Concept.storid, PYM.terminology.storid, (terminology or Concept).storid)
+      return Concept
+    SRC = new_concept("SRC", "SRC", [PYM.Concept], None)
+    CUI = new_concept("SRC", "CUI", [PYM.Concept], SRC)
+    T1  = new_concept("SRC", "T1",  [PYM.Concept], SRC)
+    T2  = new_concept("SRC", "T2",  [PYM.Concept], SRC)
+    A   = new_concept("T1",  "A",   [T1],  T1)
+    A1  = new_concept("T1",  "A1",  [A],   T1)
+    A2  = new_concept("T1",  "A2",  [A],   T1)
+    A11 = new_concept("T1",  "A11", [A1],  T1)
+    X   = new_concept("T2",  "X",   [T2],  T2)
+    X1  = new_concept("T2",  "X1",  [X],   T2)
+    Y   = new_concept("T2",  "Y",   [T2],  T2)
+    C1  = new_concept("CUI", "C1",  [CUI], CUI)
+    C2  = new_concept("CUI", "C2",  [CUI], CUI)
+    A1.is_a.append(PYM.mapped_to.some(X1))
+    for orig, cui in [(A, C1), (X, C1), (A2, C2), (Y, C2)]:
+      orig.is_a.append(PYM.unifieds .some(cui))
+      cui .is_a.append(PYM.originals.some(orig))
+    
+    for source, dest, concepts, expected in [
+        (T1,  T2,  [A, A1, A2, A11], [{ X }, { X1 }, { Y }, { X1 }]), # Via CUI, mapped_to, and through parents for A11
+        (T1,  CUI, [A, A1, A2, A11], [{ C1 }, { C1 }, { C2 }, { C1 }]),
+        (CUI, T2,  [C1, C2],         [{ X }, { Y }]),
+        (T2,  T1,  [X, X1, Y],       [{ A }, { A }, { A2 }]),
+        (T1,  T1,  [A11],            [{ A11 }]),
+      ]:
+      r = source.map_concepts(concepts + [concept.name for concept in concepts] + ["UNKNOWN"], dest)
+      assert r["UNKNOWN"] == set()
+      for concept, mapped in zip(concepts, expected):
+        assert r[concept] == r[concept.name] == (concept >> dest) == mapped
+    
+    assert (PYM.Concepts([A, A11, C2]) >> T2) == { X, X1, Y }
+    assert (PYM.Concepts([A2, X]) >> CUI) == { C1, C2 }
+    
+    PYM.destroy()
     
     
 class Paper(BaseTest, unittest.TestCase):
@@ -9119,6 +9844,267 @@ WHERE {
     
     owlready2.sparql.parser._DATA_PROPS = save
     
+  def test_145(self):
+    world, onto = self.prepare1()
+    assert world.graph.get_stats() == {}
+    q1 = world.prepare_sparql("""SELECT ?x ?y { ?x a onto:A . ?x onto:rel ?y . ?y a onto:B . }""")
+    assert not "LIKELIHOOD" in q1.sql
+    
+    world.update_stats()
+    stats = world.graph.get_stats()
+    assert stats[rdf_type, onto.B.storid][0] == 3
+    assert stats[onto.rel.storid, 0] == (1, 1, 1)
+    
+    q2 = world.prepare_sparql("""SELECT ?x ?y { ?x a onto:A . ?x onto:rel ?y . ?y a onto:B . }""")
+    assert "LIKELIHOOD" in q2.sql
+    assert list(q1.execute()) == list(q2.execute()) == [[onto.a1, onto.b2]]
+    
+    with onto: onto.B(); onto.B()
+    assert world.graph.get_stats()[rdf_type, onto.B.storid][0] == 3
+    world.enable_auto_stats()
+    q3 = world.prepare_sparql("""SELECT ?x { ?x a onto:B . }""")
+    assert world.graph.get_stats()[rdf_type, onto.B.storid][0] == 5
+    assert world.prepare_sparql("""SELECT ?x { ?x a onto:B . }""") is q3
+    
+    q4 = world.prepare_sparql("""SELECT ?x { ?x onto:rel ?? . }""")
+    assert list(q4.execute_many([[onto.b1], [onto.b2]])) == [(1, [onto.a1])] # Modifies only a temp table
+    assert world.graph.has_exact_stats()
+    assert world.prepare_sparql("""SELECT ?x { ?x a onto:B . }""") is q3
+    
+    world2, onto2 = self.prepare1()
+    q5 = world2.prepare_sparql("""SELECT ?x { ?x a onto:B . }""")
+    world.update_stats()
+    assert world .prepare_sparql("""SELECT ?x { ?x a onto:B . }""") is not q3
+    assert world2.prepare_sparql("""SELECT ?x { ?x a onto:B . }""") is q5 # Other worlds are not affected
+    world.enable_auto_stats(False)
+    
+    B_storid = onto.B.storid
+    onto.destroy()
+    assert not (rdf_type, B_storid) in world.graph.get_stats()
+    
+  def test_146(self):
+    world, onto = self.prepare1()
+    world.update_stats()
+    q = world.prepare_sparql("""SELECT ?x ?y { ?x a onto:A . ?x onto:rel ?y . FILTER(?y != ??1) }""")
+    
+    explain = q.explain()
+    assert explain["sql"] == q.sql
+    assert explain["plan"]
+    assert explain["warnings"] == []
+    assert set(explain["estimates"].values()) == { 1.0 }
+    assert world.prepare_sparql("""SELECT ?x { ?x onto:rel ?y . ?y rdfs:label "x?1" }""").explain()["plan"]
+    
+    profile = q.profile([onto.b1])
+    assert profile["nb_row"] == 1
+    assert set(profile) == { "nb_row", "sql_time", "entity_loading_time", "conversion_time", "total_time" }
+    
+    assert world.get_sparql_metrics() == {}
+    world.enable_sparql_metrics()
+    assert list(q.execute([onto.b1])) == [[onto.a1, onto.b2]]
+    assert list(q.execute([onto.b2])) == []
+    metrics = world.get_sparql_metrics()[q.sparql]
+    assert metrics["nb_execution"] == 2
+    assert metrics["nb_row"] == 1
+    q.execute_parallel([[onto.b1], [onto.b2]])
+    list(q.execute_many([[onto.b1], [onto.b2], [onto.b1]]))
+    metrics = world.get_sparql_metrics()[q.sparql]
+    assert metrics["nb_execution"] == 7
+    assert metrics["nb_row"] == 4
+    world.reset_sparql_metrics()
+    assert world.get_sparql_metrics() == {}
+    world.enable_sparql_metrics(False)
+    list(q.execute([onto.b1]))
+    assert world.get_sparql_metrics() == {}
+    
+  def test_147(self):
+    world = World(filename = self.new_tmp_file(), exclusive = False)
+    onto  = world.get_ontology("http://test.org/onto.owl#")
+    with onto:
+      class A(Thing): pass
+      class B(Thing): pass
+      class rel(ObjectProperty): pass
+      class val(DataProperty): pass
+      for i in range(6):
+        a = A("a%s" % i); b = B("b%s" % i); a.rel = [b]; b.val = [i % 3]
+    world.save()
+    
+    q = world.prepare_sparql("""SELECT ?x ?y { { ?x a onto:A . ?x onto:rel ?y } UNION { ?x onto:val ?y . FILTER(?y != ??1) } }""")
+    assert q.parallel_plan
+    assert sorted(map(str, q.execute([0], parallel = 2))) == sorted(map(str, q.execute([0])))
+    assert world.graph._read_only_dbs
+    
+    q = world.prepare_sparql("""SELECT DISTINCT ?y { { ?x onto:val ?y } UNION { ?x onto:val ?y } } ORDER BY ?y""")
+    assert list(q.execute(parallel = 2)) == [[0], [1], [2]]
+    
+    onto.b4.label = ["x?3"]
+    world.save()
+    q = world.prepare_sparql("""SELECT ?x { { ?x onto:val ??1 } UNION { ?x rdfs:label "x?3" } }""") # "?3" in a string literal is not a parameter
+    assert q.parallel_plan
+    assert sorted(map(str, q.execute([0], parallel = 2))) == ["[onto.b0]", "[onto.b3]", "[onto.b4]"]
+    
+    q = world.prepare_sparql("""SELECT ?x { ?x onto:val ??1 } ORDER BY ?x""")
+    assert q.execute_parallel([[0], [2], [5]]) == [[[onto.b0], [onto.b3]], [[onto.b2], [onto.b5]], []]
+    
+    with onto: A("a6") # Unsaved changes => sequential execution
+    assert q.execute_parallel([[0]]) == [[[onto.b0], [onto.b3]]]
+    world.close()
+    
+  def test_148(self):
+    world, onto = self.prepare1()
+    q = world.prepare_sparql("""SELECT ?y { ??1 onto:rel ?y . } ORDER BY ?y""")
+    assert q.batch_sql
+    paramss = [[onto.a1], [onto.b1], [onto.a1]]
+    assert list(q.execute_many(paramss)) == [(i, l) for i, params in enumerate(paramss) for l in q.execute(params)]
+    assert not "_params" in set(i for (i,) in world.graph.execute("""SELECT name FROM sqlite_temp_master"""))
+    
+    q = world.prepare_sparql("""SELECT (COUNT(?y) AS ?nb) { ??1 onto:rel ?y . }""")
+    assert list(q.execute_many(paramss)) == [(0, [1]), (1, [0]), (2, [1])]
+    
+    q = world.prepare_sparql("""SELECT ?y { ??1 onto:rel ?y . } LIMIT 1""")
+    assert q.batch_sql is None
+    assert [i for (i, l) in q.execute_many(paramss)] == [0, 2]
+    
+  def test_149(self):
+    world, onto = self.prepare1()
+    q = world.prepare_sparql("""SELECT ?c (COUNT(?x) AS ?nb) { ?x a ?c . } GROUP BY ?c""")
+    assert q.stats_count
+    r = { c : nb for (c, nb) in q.execute() }
+    assert r[onto.A] == 1
+    assert { c : nb for (c, nb) in q.execute(entity_format = "storid") } == { getattr(c, "storid", c) : nb for (c, nb) in r.items() }
+    assert { c : nb for (c, nb) in q.execute(entity_format = "iri") }[onto.A.iri] == 1
+    
+    world.update_stats()
+    assert world.graph.has_exact_stats()
+    q = world.prepare_sparql("""SELECT ?c (COUNT(?x) AS ?nb) { ?x a ?c . } GROUP BY ?c""")
+    assert { c : nb for (c, nb) in q.execute() } == r
+    q = world.prepare_sparql("""SELECT (COUNT(?x) AS ?nb) { ?x a onto:A . }""")
+    assert list(q.execute()) == [[1]]
+    q = world.prepare_sparql("""SELECT (COUNT(*) AS ?nb) { ?x onto:rel ?y . }""")
+    assert list(q.execute()) == [[1]]
+    
+    with onto: onto.A()
+    assert not world.graph.has_exact_stats()
+    q = world.prepare_sparql("""SELECT (COUNT(?x) AS ?nb) { ?x a onto:A . }""")
+    assert list(q.execute()) == [[2]]
+    
+    q = world.prepare_sparql("""SELECT (SUM(?p) AS ?s) (COUNT(?p) AS ?nb) (GROUP_CONCAT(?p) AS ?g) { ?x onto:price ?p . }""")
+    assert q.native_columns
+    assert list(q.execute()) == [[10.0, 1, "10.0"]]
+    
+  def test_150(self):
+    world, onto = self.prepare1()
+    onto.a1.annot = ["Alice", "Al.ce", "eeAli", "2020-01-05T10:11:12.5+02:00"]
+    q, r = self.sparql(world, """SELECT  ?x { onto:a1 onto:annot ?x . FILTER(REGEX(?x, "Al.")) }""", compare_with_rdflib = False)
+    assert { x for (x,) in r } == { "Alice", "Al.ce", "eeAli" }
+    q, r = self.sparql(world, """SELECT  ?x { onto:a1 onto:annot ?x . FILTER(REGEX(?x, "l.c")) }""", compare_with_rdflib = False)
+    assert { x for (x,) in r } == { "Alice", "Al.ce" }
+    q, r = self.sparql(world, """SELECT  (REPLACE(?x, ".", "-") AS ?r) { onto:a1 onto:annot ?x . FILTER(STRSTARTS(?x, "Al")) }""", compare_with_rdflib = False)
+    assert { x for (x,) in r } == { "-----" }
+    q, r = self.sparql(world, """SELECT  (SECONDS(?x) AS ?s) (TZ(?x) AS ?tz) (MD5(?x) AS ?m) { onto:a1 onto:annot ?x . FILTER(STRSTARTS(?x, "2020")) }""", compare_with_rdflib = False)
+    assert r == [[12.5, "+02:00", "02de2d781c89c77466d0bd8bdfd2a0ed"]]
+    
+  def test_151(self):
+    world, onto = self.prepare1()
+    with onto:
+      c1 = onto.C(); c2 = onto.C(); c3 = onto.C(); c4 = onto.C()
+    onto.b2.rel = [c1]; c1.rel = [c2]; c2.rel = [c3, onto.b2]; c3.subrel = [c4]
+    
+    q, r = self.sparql(world, """SELECT  ?x { onto:a1 onto:rel+ ?x . }""") # Cycle b2 -> c1 -> c2 -> b2
+    assert { x for (x,) in r } == { onto.b2, c1, c2, c3 }
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { onto:a1 onto:rel+ <%s> . }""" % c3.iri)
+    assert "path_length(" in q.sql
+    assert r == [[1]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> onto:rel+ onto:a1 . }""" % c3.iri)
+    assert r == [[0]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> (^onto:rel|^onto:subrel)+ <%s> . }""" % (c4.iri, c1.iri), compare_with_rdflib = False)
+    assert r == [[1]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> (onto:rel|^onto:subrel)+ <%s> . }""" % (c4.iri, c1.iri), compare_with_rdflib = False)
+    assert r == [[0]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> onto:rel+ <%s> . }""" % (c1.iri, c1.iri))
+    assert r == [[1]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> onto:rel* ?? . }""" % c4.iri, [c4], compare_with_rdflib = False)
+    assert r == [[1]]
+    
+    q, r = self.sparql(world, """SELECT  ?x { onto:a1 onto:rel{2} ?x . }""", compare_with_rdflib = False)
+    assert { x for (x,) in r } == { c1 }
+    q, r = self.sparql(world, """SELECT  ?x { onto:a1 onto:rel{3,} ?x . }""", compare_with_rdflib = False)
+    assert { x for (x,) in r } == { onto.b2, c1, c2, c3 } # b2 and c1 through the cycle
+    q, r = self.sparql(world, """SELECT  ?x { ?x onto:rel{,2} <%s> . }""" % c2.iri, compare_with_rdflib = False)
+    assert { x for (x,) in r } == { onto.b2, c1, c2 }
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { onto:a1 onto:rel{,3} <%s> . }""" % c3.iri, compare_with_rdflib = False)
+    assert r == [[0]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { onto:a1 onto:rel{1,4} <%s> . }""" % c3.iri, compare_with_rdflib = False)
+    assert r == [[1]]
+    
+    with onto:
+      i1 = onto.C(); i2 = onto.C(); i3 = onto.C()
+    i1.rel = [i2]; i2.rel = [i3]
+    for (s, path, o, nb) in [(i3, "{2}", i1, 0), (i1, "{2}", i2, 0), (i1, "{2}", i3, 1), (i1, "{2,3}", i2, 0), (i1, "{2,3}", i3, 1),
+                             (i1, "{2,}", i2, 0), (i1, "{2,}", i3, 1), (i1, "{0,1}", i3, 0), (i1, "{,1}", i3, 0), (i1, "?", i3, 0),
+                             (i1, "?", i2, 1), (i1, "?", i1, 1)]:
+      q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { <%s> onto:rel%s <%s> . }""" % (s.iri, path, o.iri), compare_with_rdflib = False)
+      assert r == [[nb]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { ?? onto:rel{2} ?? . }""", [i1, i3], compare_with_rdflib = False)
+    assert r == [[1]]
+    q, r = self.sparql(world, """SELECT  (COUNT(*) AS ?nb) { ?? onto:rel{2} ?? . }""", [i1, i2], compare_with_rdflib = False)
+    assert r == [[0]]
+    
+    assert world.get_shortest_path(onto.a1, c3, onto.rel) == [onto.a1, onto.b2, c1, c2, c3]
+    assert world.get_shortest_path(onto.a1, c3, onto.rel, max_length = 3) is None
+    assert world.get_shortest_path(c4, c1, [Inverse(onto.rel), Inverse(onto.subrel)]) == [c4, c3, c2, c1]
+    assert world.get_shortest_path(c3, onto.a1, onto.rel) is None
+    
+  def test_152(self):
+    world, onto = self.prepare1()
+    with onto:
+      cs = [onto.C(price = [float(i)]) for i in range(3)]
+      assert [c.price for c in cs] == [[0.0], [1.0], [2.0]]
+      
+      q, r = self.sparql(world, """DELETE { ?x onto:price ?p } INSERT { ?x onto:price ?p2 } WHERE { ?x a onto:C . ?x onto:price ?p . BIND(?p * 2 AS ?p2) }""", compare_with_rdflib = False)
+      assert q.bulk_deletes and q.bulk_inserts and not q.row_inserts
+      assert r == [3]
+      assert [c.price for c in cs] == [[0.0], [2.0], [4.0]]
+      
+      q, r = self.sparql(world, """INSERT { ?x a onto:A . ?x onto:rel ?y } WHERE { ?x a onto:C . ?y a onto:B }""", compare_with_rdflib = False)
+      assert [c.is_a for c in cs] == [[onto.C, onto.A], [onto.C, onto.A], [onto.C, onto.A]]
+      assert set(cs[0].rel) == set(onto.B.instances())
+      
+      q, r = self.sparql(world, """DELETE { ?x a onto:A } INSERT { ?x onto:rel [ a onto:B ] } WHERE { ?x a onto:C }""", compare_with_rdflib = False)
+      assert q.bulk_deletes and q.row_inserts
+      assert r == [3]
+      assert [c.is_a for c in cs] == [[onto.C], [onto.C], [onto.C]]
+      
+      q, r = self.sparql(world, """DELETE { ?x onto:price ?p } WHERE { ?x onto:price ?p . FILTER(?p > 100) }""", compare_with_rdflib = False)
+      assert r == [0]
+    
+  def test_153(self):
+    world = self.new_world()
+    onto  = world.get_ontology("http://test.org/onto.owl#")
+    with onto:
+      class D(Thing): pass
+      class r(ObjectProperty): domain = [D]
+      x = Thing("x")
+      y = Thing("y")
+      x.r = [y]
+      
+    with RLReasoningSession(world, debug = 0) as session:
+      session.sync()
+      assert x.is_a == [D]
+      
+      q = world.prepare_sparql("""DELETE { ?a onto:r ?b } WHERE { ?a onto:r ?b }""")
+      assert q.bulk_deletes and not q._can_execute_in_bulk() # Raw triple methods wrapped by the session
+      assert q.execute() == 1
+      assert session.need_full
+      session.sync()
+      assert x.is_a == [Thing]
+      
+    assert q._can_execute_in_bulk()
+    
+    import owlready2.observe
+    with onto: x.r = [y]
+    owlready2.observe.start_observing(onto)
+    assert not q._can_execute_in_bulk()
+    
 # Add test for Pellet
 
 for Class in [Test, Paper]: